@@ -1,12 +1,10 @@
 from django.contrib.auth import get_user_model
 from django.conf import settings
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-import requests as py_requests  # for Firebase token verification
+from relay_project.throttling import AuthThrottle
 
 User = get_user_model()
 
@@ -25,6 +23,7 @@ def get_tokens_for_user(user):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AuthThrottle])
 def google_auth(request):
     """Authenticate a user via Google OAuth2 ID token."""
     try:
@@ -32,6 +31,10 @@ def google_auth(request):
         if not token:
             return Response({'error': 'Missing ID token'}, status=400)
 
+        # google-auth is only needed on this path; keep it out of worker boot
+        from google.oauth2 import id_token
+        from google.auth.transport import requests as google_requests
+
         idinfo = id_token.verify_oauth2_token(
             token,
             google_requests.Request(),
@@ -76,6 +79,7 @@ def google_auth(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AuthThrottle])
 def firebase_auth(request):
     """
     Authenticate a user via Firebase ID token (email/password flow).
@@ -88,6 +92,7 @@ def firebase_auth(request):
             return Response({'error': 'ID token and email are required'}, status=400)
 
         # Verify Firebase ID token with Google
+        import requests as py_requests
         verify_url = f"https://identitytoolkit.googleapis.com/v1/accounts:lookup?key={settings.FIREBASE_API_KEY}"
         resp = py_requests.post(verify_url, json={"idToken": token})
         if resp.status_code != 200:
@@ -0,0 +1,28 @@
+"""
+Gunicorn settings (picked up automatically from the working directory).
+
+With preload_app the master imports relay_project.wsgi, and with it Django,
+DRF and the warm caches, once; workers are forked from it and start serving
+immediately instead of each repeating the import and warm-up.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+
+def post_fork(server, worker):
+    # Connections opened while warming in the master must not be shared
+    from django.core.cache import caches
+    from django.db import connections
+
+    connections.close_all()
+    caches.close_all()
+
+
+def worker_exit(server, worker):
+    # Final counts; the next scrape folds this worker's snapshot into dead.json
+    from relay_project.metrics import registry
+
+    registry.maybe_flush(force=True)
@@ -1,13 +1,15 @@
 from django.contrib import admin
 from .models import (
     Contact, Group, VoiceMessage, Delivery,
-    MessageTemplate, AuditLog, Message, ReplyMessage
+    MessageTemplate, AuditLog, Message, ReplyMessage, ReadState,
+    ArchivedMessage, ArchivedVoiceMessage,
 )
+from .services import recount_replies
 
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
-    list_display = ('name', 'role', 'user', 'is_active')
-    list_filter = ('role', 'is_active')
+    list_display = ('name', 'role', 'department', 'user', 'is_active')
+    list_filter = ('role', 'department', 'is_active')
     search_fields = ('name', 'email', 'phone', 'user__username')
 
 
@@ -36,7 +38,7 @@ class DeliveryAdmin(admin.ModelAdmin):
 
 @admin.register(MessageTemplate)
 class MessageTemplateAdmin(admin.ModelAdmin):
-    list_display = ('title',)
+    list_display = ('title', 'version')
     search_fields = ('title', 'body')
 
 
@@ -73,5 +75,37 @@ class MessageAdmin(admin.ModelAdmin):
 
 @admin.register(ReplyMessage)
 class ReplyMessageAdmin(admin.ModelAdmin):
-    list_display = ('id', 'original_message', 'sender', 'created_at')
-    search_fields = ('sender__name', 'reply_text')
\ No newline at end of file
+    list_display = ('id', 'original_message', 'voice_message', 'sender', 'created_at')
+    search_fields = ('sender__name', 'reply_text')
+    list_select_related = ('original_message__user', 'sender')
+
+    # Deletes bypass services.add_reply, so rebuild the denormalized counters
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recount_replies([obj.original_message_id])
+
+    def delete_queryset(self, request, queryset):
+        message_ids = list(queryset.values_list('original_message_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        recount_replies(message_ids)
+
+
+@admin.register(ReadState)
+class ReadStateAdmin(admin.ModelAdmin):
+    list_display = ('user', 'role', 'last_read_seq', 'unread_count', 'updated_at')
+    list_filter = ('role',)
+    search_fields = ('user__username',)
+
+
+@admin.register(ArchivedMessage)
+class ArchivedMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'target_role', 'status', 'created_at', 'archived_at')
+    list_filter = ('target_role', 'status')
+    search_fields = ('text', 'user__username')
+
+
+@admin.register(ArchivedVoiceMessage)
+class ArchivedVoiceMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'sender_name', 'target_group', 'priority', 'status', 'created_at', 'archived_at')
+    list_filter = ('priority', 'status', 'target_group')
+    search_fields = ('sender_name', 'transcribed_text')
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class MessagingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "messaging"
+
+    def ready(self):
+        import messaging.signals  # noqa
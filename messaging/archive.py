@@ -0,0 +1,127 @@
+"""
+Hot/cold archival of old messages.
+
+Messages older than ARCHIVE_AFTER_DAYS are moved, in batches of
+ARCHIVE_BATCH_SIZE, from the hot tables into the Archived* tables. Each
+batch is one transaction: parent rows and their children (replies of a
+Message, deliveries and legacy replies of a VoiceMessage) are copied with
+their original ids and then deleted, so a message is never half-archived. Only settled rows move:
+inbox messages still awaiting approval stay hot, and so do voice messages
+that are queued or still have pending or sent (unacknowledged) deliveries.
+
+The batch's parent rows are locked (SELECT ... FOR UPDATE) before their
+children are copied, so a reply or delivery update that races the batch
+waits for it and then fails against the deleted parent, instead of being
+cascade-deleted without reaching the archive. SQLite has no row locks, but
+it serializes writers: the batch's first write fails if anything committed
+after its reads.
+
+The hot tables, and every inbox, stats and admin query over them, stay
+bounded to the recent working set. Archived messages are read through the
+explicit "older" endpoints (inbox/older/, voice/older/).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Message, VoiceMessage, Delivery, ReplyMessage,
+    ArchivedMessage, ArchivedVoiceMessage, ArchivedDelivery, ArchivedReply,
+)
+from . import readstate
+
+logger = logging.getLogger(__name__)
+
+
+class Archive:
+    """A hot model, its archive model and the child tables moved with it."""
+
+    def __init__(self, model, archive, eligible, children=()):
+        self.model = model
+        self.archive = archive
+        self.eligible = eligible
+        self.children = children  # (hot child, archive child, fk attname)
+
+    def candidates(self, cutoff):
+        # Old rows have the lowest ids, so an id-ordered scan stops early
+        return self.eligible(self.model.objects.filter(created_at__lt=cutoff)).order_by('id')
+
+
+ARCHIVES = {
+    'messages': Archive(
+        Message, ArchivedMessage,
+        eligible=lambda qs: qs.exclude(status='pending'),
+        children=((ReplyMessage, ArchivedReply, 'original_message_id'),),
+    ),
+    'voice': Archive(
+        VoiceMessage, ArchivedVoiceMessage,
+        eligible=lambda qs: qs.exclude(status='QUEUED').filter(pending_count=0, sent_count=0),
+        children=(
+            (Delivery, ArchivedDelivery, 'message_id'),
+            (ReplyMessage, ArchivedReply, 'voice_message_id'),  # pre-threading replies
+        ),
+    ),
+}
+
+
+def _shared_fields(src, dst):
+    dst_fields = {f.attname for f in dst._meta.concrete_fields}
+    return [f.attname for f in src._meta.concrete_fields if f.attname in dst_fields]
+
+
+def _copy(qs, dst):
+    fields = _shared_fields(qs.model, dst)
+    rows = [dst(**dict(zip(fields, row))) for row in qs.values_list(*fields)]
+    dst.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def archive_batch(spec, cutoff, batch_size):
+    """Move one batch; returns the number of parent rows archived."""
+    with transaction.atomic():
+        locked = spec.candidates(cutoff).select_for_update(of=('self',))
+        ids = list(locked.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+        _copy(spec.model.objects.filter(id__in=ids), spec.archive)
+        for child, archived_child, fk in spec.children:
+            children = child.objects.filter(**{f'{fk}__in': ids})
+            _copy(children, archived_child)
+            children.delete()
+        if spec.model is Message:
+            roles = set(Message.objects.filter(id__in=ids).values_list('target_role', flat=True))
+        spec.model.objects.filter(id__in=ids).delete()
+        if spec.model is Message:
+            # Archived messages leave the hot inbox; let affected badges recount
+            for role in roles:
+                readstate.invalidate_counts(role)
+    return len(ids)
+
+
+def archive_old(days=None, batch_size=None, names=None):
+    """Archive everything older than `days`. Returns {name: rows archived}."""
+    days = settings.ARCHIVE_AFTER_DAYS if days is None else days
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=days)
+    moved = {}
+    for name in names or ARCHIVES:
+        spec = ARCHIVES[name]
+        total = 0
+        while True:
+            n = archive_batch(spec, cutoff, batch_size)
+            total += n
+            if n < batch_size:
+                break
+        moved[name] = total
+        logger.info("Archived %d %s older than %s", total, name, cutoff)
+    return moved
+
+
+def pending_counts(days=None):
+    """Rows that archive_old would move now (for --dry-run)."""
+    days = settings.ARCHIVE_AFTER_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return {name: spec.candidates(cutoff).count() for name, spec in ARCHIVES.items()}
@@ -0,0 +1,259 @@
+"""
+Audience resolution for role/group targeting.
+
+The app grew several role vocabularies (User.ROLE_CHOICES has FACULTY and
+STAFF, Contact uses STAFF for faculty, VoiceMessage targets BOTH, the inbox
+accepts ALL). Everything is normalised here and each process keeps a
+precomputed index from canonical role / group to sorted id arrays, so
+resolving an audience is a dictionary lookup instead of a query.
+
+The index is patched in place by model signals (see messaging.signals) and a
+version stamp in the cache tells other worker processes to rebuild.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from .models import Contact, Group
+
+User = get_user_model()
+
+ROLES = ('PRINCIPAL', 'VICE_PRINCIPAL', 'HOD', 'STAFF')
+
+# Aliases from the other vocabularies onto ROLES
+ROLE_ALIASES = {'FACULTY': 'STAFF'}
+
+# Targets that expand to more than one role
+TARGET_EXPANSIONS = {
+    'ALL': ROLES,
+    'BOTH': ('HOD', 'STAFF'),
+}
+
+VERSION_KEY = 'audience:version'
+
+# Safety net for missed invalidations (e.g. queryset.update() on roles)
+MAX_AGE_SECONDS = 300
+
+
+def canonical_role(role):
+    """Map any role spelling to one of ROLES; unknown/empty falls back to STAFF."""
+    role = ROLE_ALIASES.get(role, role)
+    return role if role in ROLES else 'STAFF'
+
+
+def expand_target(target):
+    """Canonical roles reached by a role or group-style target."""
+    if target in TARGET_EXPANSIONS:
+        return TARGET_EXPANSIONS[target]
+    return (canonical_role(target),)
+
+
+def inbox_targets(role):
+    """Every stored target_role value that a user with this role should see."""
+    if role == 'ALL':
+        return ['ALL']
+    role = canonical_role(role)
+    targets = {role, 'ALL'}
+    targets.update(t for t, roles in TARGET_EXPANSIONS.items() if role in roles)
+    targets.update(alias for alias, r in ROLE_ALIASES.items() if r == role)
+    return sorted(targets)
+
+
+def group_key(group_id):
+    return f'group:{group_id}'
+
+
+def _insert(ids, value):
+    i = bisect_left(ids, value)
+    if i == len(ids) or ids[i] != value:
+        ids.insert(i, value)
+
+
+def _remove(ids, value):
+    i = bisect_left(ids, value)
+    if i < len(ids) and ids[i] == value:
+        del ids[i]
+
+
+def _union(arrays):
+    if len(arrays) == 1:
+        return array('q', arrays[0])
+    merged = set()
+    for a in arrays:
+        merged.update(a)
+    return array('q', sorted(merged))
+
+
+class Audience:
+    __slots__ = ('user_ids', 'contact_ids')
+
+    def __init__(self, user_ids, contact_ids):
+        self.user_ids = user_ids
+        self.contact_ids = contact_ids
+
+    def __repr__(self):
+        return f"<Audience users={len(self.user_ids)} contacts={len(self.contact_ids)}>"
+
+
+class AudienceIndex:
+    """Per-process map of role / group key -> sorted array('q') of ids."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._users = None
+        self._contacts = None
+        self._groups = None
+        self._user_role = {}
+        self._contact_role = {}
+        self._contact_user = {}
+        self._user_contacts = {}
+        self._merged = {}
+        self._version = None
+        self._built_at = 0.0
+
+    # ---- building ----
+    def _build(self):
+        users = {r: array('q') for r in ROLES}
+        contacts = {r: array('q') for r in ROLES}
+        groups = {}
+        user_role, contact_role, contact_user, user_contacts = {}, {}, {}, {}
+
+        for uid, role in User.objects.filter(is_active=True).order_by('id').values_list('id', 'role').iterator():
+            role = canonical_role(role)
+            users[role].append(uid)
+            user_role[uid] = role
+        active_contacts = Contact.objects.filter(is_active=True).order_by('id')
+        for cid, role, uid in active_contacts.values_list('id', 'role', 'user_id').iterator():
+            role = canonical_role(role)
+            contacts[role].append(cid)
+            contact_role[cid] = role
+            contact_user[cid] = uid
+            user_contacts.setdefault(uid, array('q')).append(cid)
+        through = Group.contacts.through.objects.filter(contact__is_active=True)
+        for gid, cid in through.order_by('group_id', 'contact_id').values_list('group_id', 'contact_id').iterator():
+            groups.setdefault(gid, array('q')).append(cid)
+
+        self._users, self._contacts, self._groups = users, contacts, groups
+        self._user_role, self._contact_role = user_role, contact_role
+        self._contact_user = contact_user
+        self._user_contacts = user_contacts
+        self._merged = {}
+        self._built_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        version = cache.get(VERSION_KEY)
+        stale = (
+            self._users is None
+            or version != self._version
+            or time.monotonic() - self._built_at > MAX_AGE_SECONDS
+        )
+        if stale:
+            with self._lock:
+                self._build()
+                self._version = version
+
+    def _bump_version(self):
+        version = time.time_ns()
+        cache.set(VERSION_KEY, version, None)
+        # Our own copy was patched in place, so it is already current
+        self._version = version
+
+    def invalidate(self):
+        """Drop the index everywhere, e.g. after bulk writes that skip signals."""
+        with self._lock:
+            self._users = None
+            self._bump_version()
+
+    # ---- lookups ----
+    def resolve(self, target):
+        """Audience for an inbox/voice target (role, ALL, BOTH) or group:<id>."""
+        self._ensure_fresh()
+        if isinstance(target, str) and target.startswith('group:'):
+            return self.resolve_groups([int(target.split(':', 1)[1])])
+        roles = expand_target(target)
+        merged = self._merged.get(roles)
+        if merged is None:
+            merged = self._merged[roles] = (
+                _union([self._users[r] for r in roles]),
+                _union([self._contacts[r] for r in roles]),
+            )
+        return Audience(*merged)
+
+    def resolve_groups(self, group_ids):
+        """Contacts in any of the groups; user ids are their linked accounts."""
+        self._ensure_fresh()
+        contact_ids = _union([self._groups.get(g, array('q')) for g in group_ids] or [array('q')])
+        user_ids = array('q', sorted({self._contact_user[c] for c in contact_ids}))
+        return Audience(user_ids, contact_ids)
+
+    def contact_for_user(self, user_id):
+        """The user's first active contact profile id, or None."""
+        self._ensure_fresh()
+        ids = self._user_contacts.get(user_id)
+        return ids[0] if ids else None
+
+    # ---- incremental maintenance ----
+    def _patch(self, ids_by_role, role_by_id, obj_id, role, active):
+        self._merged = {}
+        old = role_by_id.pop(obj_id, None)
+        if old is not None:
+            _remove(ids_by_role[old], obj_id)
+        if active:
+            role = canonical_role(role)
+            _insert(ids_by_role[role], obj_id)
+            role_by_id[obj_id] = role
+
+    def user_changed(self, user, deleted=False):
+        active = user.is_active and not deleted
+        with self._lock:
+            if self._users is not None:
+                current = self._user_role.get(user.pk)
+                if current == (canonical_role(user.role) if active else None):
+                    return
+                self._patch(self._users, self._user_role, user.pk, user.role, active)
+            self._bump_version()
+
+    def contact_changed(self, contact, deleted=False):
+        with self._lock:
+            if self._contacts is not None:
+                active = contact.is_active and not deleted
+                self._patch(self._contacts, self._contact_role, contact.pk, contact.role, active)
+                old_user = self._contact_user.get(contact.pk)
+                if old_user is not None:
+                    _remove(self._user_contacts.get(old_user, array('q')), contact.pk)
+                if active:
+                    self._contact_user[contact.pk] = contact.user_id
+                    _insert(self._user_contacts.setdefault(contact.user_id, array('q')), contact.pk)
+                    for gid in contact.groups.values_list('id', flat=True):
+                        _insert(self._groups.setdefault(gid, array('q')), contact.pk)
+                else:
+                    self._contact_user.pop(contact.pk, None)
+                    for ids in self._groups.values():
+                        _remove(ids, contact.pk)
+            self._bump_version()
+
+    def group_changed(self, group_id, deleted=False):
+        with self._lock:
+            if self._groups is not None:
+                if deleted:
+                    self._groups.pop(group_id, None)
+                else:
+                    self._groups[group_id] = array('q', Group.contacts.through.objects.filter(
+                        group_id=group_id, contact__is_active=True,
+                    ).order_by('contact_id').values_list('contact_id', flat=True))
+            self._bump_version()
+
+
+index = AudienceIndex()
+
+
+def resolve(target):
+    return index.resolve(target)
+
+
+def contact_for_user(user_id):
+    return index.contact_for_user(user_id)
@@ -0,0 +1,131 @@
+"""
+Concurrent delivery dispatch.
+
+Deliveries are loaded as plain tuples (with the recipient fields needed to
+render a templated message, see templating.py), sent through a transport from a
+bounded thread pool (at most DELIVERY_MAX_IN_FLIGHT requests in flight),
+and the outcomes are written back in bulk: one UPDATE per source status for
+successes (which also close the recipients' circuit breakers), retry
+scheduling for failures.
+"""
+import logging
+import time
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Delivery
+from .services import move_delivery_counts
+from .retries import breaker, record_failure
+from . import templating
+from .transports import get_transport, message_payload, delivery_payload
+
+logger = logging.getLogger(__name__)
+
+UPDATE_CHUNK = 500
+RENDER_CHUNK = 2000
+
+DELIVERY_FIELDS = (
+    'id', 'message_id', 'recipient_id', 'status', 'retries',
+    'recipient__name', 'recipient__email', 'recipient__phone',
+    'recipient__role', 'recipient__department',
+)
+
+
+class DispatchReport:
+    def __init__(self, sent=0, failed=0, elapsed=0.0):
+        self.sent = sent
+        self.failed = failed
+        self.elapsed = elapsed
+
+    @property
+    def rate(self):
+        """Deliveries per second, successes and failures alike."""
+        total = self.sent + self.failed
+        return total / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return f"sent={self.sent} failed={self.failed} in {self.elapsed:.2f}s ({self.rate:.0f} deliveries/s)"
+
+
+def _send_all(transport, jobs, max_in_flight):
+    """Run transport.send over jobs with a bounded number in flight."""
+    results = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        in_flight = {}
+        for row, payload in jobs:
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    results.append((in_flight.pop(fut), fut.exception()))
+            in_flight[pool.submit(transport.send, payload)] = row
+        for fut in in_flight:
+            results.append((in_flight[fut], fut.exception()))
+    return results
+
+
+def _jobs(vm, rows):
+    """(row, payload) pairs; templated messages are rendered a chunk at a time."""
+    base = message_payload(vm)
+    compiled = templating.for_message(vm)
+    while True:
+        chunk = list(islice(rows, RENDER_CHUNK))
+        if not chunk:
+            return
+        if compiled is None:
+            for row in chunk:
+                yield row, delivery_payload(base, row[0], row[2], *row[5:8])
+            continue
+        texts = compiled.render_many([(row[5], row[8], row[9]) for row in chunk], vm.sender_name)
+        for row, text in zip(chunk, texts):
+            payload = delivery_payload(base, row[0], row[2], *row[5:8])
+            payload['text'] = text
+            yield row, payload
+
+
+def _apply_successes(rows):
+    by_status = {}
+    for row in rows:
+        by_status.setdefault((row[1], row[3]), []).append(row[0])
+    now = timezone.now()
+    for (message_id, old_status), ids in by_status.items():
+        for start in range(0, len(ids), UPDATE_CHUNK):
+            with transaction.atomic():
+                n = Delivery.objects.filter(pk__in=ids[start:start + UPDATE_CHUNK], status=old_status).update(
+                    status='DELIVERED', last_error='', next_attempt_at=None, updated_at=now
+                )
+                move_delivery_counts(message_id, old_status, 'DELIVERED', n)
+
+
+def dispatch(vm, deliveries, transport=None, max_in_flight=None, max_retries=None):
+    """
+    Send the given Delivery queryset of one VoiceMessage concurrently.
+    Returns a DispatchReport with throughput in deliveries/second.
+    """
+    rows = deliveries.values_list(*DELIVERY_FIELDS).iterator(chunk_size=RENDER_CHUNK)
+    return dispatch_rows(vm, rows, transport, max_in_flight, max_retries)
+
+
+def dispatch_rows(vm, rows, transport=None, max_in_flight=None, max_retries=None):
+    """Like dispatch(), for deliveries already loaded as DELIVERY_FIELDS tuples."""
+    transport = transport or get_transport()
+    max_in_flight = max_in_flight or settings.DELIVERY_MAX_IN_FLIGHT
+
+    started = time.perf_counter()
+    results = _send_all(transport, _jobs(vm, iter(rows)), max_in_flight)
+    elapsed = time.perf_counter() - started
+
+    ok = [row for row, error in results if error is None]
+    _apply_successes(ok)
+    breaker.record_successes({row[2] for row in ok})  # close the recipients' circuits
+    for row, error in results:
+        if error is not None:
+            record_failure(Delivery(pk=row[0], message_id=row[1], recipient_id=row[2],
+                                    status=row[3], retries=row[4]), error, max_retries)
+
+    report = DispatchReport(sent=len(ok), failed=len(results) - len(ok), elapsed=elapsed)
+    logger.info("Dispatched message %s via %s: %s", vm.id, transport.name, report)
+    return report
@@ -0,0 +1,162 @@
+"""
+Emergency broadcast fast path.
+
+An emergency goes to every active contact (push) and every active user
+(inbox) immediately, skipping moderation, the scheduler and the per-sender
+throttles:
+
+  - the recipient roster (every active contact, as ready-to-send tuples) is
+    kept in process memory and rebuilt only when the audience index version
+    changes, so a broadcast reads no contacts;
+  - the URGENT VoiceMessage (with its counters already set), all its
+    deliveries and an approved inbox Message are written in one transaction
+    with bulk inserts;
+  - as soon as that commits, a background thread pushes every delivery over
+    EMERGENCY_TRANSPORT with EMERGENCY_MAX_IN_FLIGHT requests in flight,
+    through a transport instance of its own that isn't rate limited. If that
+    transport can't be built (e.g. push without PUSH_ENDPOINT_URL) the
+    broadcast falls back to DELIVERY_TRANSPORT instead of failing.
+
+Deliveries are created PENDING with next_attempt_at leased
+EMERGENCY_LEASE_SECONDS ahead. The push thread clears it on success and
+schedules failures through retries.record_failure; whatever it doesn't
+finish (the worker was recycled, the push crashed) becomes due for the
+retry worker's sweep, which resumes it over the same transport.
+
+warm() (called from relay_project.warmup) builds the roster and transport at
+boot so the first emergency doesn't pay for them. `manage.py
+emergency_bench` measures POST-to-last-notification latency.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .audience import VERSION_KEY, MAX_AGE_SECONDS
+from .dispatch import dispatch_rows
+from .models import AuditLog, Contact, Delivery, VoiceMessage
+from .services import create_approved_message, update_message_status
+from .transports import TRANSPORTS, HttpTransport, TransportError
+
+logger = logging.getLogger(__name__)
+
+# Columns of a roster row; with the delivery ids they form dispatch.DELIVERY_FIELDS tuples
+ROSTER_FIELDS = ('id', 'name', 'email', 'phone', 'role', 'department')
+
+
+class Roster:
+    """Every active contact, rebuilt when the audience index version moves."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = None
+        self._version = None
+        self._built_at = 0.0
+
+    def rows(self):
+        version = cache.get(VERSION_KEY)
+        if (self._rows is None or version != self._version
+                or time.monotonic() - self._built_at > MAX_AGE_SECONDS):
+            with self._lock:
+                self._rows = tuple(
+                    Contact.objects.filter(is_active=True).order_by('id').values_list(*ROSTER_FIELDS)
+                )
+                self._version = version
+                self._built_at = time.monotonic()
+        return self._rows
+
+
+roster = Roster()
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def _build_transport(name):
+    if name not in TRANSPORTS:
+        raise TransportError(f"Unknown transport {name!r}")
+    cls = TRANSPORTS[name]
+    kwargs = {'rate_limit': 0}
+    if issubclass(cls, HttpTransport):
+        kwargs['pool_size'] = settings.EMERGENCY_MAX_IN_FLIGHT
+    return cls(**kwargs)
+
+
+def get_emergency_transport():
+    """
+    Process-wide, unthrottled instance of EMERGENCY_TRANSPORT, or of
+    DELIVERY_TRANSPORT when EMERGENCY_TRANSPORT is misconfigured.
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            try:
+                _transport = _build_transport(settings.EMERGENCY_TRANSPORT)
+            except TransportError as e:
+                logger.error("EMERGENCY_TRANSPORT %r unusable (%s); emergencies go out via %r",
+                             settings.EMERGENCY_TRANSPORT, e, settings.DELIVERY_TRANSPORT)
+                _transport = _build_transport(settings.DELIVERY_TRANSPORT)
+        return _transport
+
+
+def warm():
+    roster.rows()
+    # Built at boot, so a misconfigured transport is reported when the worker starts
+    transport = get_emergency_transport()
+    if isinstance(transport, HttpTransport):
+        transport.session  # noqa: B018 - builds the pooled session
+
+
+def _push(vm, rows):
+    try:
+        report = dispatch_rows(vm, rows, get_emergency_transport(), settings.EMERGENCY_MAX_IN_FLIGHT)
+        update_message_status(vm)
+        AuditLog.objects.create(event='EMERGENCY_PUSHED', details=f'Message {vm.id}: {report}')
+    except Exception:
+        logger.exception("Emergency push of message %s failed", vm.id)
+        # Don't wait for the lease: let the retry sweep pick up what's left now
+        Delivery.objects.filter(message_id=vm.id, status='PENDING', next_attempt_at__gt=timezone.now()).update(
+            next_attempt_at=timezone.now()
+        )
+    finally:
+        close_old_connections()
+
+
+def broadcast(text, sender):
+    """
+    Record an emergency and start pushing it once committed.
+    Returns (voice message, inbox message, recipient count).
+    """
+    contacts = roster.rows()
+    lease = timezone.now() + timedelta(seconds=settings.EMERGENCY_LEASE_SECONDS)
+    with transaction.atomic():
+        vm = VoiceMessage.objects.create(
+            sender_name=sender.username,
+            sender_role=getattr(sender, 'role', 'PRINCIPAL'),
+            target_group='ALL',
+            transcribed_text=text,
+            stt_status='SKIPPED',
+            priority='URGENT',
+            is_emergency=True,
+            status='SENT',
+            pending_count=len(contacts),
+        )
+        deliveries = Delivery.objects.bulk_create(
+            [Delivery(message_id=vm.id, recipient_id=c[0], next_attempt_at=lease) for c in contacts],
+            batch_size=2000,
+        )
+        inbox = create_approved_message(text=text, user=sender, target_role='ALL')
+        AuditLog.objects.create(event='EMERGENCY_BROADCAST', details=f'Message {vm.id} to {len(contacts)} contacts')
+        rows = [
+            (d.pk, vm.id, c[0], 'PENDING', 0, *c[1:])
+            for d, c in zip(deliveries, contacts)
+        ]
+        transaction.on_commit(
+            lambda: threading.Thread(target=_push, args=(vm, rows), name='emergency-push', daemon=True).start()
+        )
+    return vm, inbox, len(contacts)
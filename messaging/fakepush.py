@@ -0,0 +1,80 @@
+"""
+Local stand-in for a push gateway, for tests and benchmarks.
+
+Accepts JSON POSTs on any path, optionally sleeps to mimic network latency
+and fails a fraction of requests with HTTP 503. A GET on any path returns
+the received/failed counters as JSON. Run it standalone with
+`manage.py fake_push_server`, or in-process with start_in_thread().
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so client pooling is exercised
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if server.latency:
+            time.sleep(server.latency)
+        failed = server.failure_rate and random.random() < server.failure_rate
+        with server.lock:
+            server.received += 1
+            if failed:
+                server.failed += 1
+            elif server.keep_payloads:
+                server.payloads.append(json.loads(body or b'{}'))
+        status, reply = (503, b'{"error":"unavailable"}') if failed else (200, b'{"ok":true}')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            reply = json.dumps({'received': server.received, 'failed': server.failed}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class FakePushServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default backlog of 5 drops concurrent connects
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0, failure_rate=0.0,
+                 keep_payloads=False, verbose=False):
+        super().__init__((host, port), _Handler)
+        self.latency = latency_ms / 1000.0
+        self.failure_rate = failure_rate
+        self.keep_payloads = keep_payloads
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.received = 0
+        self.failed = 0
+        self.payloads = []
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/push'
+
+
+def start_in_thread(**kwargs):
+    """Start a FakePushServer on a free port; call .shutdown() when done."""
+    server = FakePushServer(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,180 @@
+"""
+Image pipeline for message attachments.
+
+After send_message stores an upload, the image is decoded once in a process
+pool (Pillow work is CPU-bound and holds the GIL) and re-encoded as:
+
+  - the original, with EXIF/XMP metadata stripped (orientation applied first)
+  - one WebP and one JPEG per width in IMAGE_VARIANT_WIDTHS, never upscaled
+  - a tiny blurred WebP as a data: URI placeholder for instant rendering
+
+The variants, dimensions and placeholder are recorded on the Message, so
+list views can load the smallest thumbnail first and fetch larger sizes on
+demand. IMAGE_WORKERS=0 runs the pipeline inline (development, tests).
+"""
+import base64
+import logging
+import multiprocessing
+import posixpath
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_SIZE = 16
+# Formats we can re-encode in place to strip metadata from the original
+REENCODE = {'JPEG': {'quality': 90}, 'PNG': {'optimize': True}, 'WEBP': {'quality': 90}}
+
+
+def _encode(img, fmt, **params):
+    buf = BytesIO()
+    img.save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+def _flatten(img):
+    """RGB copy for JPEG; transparent areas become white."""
+    from PIL import Image
+
+    if img.mode == 'RGBA':
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB')
+
+
+def render_variants(data, widths, quality):
+    """
+    Decode image bytes and produce every rendition. Runs in a pool process,
+    so it only deals in bytes and plain values (no Django).
+    """
+    from PIL import Image, ImageFilter, ImageOps
+
+    with Image.open(BytesIO(data)) as src:
+        fmt = src.format
+        img = ImageOps.exif_transpose(src)
+        img.load()
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+    width, height = img.size
+
+    original = None
+    if fmt in REENCODE:
+        # Saving without exif=/xmp= drops the metadata; keep the colour profile
+        params = dict(REENCODE[fmt], icc_profile=img.info.get('icc_profile'))
+        original = _encode(img if fmt != 'JPEG' else _flatten(img), fmt, **params)
+
+    targets = sorted({w for w in widths if w < width}) or [width]
+    if width not in targets and max(widths) >= width:
+        targets.append(width)
+    variants = []
+    for target in targets:
+        h = max(1, round(height * target / width))
+        resized = img if target == width else img.resize((target, h), Image.LANCZOS)
+        variants.append({
+            'width': target,
+            'height': h,
+            'webp': _encode(resized, 'WEBP', quality=quality, method=4),
+            'jpeg': _encode(_flatten(resized), 'JPEG', quality=quality, optimize=True, progressive=True),
+        })
+
+    tiny = img.copy()
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+    placeholder = 'data:image/webp;base64,' + base64.b64encode(_encode(tiny, 'WEBP', quality=30)).decode()
+
+    return {
+        'format': fmt,
+        'width': width,
+        'height': height,
+        'original': original,
+        'variants': variants,
+        'placeholder': placeholder,
+    }
+
+
+def _save(name, content):
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(content))
+
+
+def store_variants(message_ids, original_name, result):
+    """Write the renditions to storage and record them on every Message using the image."""
+    from .models import Message
+
+    if result['original'] is not None:
+        _save(original_name, result['original'])
+
+    stem = posixpath.splitext(posixpath.basename(original_name))[0]
+    base = posixpath.join('images', 'variants', stem)
+    variants = []
+    for v in result['variants']:
+        variants.append({
+            'width': v['width'],
+            'height': v['height'],
+            'webp': default_storage.url(_save(f"{base}/{v['width']}.webp", v['webp'])),
+            'jpeg': default_storage.url(_save(f"{base}/{v['width']}.jpg", v['jpeg'])),
+        })
+
+    Message.objects.filter(pk__in=message_ids).update(
+        image_width=result['width'],
+        image_height=result['height'],
+        image_placeholder=result['placeholder'],
+        image_variants=variants,
+    )
+    return variants
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded web worker can deadlock the child
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def _finish(message_ids, original_name, future):
+    try:
+        store_variants(message_ids, original_name, future.result())
+    except Exception:
+        logger.exception("Image pipeline failed for messages %s (%s)", message_ids, original_name)
+    finally:
+        # Runs on the executor's callback thread, outside any request
+        close_old_connections()
+
+
+def process_image(message_ids, original_name):
+    """Render and store variants for a stored image, inline or in the pool."""
+    with default_storage.open(original_name, 'rb') as fh:
+        data = fh.read()
+    args = (data, settings.IMAGE_VARIANT_WIDTHS, settings.IMAGE_QUALITY)
+    if settings.IMAGE_WORKERS <= 0:
+        try:
+            return store_variants(message_ids, original_name, render_variants(*args))
+        except Exception:
+            logger.exception("Image pipeline failed for messages %s (%s)", message_ids, original_name)
+            return None
+    future = get_pool().submit(render_variants, *args)
+    future.add_done_callback(lambda f: _finish(message_ids, original_name, f))
+    return future
+
+
+def schedule_image(message_ids, original_name):
+    """Queue the pipeline once the Message rows sharing the image are committed."""
+    message_ids = list(message_ids)
+    transaction.on_commit(lambda: process_image(message_ids, original_name))
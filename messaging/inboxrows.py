@@ -0,0 +1,117 @@
+"""
+Slim serialization of inbox messages.
+
+Produces the same rows as MessageSerializer without instantiating models or
+running DRF's per-field machinery:
+
+  - one values_list() query reading only the columns the requested fields
+    need; the sender's display name (first_name, else username) is computed
+    in SQL, so no User objects are loaded;
+  - absolute URLs are built by prefixing the scheme and host resolved once
+    per request instead of calling request.build_absolute_uri per URL, and
+    the timezone datetimes are rendered in is looked up once too;
+  - `?fields=id,text,...` (sparse fieldsets) limits the output to a subset
+    of MessageSerializer's fields.
+
+Used by MessageListView and InboxView. `manage.py serializer_bench` compares
+its throughput (rows/s) with MessageSerializer.
+"""
+from operator import itemgetter
+
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.utils.encoding import iri_to_uri
+from rest_framework import serializers
+
+from .audio import decode_waveform
+from .serializers import MessageSerializer
+
+FIELDS = tuple(MessageSerializer.Meta.fields)
+
+# output field -> columns it is built from
+COLUMNS = {
+    'image': ('image_url', 'image_width', 'image_height', 'image_placeholder', 'image_variants'),
+}
+
+SENDER_NAME = Coalesce(NullIf(F('user__first_name'), Value('')), F('user__username'))
+
+
+def requested_fields(request):
+    """Fields named in ?fields=, in MessageSerializer order; raises ValueError on unknown names."""
+    raw = request.query_params.get('fields')
+    if not raw:
+        return FIELDS
+    names = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = names.difference(FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(name for name in FIELDS if name in names)
+
+
+class AbsoluteURLs:
+    """MessageSerializer._absolute_url with the scheme and host looked up once."""
+
+    def __init__(self, request):
+        self.request = request
+        self.prefix = request.build_absolute_uri('/')[:-1] if request is not None else ''
+
+    def __call__(self, url):
+        if not url:
+            return ""
+        if self.request is None or url.startswith('http'):
+            return url
+        if url.startswith('/') and not url.startswith('//') and '/./' not in url and '/../' not in url:
+            return iri_to_uri(self.prefix + url)
+        return self.request.build_absolute_uri(url)
+
+
+def _getter(name, index, url, datetime):
+    """Function turning one values_list row into the value of field `name`."""
+    if name in ('audio_url', 'image_url'):
+        i = index[name]
+        return lambda row: url(row[i] or "")
+    if name == 'waveform':
+        i = index[name]
+        return lambda row: decode_waveform(row[i])
+    if name in ('created_at', 'last_reply_at'):
+        i = index[name]
+        return lambda row: None if row[i] is None else datetime(row[i])
+    if name == 'image':
+        src, width, height, placeholder, variants = (index[c] for c in COLUMNS['image'])
+
+        def image(row):
+            if not row[src]:
+                return None
+            resized = [
+                {**v, 'webp': url(v['webp']), 'jpeg': url(v['jpeg'])}
+                for v in row[variants] or []
+            ]
+            return {
+                'width': row[width],
+                'height': row[height],
+                'placeholder': row[placeholder],
+                'thumbnail_url': resized[0]['webp'] if resized else url(row[src]),
+                'variants': resized,
+            }
+        return image
+    return itemgetter(index[name])
+
+
+def serialize(qs, request, fields=FIELDS):
+    """List of dicts equal to MessageSerializer(qs, many=True).data restricted to `fields`."""
+    columns = []
+    for name in fields:
+        for column in COLUMNS.get(name, (name,)):
+            if column not in columns:
+                columns.append(column)
+    index = {column: i for i, column in enumerate(columns)}
+    url = AbsoluteURLs(request)
+    datetime_field = serializers.DateTimeField()
+    # DRF looks the current timezone up on every value unless the field has one
+    datetime_field.timezone = datetime_field.default_timezone()
+    datetime = datetime_field.to_representation
+    getters = [(name, _getter(name, index, url, datetime)) for name in fields]
+    if 'from_field' in columns:
+        qs = qs.annotate(from_field=SENDER_NAME)
+    rows = qs.values_list(*columns)
+    return [{name: get(row) for name, get in getters} for row in rows]
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from messaging.archive import ARCHIVES, archive_old, pending_counts
+from relay_project.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Move messages older than ARCHIVE_AFTER_DAYS into the archive tables, in batches, and purge expired idempotency keys."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--only', choices=sorted(ARCHIVES), action='append',
+                            help="Archive only these tables (repeatable)")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many rows would move")
+
+    def handle(self, *args, **opts):
+        if opts['dry_run']:
+            for name, n in pending_counts(opts['days']).items():
+                self.stdout.write(f"{name}: {n} to archive")
+            return
+        moved = archive_old(opts['days'], opts['batch_size'], opts['only'])
+        for name, n in moved.items():
+            self.stdout.write(f"{name}: archived {n}")
+        self.stdout.write(f"idempotency keys: purged {purge_expired()} expired")
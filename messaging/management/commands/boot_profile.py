@@ -0,0 +1,111 @@
+"""
+Measure worker cold start: per-module import cost of relay_project.wsgi
+(from `python -X importtime`) and the time to the first response.
+
+Each run uses a fresh interpreter, so nothing is already imported.
+"""
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in the child interpreter: import the WSGI app, then serve one request
+FIRST_RESPONSE_PROBE = r"""
+import json, sys, time
+started = time.perf_counter()
+import relay_project.wsgi as wsgi
+loaded = time.perf_counter()
+from wsgiref.util import setup_testing_defaults
+environ = {'PATH_INFO': sys.argv[1], 'HTTP_HOST': sys.argv[2]}
+setup_testing_defaults(environ)
+status = []
+body = b''.join(wsgi.application(environ, lambda s, h, exc_info=None: status.append(s)))
+done = time.perf_counter()
+print(json.dumps({'import': loaded - started, 'first_response': done - loaded,
+                  'total': done - started, 'status': status[0], 'bytes': len(body)}))
+"""
+
+
+def parse_importtime(stderr):
+    """Yield (module, self_us, cumulative_us, depth) from -X importtime output."""
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        yield name.strip(), int(self_us), int(cumulative_us), depth
+
+
+class Command(BaseCommand):
+    help = "Profile import time of relay_project.wsgi and cold-start-to-first-response."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25, help="Modules to list by cumulative time")
+        parser.add_argument('--path', default='/', help="Path for the first-response probe")
+        parser.add_argument('--runs', type=int, default=3, help="Cold starts to average for the probe")
+        parser.add_argument('--no-warm', action='store_true', help="Profile with WARM_ON_BOOT=False")
+        parser.add_argument('--json', action='store_true', help="Print a JSON report")
+
+    def _child_env(self, opts):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'relay_project.settings'))
+        if opts['no_warm']:
+            env['WARM_ON_BOOT'] = 'False'
+        return env
+
+    def handle(self, *args, **opts):
+        env = self._child_env(opts)
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import relay_project.wsgi'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        modules = list(parse_importtime(proc.stderr))
+        if proc.returncode:
+            self.stderr.write(proc.stderr[-2000:])
+            return
+
+        by_package = defaultdict(int)
+        for name, self_us, _, _ in modules:
+            by_package[name.split('.')[0]] += self_us
+        top_modules = sorted(modules, key=lambda m: m[2], reverse=True)[:opts['top']]
+
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+        probes = []
+        for _ in range(opts['runs']):
+            run = subprocess.run(
+                [sys.executable, '-c', FIRST_RESPONSE_PROBE, opts['path'], host],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            )
+            if run.returncode:
+                self.stderr.write(run.stderr[-2000:])
+                return
+            probes.append(json.loads(run.stdout.strip().splitlines()[-1]))
+        avg = {key: sum(p[key] for p in probes) / len(probes) for key in ('import', 'first_response', 'total')}
+
+        report = {
+            'modules': len(modules),
+            'import_total_ms': sum(m[1] for m in modules) / 1000,
+            'packages_ms': {k: v / 1000 for k, v in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)},
+            'top_modules_ms': [{'module': n, 'self': s / 1000, 'cumulative': c / 1000} for n, s, c, _ in top_modules],
+            'cold_start_ms': {k: v * 1000 for k, v in avg.items()},
+            'first_response_status': probes[0]['status'],
+        }
+        if opts['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{report['modules']} modules imported, {report['import_total_ms']:.0f}ms total self time")
+        self.stdout.write("\nBy top-level package (self ms):")
+        for name, ms in list(report['packages_ms'].items())[:opts['top']]:
+            self.stdout.write(f"  {ms:9.1f}  {name}")
+        self.stdout.write("\nSlowest modules (cumulative ms / self ms):")
+        for m in report['top_modules_ms']:
+            self.stdout.write(f"  {m['cumulative']:9.1f} {m['self']:9.1f}  {m['module']}")
+        cold = report['cold_start_ms']
+        self.stdout.write(
+            f"\nCold start over {opts['runs']} runs: import {cold['import']:.0f}ms + first response "
+            f"{cold['first_response']:.0f}ms = {cold['total']:.0f}ms ({report['first_response_status']} for {opts['path']})"
+        )
@@ -0,0 +1,159 @@
+"""
+End-to-end latency of an emergency broadcast.
+
+A fresh SQLite database is migrated and seeded with --users active users
+(each with a contact) and a fake push gateway (`fake_push_server`) is
+started in its own process. A child process then warms the emergency path
+like a booted worker and POSTs emergencies to /api/messages/emergency/.
+For each round it reports the POST response time and the time from POST
+until the gateway has received the push for the last recipient.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+class Command(BaseCommand):
+    help = "Benchmark emergency broadcast latency from POST until the last recipient is notified."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--rounds', type=int, default=3)
+        parser.add_argument('--latency-ms', type=float, default=0, help="Simulated push gateway latency")
+        parser.add_argument('--max-in-flight', type=int, help="Overrides EMERGENCY_MAX_IN_FLIGHT")
+        parser.add_argument('--json', action='store_true', help="Print a JSON report")
+        # Internal: the same command seeds and runs the rounds in a child process
+        parser.add_argument('--role', choices=['seed', 'run'], help="(internal)")
+        parser.add_argument('--push-url', help="(internal)")
+
+    def handle(self, *args, **opts):
+        if opts['role'] == 'seed':
+            return self._seed(opts['users'])
+        if opts['role'] == 'run':
+            return self._run(opts)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ, SQLITE_PATH=os.path.join(tmp, 'emergency.sqlite3'), CACHE_BACKEND='memory',
+                SQLITE_HIGH_CONCURRENCY='True', WARM_ON_BOOT='False', EMERGENCY_TRANSPORT='push',
+                DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'relay_project.settings'),
+            )
+            if opts['max_in_flight']:
+                env['EMERGENCY_MAX_IN_FLIGHT'] = str(opts['max_in_flight'])
+            subprocess.run(self._manage('migrate', '--verbosity', '0'), env=env, check=True, cwd=settings.BASE_DIR)
+            subprocess.run(self._manage('emergency_bench', '--role', 'seed', '--users', str(opts['users'])),
+                           env=env, check=True, cwd=settings.BASE_DIR)
+            port = self._free_port()
+            gateway = subprocess.Popen(
+                self._manage('fake_push_server', '--port', str(port), '--latency-ms', str(opts['latency_ms'])),
+                env=env, cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL,
+            )
+            try:
+                push_url = f'http://127.0.0.1:{port}/push'
+                self._wait_for(push_url)
+                out = subprocess.run(
+                    self._manage('emergency_bench', '--role', 'run', '--users', str(opts['users']),
+                                 '--rounds', str(opts['rounds']), '--push-url', push_url),
+                    env=env, check=True, cwd=settings.BASE_DIR, stdout=subprocess.PIPE, text=True,
+                ).stdout
+            finally:
+                gateway.terminate()
+                gateway.wait()
+        rounds = json.loads(out.strip().splitlines()[-1])
+
+        if opts['json']:
+            self.stdout.write(json.dumps(rounds, indent=2))
+            return
+        self.stdout.write(f"{opts['users']} recipients, gateway latency {opts['latency_ms']:g}ms")
+        self.stdout.write(f"{'round':<6} {'POST':>9} {'last notified':>14} {'pushes/s':>9}")
+        for i, r in enumerate(rounds, 1):
+            self.stdout.write(f"{i:<6} {r['post_ms']:8.0f}ms {r['last_notified_ms']:13.0f}ms {r['pushes_per_s']:9.0f}")
+        notified = [r['last_notified_ms'] for r in rounds]
+        self.stdout.write(f"last notified: best {min(notified):.0f}ms, median {_percentile(notified, 50):.0f}ms")
+
+    def _manage(self, *args):
+        return [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), *args]
+
+    def _free_port(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def _wait_for(self, url, timeout=30):
+        import requests
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return requests.get(url, timeout=1).json()
+            except requests.ConnectionError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    # ---- child processes ----
+    def _seed(self, n):
+        from django.contrib.auth import get_user_model
+        from messaging.models import Contact
+
+        User = get_user_model()
+        User.objects.create(username='bench_principal', role='PRINCIPAL')
+        users = User.objects.bulk_create(
+            [User(username=f'bench_{i}', email=f'bench_{i}@example.edu', role='STAFF') for i in range(n)],
+            batch_size=2000,
+        )
+        Contact.objects.bulk_create(
+            [Contact(name=f'Bench {i}', email=u.email, role='STAFF', user=u) for i, u in enumerate(users)],
+            batch_size=2000,
+        )
+
+    def _run(self, opts):
+        from django.contrib.auth import get_user_model
+        from django.test import Client
+        from django.test.utils import override_settings
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        import requests
+
+        from relay_project import warmup
+
+        stats = requests.Session()
+        principal = get_user_model().objects.get(username='bench_principal')
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(principal)}')
+        rounds = []
+        with override_settings(ALLOWED_HOSTS=['*'], PUSH_ENDPOINT_URL=opts['push_url']):
+            warmup.warm()
+            for i in range(opts['rounds']):
+                expected = stats.get(opts['push_url']).json()['received'] + opts['users']
+                started = time.perf_counter()
+                response = client.post('/api/messages/emergency/', {'text': f'Emergency drill {i}'},
+                                       content_type='application/json')
+                post_done = time.perf_counter()
+                if response.status_code != 202:
+                    raise RuntimeError(f"Emergency POST returned {response.status_code}: {response.content!r}")
+                while True:
+                    counts = stats.get(opts['push_url']).json()
+                    if counts['received'] >= expected:
+                        break
+                    time.sleep(0.005)
+                finished = time.perf_counter()
+                rounds.append({
+                    'post_ms': (post_done - started) * 1000,
+                    'last_notified_ms': (finished - started) * 1000,
+                    'pushes_per_s': opts['users'] / (finished - started),
+                    'failed': counts['failed'],
+                })
+                time.sleep(0.5)  # let the push thread finish its status write-back
+        self.stdout.write(json.dumps(rounds))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from messaging.fakepush import FakePushServer
+
+
+class Command(BaseCommand):
+    help = "Run a local fake push gateway (point PUSH_ENDPOINT_URL at it)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8099)
+        parser.add_argument('--latency-ms', type=float, default=0)
+        parser.add_argument('--failure-rate', type=float, default=0.0)
+        parser.add_argument('--verbose', action='store_true')
+
+    def handle(self, *args, **opts):
+        server = FakePushServer(opts['host'], opts['port'], opts['latency_ms'],
+                                opts['failure_rate'], verbose=opts['verbose'])
+        self.stdout.write(f"Fake push server listening on {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write(f"received={server.received} failed={server.failed}")
+            server.server_close()
@@ -0,0 +1,191 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from messaging.models import VoiceMessage
+from relay_project.queryaudit import QueryAudit
+
+User = get_user_model()
+
+DEFAULT_SCENARIOS = ['inbox', 'send', 'pending', 'deliveries', 'admin-stats']
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the real URL routes in-process and report p50/p95/p99 latency, "
+        "throughput and query counts. Runs against the configured database "
+        "(seed it with seed_scale first); the send scenario creates messages."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default=','.join(DEFAULT_SCENARIOS),
+                            help=f"Comma separated subset of: {', '.join(DEFAULT_SCENARIOS)}")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per scenario")
+        parser.add_argument('--concurrency', type=int, default=1, help="Client threads per scenario")
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--save', metavar='PATH', help="Store the results as a baseline JSON file")
+        parser.add_argument('--compare', metavar='PATH', help="Diff the results against a stored baseline")
+        parser.add_argument('--throttle', action='store_true',
+                            help="Keep THROTTLE_BUCKETS on (by default the one load test user would be throttled)")
+
+    def handle(self, *args, **opts):
+        self._prepare_actors()
+        scenarios = self._scenarios()
+        wanted = [s.strip() for s in opts['scenarios'].split(',') if s.strip()]
+        unknown = set(wanted) - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        results = {}
+        # The test client talks to "testserver"; metrics/audit middleware stay on.
+        # Every request comes from one user, so the per-user send/upload buckets
+        # would turn the send scenario into a measurement of the throttle.
+        overrides = {'ALLOWED_HOSTS': ['*']}
+        if not opts['throttle']:
+            overrides['THROTTLE_BUCKETS'] = {}
+        with override_settings(**overrides):
+            for name in wanted:
+                results[name] = self._run(name, scenarios[name], opts)
+                self._print_row(name, results[name])
+
+        if opts['compare']:
+            self._compare(results, Path(opts['compare']))
+        if opts['save']:
+            Path(opts['save']).write_text(json.dumps(
+                {'results': results, 'database': settings.DATABASES['default']['ENGINE']}, indent=2
+            ))
+            self.stdout.write(f"Baseline written to {opts['save']}")
+
+    # ---- setup ----
+    def _actor(self, username, **fields):
+        user, _ = User.objects.update_or_create(username=username, defaults=fields)
+        return user
+
+    def _prepare_actors(self):
+        self.principal = self._actor('loadtest_principal@srm.edu.in', email='loadtest_principal@srm.edu.in',
+                                     role='PRINCIPAL')
+        self.staff = self._actor('loadtest_staff@srm.edu.in', email='loadtest_staff@srm.edu.in', role='STAFF')
+        self.admin = self._actor('loadtest_admin@srm.edu.in', email='loadtest_admin@srm.edu.in',
+                                 role='PRINCIPAL', is_staff=True)
+        self.voice_id = (
+            VoiceMessage.objects.order_by('-id').values_list('id', flat=True).first()
+            or VoiceMessage.objects.create(sender_name='loadtest').id
+        )
+
+    def _client(self, user):
+        client = Client()
+        client.force_login(user)  # session auth for plain Django views (pending/)
+        client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(user)}'
+        return client
+
+    def _scenarios(self):
+        voice_id = self.voice_id
+        return {
+            'inbox': (self.staff, lambda c, i: c.get('/api/messages/inbox/')),
+            'send': (self.principal, lambda c, i: c.post('/api/messages/send/', {
+                'message_text': f'Load test message {i}', 'target_group': 'STAFF',
+            })),
+            'pending': (self.principal, lambda c, i: c.get('/api/messages/pending/')),
+            'deliveries': (self.staff, lambda c, i: c.get(f'/api/messages/voice/{voice_id}/deliveries/')),
+            'admin-stats': (self.admin, lambda c, i: c.get('/api/messages/admin-stats/')),
+        }
+
+    # ---- running ----
+    def _run(self, name, scenario, opts):
+        user, call = scenario
+        total, threads = opts['requests'], max(opts['concurrency'], 1)
+        warm_client = self._client(user)
+        for i in range(opts['warmup']):
+            call(warm_client, i)
+
+        latencies, queries, sizes, errors = [], [], [], []
+        lock = threading.Lock()
+        counter = iter(range(total))
+
+        def worker():
+            client = self._client(user)
+            try:
+                while True:
+                    with lock:
+                        i = next(counter, None)
+                    if i is None:
+                        return
+                    with QueryAudit(explain=False) as audit:
+                        start = time.perf_counter()
+                        response = call(client, i)
+                        elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                        queries.append(audit.count)
+                        sizes.append(len(response.content))
+                        if response.status_code >= 400:
+                            errors.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        if threads == 1:
+            worker()
+        else:
+            pool = [threading.Thread(target=worker) for _ in range(threads)]
+            for t in pool:
+                t.start()
+            for t in pool:
+                t.join()
+        wall = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'throughput_rps': round(len(latencies) / wall, 1) if wall else 0.0,
+            'queries_avg': round(sum(queries) / len(queries), 1) if queries else 0.0,
+            'queries_max': max(queries, default=0),
+            'bytes_avg': int(sum(sizes) / len(sizes)) if sizes else 0,
+        }
+
+    # ---- reporting ----
+    def _print_row(self, name, r):
+        self.stdout.write(
+            f"{name:<12} n={r['requests']:<5} err={r['errors']:<3} "
+            f"p50={r['p50_ms']:>8.2f}ms p95={r['p95_ms']:>8.2f}ms p99={r['p99_ms']:>8.2f}ms "
+            f"rps={r['throughput_rps']:>7.1f} queries={r['queries_avg']:>5.1f} (max {r['queries_max']}) "
+            f"bytes={r['bytes_avg']}"
+        )
+
+    def _compare(self, results, path):
+        if not path.exists():
+            raise CommandError(f"Baseline {path} not found")
+        baseline = json.loads(path.read_text())['results']
+        self.stdout.write(f"\nCompared with {path}:")
+        for name, r in results.items():
+            base = baseline.get(name)
+            if not base:
+                self.stdout.write(f"{name:<12} (no baseline)")
+                continue
+            parts = []
+            for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_avg'):
+                before, after = base[key], r[key]
+                change = ((after - before) / before * 100) if before else 0.0
+                parts.append(f"{key}={after} ({change:+.0f}%)")
+            self.stdout.write(f"{name:<12} " + ' '.join(parts))
@@ -0,0 +1,86 @@
+"""
+Render CPU time and payload size of the large list responses.
+
+Serializes the payloads of the inbox list (MessageListView), groups
+(GroupsView) and deliveries of the largest voice message
+(DeliveriesForMessageView) from the current database once, then times
+rendering them with DRF's JSONRenderer (the baseline), FastJSONRenderer and,
+when msgpack is installed, MessagePackRenderer. For the JSON body it also
+reports the gzip and (when brotli is installed) br sizes and compression
+time at the configured levels. Run `manage.py seed_scale` first for
+realistic sizes.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from relay_project import compression
+from relay_project.renderers import RENDERERS
+from messaging import refcache
+from messaging.models import Delivery, Message, VoiceMessage
+from messaging.serializers import DeliverySerializer, MessageSerializer
+
+
+def _best(fn, repeat):
+    """(best seconds, result) over `repeat` calls."""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+class Command(BaseCommand):
+    help = "Benchmark JSON/MessagePack rendering and gzip/br compression of the list endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help="Max messages / deliveries to render")
+        parser.add_argument('--repeat', type=int, default=5, help="Best of N timings")
+        parser.add_argument('--json', action='store_true', help="Print a JSON report")
+
+    def _payloads(self, rows):
+        request = RequestFactory().get('/api/messages/', HTTP_HOST=(settings.ALLOWED_HOSTS or ['localhost'])[0])
+        messages = Message.objects.filter(status='approved').select_related('user').order_by('-created_at')[:rows]
+        payloads = {'messages': MessageSerializer(messages, many=True, context={'request': request}).data,
+                    'groups': refcache.DATASETS['groups']()}
+        vm = VoiceMessage.objects.annotate(n=Count('deliveries')).order_by('-n').first()
+        if vm is not None:
+            deliveries = Delivery.objects.filter(message=vm).select_related('recipient').order_by('id')[:rows]
+            payloads['deliveries'] = DeliverySerializer(deliveries, many=True).data
+        return payloads
+
+    def handle(self, *args, **opts):
+        renderers = {'drf-json': JSONRenderer(), **{f'fast-{fmt}': cls() for fmt, cls in RENDERERS.items()}}
+        encodings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+        report = {}
+        for name, data in self._payloads(opts['rows']).items():
+            entry = report[name] = {'items': len(data), 'render': {}, 'compress': {}}
+            for label, renderer in renderers.items():
+                seconds, body = _best(lambda: renderer.render(data), opts['repeat'])
+                entry['render'][label] = {'ms': seconds * 1000, 'bytes': len(body)}
+                if label == 'fast-json':
+                    json_body = body
+            if json.loads(json_body) != json.loads(renderers['drf-json'].render(data)):
+                raise RuntimeError(f"FastJSONRenderer output differs from JSONRenderer for {name}")
+            for coding in encodings:
+                seconds, body = _best(lambda: compression.compress(json_body, coding), opts['repeat'])
+                entry['compress'][coding] = {'ms': seconds * 1000, 'bytes': len(body)}
+
+        if opts['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for name, entry in report.items():
+            base = entry['render']['drf-json']
+            self.stdout.write(f"{name}: {entry['items']} items")
+            for label, r in entry['render'].items():
+                self.stdout.write(f"  {label:<12} {r['ms']:9.2f}ms {r['bytes']:>10} B  x{base['ms'] / max(r['ms'], 1e-9):.1f}")
+            for coding, c in entry['compress'].items():
+                ratio = c['bytes'] / max(base['bytes'], 1)
+                self.stdout.write(f"  {coding:<12} {c['ms']:9.2f}ms {c['bytes']:>10} B  {ratio:.0%} of JSON")
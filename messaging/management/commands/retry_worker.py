@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from messaging.retries import process_due_retries
+
+
+class Command(BaseCommand):
+    help = "Retry failed deliveries whose backoff has expired, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds to sleep when no retries are due")
+        parser.add_argument('--once', action='store_true', help="Process due retries once and exit")
+
+    def handle(self, *args, **opts):
+        while True:
+            sent, failed, deferred = process_due_retries(opts['batch_size'])
+            if sent or failed or deferred:
+                self.stdout.write(f"retried: sent={sent} failed={failed} deferred={deferred}")
+            if opts['once']:
+                if sent + failed + deferred < opts['batch_size']:
+                    return
+                continue
+            if sent + failed + deferred < opts['batch_size']:
+                # Queue drained; a full batch means more is due right now
+                time.sleep(opts['interval'])
@@ -0,0 +1,22 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from messaging import scheduler
+
+
+class Command(BaseCommand):
+    help = "Send scheduled voice messages at their scheduled_for time (see messaging/scheduler.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon', type=float, help="Seconds ahead to keep in memory")
+        parser.add_argument('--resync', type=float, help="Seconds between full resyncs from the database")
+        parser.add_argument('--workers', type=int, help="Concurrent sends")
+
+    def handle(self, *args, **opts):
+        logging.getLogger('messaging.scheduler').setLevel(logging.DEBUG if opts['verbosity'] > 1 else logging.INFO)
+        self.stdout.write("Scheduler running; Ctrl-C to stop")
+        try:
+            scheduler.run(horizon=opts['horizon'], resync_interval=opts['resync'], workers=opts['workers'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,254 @@
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from messaging.models import (
+    Contact, Group, VoiceMessage, Delivery, ReplyMessage, Message, ReadState,
+)
+from messaging.audience import index as audience_index
+from messaging import readstate, refcache
+from messaging.services import recount_deliveries, recount_replies
+
+User = get_user_model()
+
+PREFIX = 'seed_'
+
+USER_ROLES = [('STAFF', 70), ('FACULTY', 15), ('HOD', 12), ('VICE_PRINCIPAL', 2), ('PRINCIPAL', 1)]
+MESSAGE_TARGETS = [('ALL', 40), ('STAFF', 35), ('HOD', 20), ('VICE_PRINCIPAL', 3), ('PRINCIPAL', 2)]
+VOICE_TARGETS = [('BOTH', 60), ('STAFF', 25), ('HOD', 15)]
+DELIVERY_STATUSES = [('READ', 55), ('DELIVERED', 30), ('SENT', 8), ('PENDING', 5), ('FAILED', 2)]
+DEPARTMENTS = ['CSE', 'ECE', 'EEE', 'MECH', 'CIVIL', 'IT', 'BIOTECH', 'MBA', 'PHYSICS', 'MATHS']
+FIRST_NAMES = ['Arun', 'Priya', 'Karthik', 'Divya', 'Rahul', 'Sneha', 'Vijay', 'Anitha', 'Suresh', 'Lakshmi',
+               'Ravi', 'Meena', 'Ganesh', 'Kavya', 'Ashok', 'Deepa', 'Manoj', 'Revathi', 'Prakash', 'Nandhini']
+SNIPPETS = ['Staff meeting at 3 PM in the main hall.', 'Submit internal marks by Friday.',
+            'Exam duty roster has been updated.', 'Campus will remain closed tomorrow.',
+            'Department heads: budget review next week.', 'Please update attendance before noon.',
+            'Fire drill scheduled for Monday morning.', 'Guest lecture in the seminar hall today.']
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+@contextmanager
+def _backdated(*fields):
+    """Let bulk_create keep explicit created_at values instead of now()."""
+    saved = [f.auto_now_add for f in fields]
+    for f in fields:
+        f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, value in zip(fields, saved):
+            f.auto_now_add = value
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-generate a synthetic dataset (users, contacts, groups, messages, voice "
+        "messages, deliveries, replies) for load testing. Seeded rows use the "
+        f"'{PREFIX}' username prefix and can be removed with --clear."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000)
+        parser.add_argument('--contacts', type=int, default=None, help="Defaults to --users")
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--group-size', type=int, default=200)
+        parser.add_argument('--messages', type=int, default=2000000)
+        parser.add_argument('--voice-messages', type=int, default=2000)
+        parser.add_argument('--deliveries-per-voice', type=int, default=500)
+        parser.add_argument('--replies', type=int, default=20000)
+        parser.add_argument('--days', type=int, default=365, help="Spread created_at over this many days")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true', help="Delete previously seeded rows and exit")
+
+    def handle(self, *args, **opts):
+        if opts['clear']:
+            self._clear()
+        else:
+            self.rng = random.Random(opts['seed'])
+            self.batch = opts['batch_size']
+            self.now = timezone.now()
+            self.days = opts['days']
+            started = time.perf_counter()
+            users = self._users(opts['users'])
+            contacts = self._contacts(users, opts['contacts'] or opts['users'])
+            self._groups(contacts, opts['groups'], opts['group_size'])
+            self._messages(users, opts['messages'])
+            voice = self._voice_messages(opts['voice_messages'])
+            self._deliveries(voice, contacts, opts['deliveries_per_voice'])
+            self._replies(contacts, opts['replies'])
+            self.stdout.write(self.style.SUCCESS(f"Seeded in {time.perf_counter() - started:.1f}s"))
+
+        # bulk_create/delete skip signals, so drop derived state explicitly
+        audience_index.invalidate()
+        refcache.invalidate(*refcache.DATASETS)
+        readstate.sequence_unsequenced()
+        ReadState.objects.update(unread_count=None)
+
+    # ---- helpers ----
+    def _timestamp(self):
+        return self.now - timedelta(seconds=self.rng.randrange(self.days * 86400))
+
+    def _bulk(self, model, rows, label):
+        created = 0
+        for start in range(0, len(rows), self.batch):
+            with transaction.atomic():
+                model.objects.bulk_create(rows[start:start + self.batch])
+            created += len(rows[start:start + self.batch])
+        self.stdout.write(f"  {label}: {created}")
+
+    def _stream(self, model, total, make_row, label):
+        """bulk_create `total` rows without holding them all in memory."""
+        done = 0
+        while done < total:
+            n = min(self.batch, total - done)
+            with transaction.atomic():
+                model.objects.bulk_create([make_row() for _ in range(n)])
+            done += n
+            if done % (self.batch * 20) == 0 or done == total:
+                self.stdout.write(f"  {label}: {done}/{total}")
+
+    # ---- generators ----
+    def _users(self, n):
+        start = User.objects.filter(username__startswith=PREFIX).count()
+        rows = []
+        for i in range(start, start + n):
+            first = self.rng.choice(FIRST_NAMES)
+            rows.append(User(
+                username=f'{PREFIX}{i}@srm.edu.in',
+                email=f'{PREFIX}{i}@srm.edu.in',
+                first_name=first,
+                last_name=self.rng.choice(DEPARTMENTS),
+                role=_weighted(self.rng, USER_ROLES),
+                password='!',  # unusable; avoids hashing cost
+                is_active=self.rng.random() > 0.02,
+            ))
+        self._bulk(User, rows, 'users')
+        return list(User.objects.filter(username__startswith=PREFIX).values_list('id', 'role', 'first_name'))
+
+    def _contacts(self, users, n):
+        # Only users without a seeded contact, so re-running doesn't duplicate them
+        linked = set(Contact.objects.filter(email__startswith=PREFIX).values_list('user_id', flat=True))
+        rows = []
+        for uid, role, first in [u for u in users if u[0] not in linked][:n]:
+            contact_role = 'STAFF' if role in (None, 'FACULTY') else role
+            rows.append(Contact(
+                name=f'{first} {uid}',
+                email=f'{PREFIX}{uid}@srm.edu.in',
+                phone=f'9{self.rng.randrange(10 ** 9):09d}',
+                role=contact_role,
+                is_active=self.rng.random() > 0.03,
+                user_id=uid,
+            ))
+        self._bulk(Contact, rows, 'contacts')
+        return list(Contact.objects.filter(email__startswith=PREFIX).values_list('id', flat=True))
+
+    def _groups(self, contacts, n, size):
+        existing = Group.objects.filter(name__startswith=PREFIX).count()
+        groups = [Group(name=f'{PREFIX}{DEPARTMENTS[i % len(DEPARTMENTS)]}-{i}') for i in range(existing, existing + n)]
+        self._bulk(Group, groups, 'groups')
+        Through = Group.contacts.through
+        links = []
+        for gid in Group.objects.filter(name__startswith=PREFIX).order_by('id').values_list('id', flat=True)[existing:]:
+            for cid in self.rng.sample(contacts, min(size, len(contacts))):
+                links.append(Through(group_id=gid, contact_id=cid))
+        self._bulk(Through, links, 'group memberships')
+
+    def _messages(self, users, n):
+        senders = [uid for uid, role, _ in users if role in ('PRINCIPAL', 'VICE_PRINCIPAL')] or [users[0][0]]
+
+        def row():
+            return Message(
+                text=self.rng.choice(SNIPPETS),
+                audio_url=f'/media/audio/seed_{self.rng.randrange(1000)}.m4a' if self.rng.random() < 0.2 else None,
+                image_url=f'/media/images/seed_{self.rng.randrange(1000)}.jpg' if self.rng.random() < 0.1 else None,
+                user_id=self.rng.choice(senders),
+                status='approved' if self.rng.random() < 0.95 else self.rng.choice(['pending', 'rejected']),
+                target_role=_weighted(self.rng, MESSAGE_TARGETS),
+                created_at=self._timestamp(),
+            )
+        with _backdated(Message._meta.get_field('created_at')):
+            self._stream(Message, n, row, 'messages')
+
+    def _voice_messages(self, n):
+        def row():
+            return VoiceMessage(
+                sender_name=f'{PREFIX}{self.rng.choice(FIRST_NAMES)}',
+                sender_role=self.rng.choice(['PRINCIPAL', 'VICE_PRINCIPAL']),
+                target_group=_weighted(self.rng, VOICE_TARGETS),
+                audio_file=f'audio/seed_{self.rng.randrange(1000)}.m4a',
+                transcribed_text=self.rng.choice(SNIPPETS),
+                stt_status='DONE',
+                priority='URGENT' if self.rng.random() < 0.1 else 'NORMAL',
+                status=self.rng.choice(['COMPLETED', 'SENT', 'QUEUED']),
+                created_at=self._timestamp(),
+            )
+        with _backdated(VoiceMessage._meta.get_field('created_at')):
+            self._stream(VoiceMessage, n, row, 'voice messages')
+        return list(VoiceMessage.objects.filter(sender_name__startswith=PREFIX).values_list('id', flat=True))
+
+    def _deliveries(self, voice, contacts, per_voice):
+        per_voice = min(per_voice, len(contacts))
+        pending = []
+        total = 0
+        for vid in voice:
+            for cid in self.rng.sample(contacts, per_voice):
+                status = _weighted(self.rng, DELIVERY_STATUSES)
+                pending.append(Delivery(
+                    message_id=vid, recipient_id=cid, status=status,
+                    retries=self.rng.randrange(3) if status == 'FAILED' else 0,
+                    read_at=self.now if status == 'READ' else None,
+                ))
+            if len(pending) >= self.batch:
+                with transaction.atomic():
+                    Delivery.objects.bulk_create(pending, ignore_conflicts=True)
+                total += len(pending)
+                pending = []
+        if pending:
+            Delivery.objects.bulk_create(pending, ignore_conflicts=True)
+            total += len(pending)
+        for vid in voice:
+            recount_deliveries(VoiceMessage(pk=vid))
+        self.stdout.write(f"  deliveries: {total}")
+
+    def _replies(self, contacts, n):
+        # Sample real ids: other writers (and deletes) leave gaps in the id range
+        message_ids = array('q', Message.objects.filter(user__username__startswith=PREFIX)
+                            .order_by('id').values_list('id', flat=True).iterator())
+        if not message_ids or not contacts:
+            return
+        replied = set()
+
+        def row():
+            message_id = self.rng.choice(message_ids)
+            replied.add(message_id)
+            return ReplyMessage(
+                original_message_id=message_id,
+                sender_id=self.rng.choice(contacts),
+                reply_text=self.rng.choice(['Noted.', 'Thank you.', 'Will do.', 'Acknowledged, sir.']),
+                created_at=self._timestamp(),
+            )
+        with _backdated(ReplyMessage._meta.get_field('created_at')):
+            self._stream(ReplyMessage, n, row, 'replies')
+        replied = sorted(replied)
+        for start in range(0, len(replied), self.batch):
+            recount_replies(replied[start:start + self.batch])
+
+    def _clear(self):
+        with transaction.atomic():
+            ReplyMessage.objects.filter(sender__email__startswith=PREFIX).delete()
+            VoiceMessage.objects.filter(sender_name__startswith=PREFIX).delete()
+            Group.objects.filter(name__startswith=PREFIX).delete()
+            deleted, _ = User.objects.filter(username__startswith=PREFIX).delete()
+        self.stdout.write(self.style.SUCCESS(f"Removed seeded data ({deleted} rows incl. cascades)"))
@@ -0,0 +1,68 @@
+"""
+Inbox serialization throughput: MessageSerializer vs the slim inboxrows path.
+
+Serializes the newest --rows approved messages of the current database with
+MessageSerializer (select_related('user'), as the views used to) and with
+inboxrows.serialize, for the full field set and for a sparse fieldset, and
+reports rows per second including the query. Both paths are checked to
+produce the same output first. Run `manage.py seed_scale` first for
+realistic data.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from messaging import inboxrows
+from messaging.models import Message
+from messaging.serializers import MessageSerializer
+
+
+class Command(BaseCommand):
+    help = "Benchmark inbox serialization (rows/s) of MessageSerializer and the slim values() path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5, help="Best of N timings")
+        parser.add_argument('--fields', default='id,text,from_field,created_at,reply_count',
+                            help="Sparse fieldset to benchmark")
+        parser.add_argument('--json', action='store_true', help="Print a JSON report")
+
+    def handle(self, *args, **opts):
+        host = (settings.ALLOWED_HOSTS or ['localhost'])[0]
+        request = RequestFactory().get('/api/messages/', HTTP_HOST=host)
+        sparse = tuple(f for f in inboxrows.FIELDS if f in opts['fields'].split(','))
+        rows = opts['rows']
+
+        def qs():
+            return Message.objects.filter(status='approved').order_by('-created_at')
+
+        cases = {
+            'serializer': lambda: MessageSerializer(qs().select_related('user')[:rows], many=True,
+                                                    context={'request': request}).data,
+            'slim': lambda: inboxrows.serialize(qs()[:rows], request),
+            'slim-sparse': lambda: inboxrows.serialize(qs()[:rows], request, sparse),
+        }
+        expected = [dict(row) for row in cases['serializer']()]
+        if expected != cases['slim']():
+            raise RuntimeError("inboxrows.serialize output differs from MessageSerializer")
+
+        report = {'rows': len(expected), 'sparse_fields': list(sparse), 'cases': {}}
+        for name, fn in cases.items():
+            best = None
+            for _ in range(opts['repeat']):
+                started = time.perf_counter()
+                fn()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            report['cases'][name] = {'ms': best * 1000, 'rows_per_s': len(expected) / best if best else 0}
+
+        if opts['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{report['rows']} messages; sparse fieldset: {','.join(sparse)}")
+        base = report['cases']['serializer']['ms']
+        for name, r in report['cases'].items():
+            self.stdout.write(f"  {name:<12} {r['ms']:9.1f}ms {r['rows_per_s']:>10.0f} rows/s  x{base / max(r['ms'], 1e-9):.1f}")
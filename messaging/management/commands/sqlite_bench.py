@@ -0,0 +1,194 @@
+"""
+Concurrent read/write throughput of the SQLite setups.
+
+For each mode a fresh database file is migrated and seeded, then several
+worker processes (like gunicorn workers), each with several threads, run a
+mix of inbox reads and short writes (message inserts and delivery acks)
+for a fixed time:
+
+  default  - stock sqlite3 backend, rollback journal, writes inline
+  tuned    - SQLITE_HIGH_CONCURRENCY (WAL, pragmas, BEGIN IMMEDIATE) plus
+             the per-process write queue
+
+Workers are separate interpreters started with the mode's environment, so
+each one builds its own settings and connections.
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+MODES = {
+    'default': {'SQLITE_HIGH_CONCURRENCY': 'False', 'WRITE_QUEUE_ENABLED': 'False'},
+    'tuned': {'SQLITE_HIGH_CONCURRENCY': 'True', 'WRITE_QUEUE_ENABLED': 'True'},
+}
+
+SEED_MESSAGES = 2000
+SEED_DELIVERIES = 2000
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent SQLite read/write throughput: stock settings vs the tuned single-node mode."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default='default,tuned')
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--write-ratio', type=float, default=0.3)
+        parser.add_argument('--json', action='store_true', help="Print a JSON report")
+        # Internal: the same command runs the seeding step and the workers
+        parser.add_argument('--role', choices=['seed', 'worker'], help="(internal)")
+
+    def handle(self, *args, **opts):
+        if opts['role'] == 'seed':
+            return self._seed()
+        if opts['role'] == 'worker':
+            return self._worker(opts)
+
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for mode in opts['modes'].split(','):
+                results[mode] = self._run_mode(mode, os.path.join(tmp, f'{mode}.sqlite3'), opts)
+
+        if opts['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"{opts['processes']} processes x {opts['threads']} threads, {opts['seconds']:g}s, "
+            f"write ratio {opts['write_ratio']:g}"
+        )
+        self.stdout.write(f"{'mode':<8} {'reads/s':>9} {'writes/s':>9} {'errors':>7} "
+                          f"{'read p95':>9} {'write p50':>10} {'write p95':>10}")
+        for mode, r in results.items():
+            self.stdout.write(
+                f"{mode:<8} {r['reads_per_s']:9.0f} {r['writes_per_s']:9.0f} {r['errors']:7d} "
+                f"{r['read_p95_ms']:8.1f}ms {r['write_p50_ms']:9.1f}ms {r['write_p95_ms']:9.1f}ms"
+            )
+
+    # ---- parent ----
+    def _env(self, mode, path):
+        return dict(
+            os.environ, SQLITE_PATH=path, CACHE_BACKEND='memory', WARM_ON_BOOT='False',
+            DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'relay_project.settings'),
+            **MODES[mode],
+        )
+
+    def _manage(self, *args):
+        return [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), *args]
+
+    def _run_mode(self, mode, path, opts):
+        env = self._env(mode, path)
+        subprocess.run(self._manage('migrate', '--verbosity', '0'), env=env, check=True, cwd=settings.BASE_DIR)
+        subprocess.run(self._manage('sqlite_bench', '--role', 'seed'), env=env, check=True, cwd=settings.BASE_DIR)
+
+        worker_args = self._manage(
+            'sqlite_bench', '--role', 'worker', '--threads', str(opts['threads']),
+            '--seconds', str(opts['seconds']), '--write-ratio', str(opts['write_ratio']),
+        )
+        procs = [
+            subprocess.Popen(worker_args, env=env, stdout=subprocess.PIPE, cwd=settings.BASE_DIR, text=True)
+            for _ in range(opts['processes'])
+        ]
+        stats = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+
+        reads = [x for s in stats for x in s['read_ms']]
+        writes = [x for s in stats for x in s['write_ms']]
+        elapsed = max(s['elapsed'] for s in stats)
+        return {
+            'reads_per_s': len(reads) / elapsed,
+            'writes_per_s': len(writes) / elapsed,
+            'errors': sum(s['errors'] for s in stats),
+            'read_p95_ms': _percentile(reads, 95),
+            'write_p50_ms': _percentile(writes, 50),
+            'write_p95_ms': _percentile(writes, 95),
+        }
+
+    # ---- child processes ----
+    def _seed(self):
+        from django.contrib.auth import get_user_model
+        from messaging.models import Contact, Delivery, Message, VoiceMessage
+
+        user = get_user_model().objects.create(username='bench', role='STAFF')
+        Message.objects.bulk_create(
+            [Message(text=f'bench {i}', user=user, status='approved', target_role='ALL') for i in range(SEED_MESSAGES)],
+            batch_size=500,
+        )
+        vm = VoiceMessage.objects.create(sender_name='bench', status='COMPLETED')
+        contacts = Contact.objects.bulk_create(
+            [Contact(name=f'bench {i}', user=user) for i in range(SEED_DELIVERIES)], batch_size=500,
+        )
+        Delivery.objects.bulk_create(
+            [Delivery(message=vm, recipient=c, status='DELIVERED') for c in contacts], batch_size=500,
+        )
+
+    def _worker(self, opts):
+        from django.contrib.auth import get_user_model
+        from django.db import OperationalError, connection
+        from django.utils import timezone
+
+        from relay_project import writequeue
+        from messaging.models import Delivery, Message
+        from messaging.services import create_approved_message
+
+        user = get_user_model().objects.get(username='bench')
+        delivery_ids = list(Delivery.objects.values_list('id', flat=True))
+        connection.close()
+
+        read_ms, write_ms = [], []
+        errors = [0]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + opts['seconds']
+
+        def ack():
+            Delivery.objects.filter(pk=random.choice(delivery_ids)).update(read_at=timezone.now())
+
+        def loop():
+            reads, writes = [], []
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    if random.random() < opts['write_ratio']:
+                        if random.random() < 0.5:
+                            writequeue.run(create_approved_message, text='bench', user=user, target_role='ALL')
+                        else:
+                            writequeue.run(ack)
+                        writes.append((time.perf_counter() - started) * 1000)
+                    else:
+                        list(Message.objects.filter(status='approved', target_role__in=['STAFF', 'ALL'])
+                             .order_by('-id').values_list('id', 'text')[:50])
+                        reads.append((time.perf_counter() - started) * 1000)
+                except OperationalError:
+                    with lock:
+                        errors[0] += 1
+            connection.close()
+            with lock:
+                read_ms.extend(reads)
+                write_ms.extend(writes)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=loop) for _ in range(opts['threads'])]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.stdout.write(json.dumps({
+            'elapsed': time.perf_counter() - started,
+            'read_ms': read_ms,
+            'write_ms': write_ms,
+            'errors': errors[0],
+        }))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.24 on 2026-10-19 14:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('messaging', '0003_rename_timestamp_message_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(max_length=50)),
+                ('last_read_id', models.BigIntegerField(default=0)),
+                ('read_above', models.JSONField(blank=True, default=list)),
+                ('unread_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='read_state', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['role'], name='messaging_r_role_d13abc_idx')],
+            },
+        ),
+    ]
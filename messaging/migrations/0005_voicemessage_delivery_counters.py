@@ -0,0 +1,62 @@
+# Generated by Django 4.2.24 on 2026-10-19 14:56
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    VoiceMessage = apps.get_model('messaging', 'VoiceMessage')
+    Delivery = apps.get_model('messaging', 'Delivery')
+    fields = {
+        'PENDING': 'pending_count',
+        'SENT': 'sent_count',
+        'DELIVERED': 'delivered_count',
+        'READ': 'read_count',
+        'FAILED': 'failed_count',
+    }
+    counts = {}
+    for row in Delivery.objects.values('message_id', 'status').annotate(n=Count('id')).order_by():
+        if row['status'] in fields:
+            counts.setdefault(row['message_id'], {})[fields[row['status']]] = row['n']
+    for message_id, values in counts.items():
+        VoiceMessage.objects.filter(pk=message_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_readstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voicemessage',
+            name='delivered_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='voicemessage',
+            name='failed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='voicemessage',
+            name='pending_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='voicemessage',
+            name='read_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='voicemessage',
+            name='sent_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['message', 'status', 'id'], name='messaging_d_message_5ea82b_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
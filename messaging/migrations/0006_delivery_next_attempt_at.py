@@ -0,0 +1,22 @@
+# Generated by Django 4.2.24 on 2026-10-19 14:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_voicemessage_delivery_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='messaging_d_status_53b003_idx'),
+        ),
+    ]
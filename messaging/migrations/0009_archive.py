@@ -0,0 +1,97 @@
+# Generated by Django 4.2.24 on 2026-10-19 15:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('messaging', '0008_audio_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedVoiceMessage',
+            fields=[
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('audio_codec', models.CharField(blank=True, default='', max_length=32)),
+                ('audio_bitrate', models.PositiveIntegerField(blank=True, null=True)),
+                ('waveform', models.BinaryField(blank=True, default=b'')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('sender_name', models.CharField(max_length=120)),
+                ('sender_role', models.CharField(choices=[('PRINCIPAL', 'Principal'), ('VICE_PRINCIPAL', 'Vice Principal'), ('HOD', 'Head of Department'), ('STAFF', 'Faculty')], max_length=20)),
+                ('target_group', models.CharField(choices=[('HOD', 'Head of Department'), ('STAFF', 'Faculty'), ('BOTH', 'Both HOD and Faculty')], max_length=10)),
+                ('audio_file', models.FileField(blank=True, upload_to='audio/')),
+                ('transcribed_text', models.TextField(blank=True)),
+                ('stt_confidence', models.FloatField(blank=True, null=True)),
+                ('stt_status', models.CharField(max_length=20)),
+                ('priority', models.CharField(choices=[('NORMAL', 'Normal'), ('URGENT', 'Urgent')], max_length=10)),
+                ('scheduled_for', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('SENT', 'Sent'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('pending_count', models.PositiveIntegerField(default=0)),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('delivered_count', models.PositiveIntegerField(default=0)),
+                ('read_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedReply',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('reply_text', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('original_message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='messaging.archivedvoicemessage')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_replies', to='messaging.contact')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedMessage',
+            fields=[
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('audio_codec', models.CharField(blank=True, default='', max_length=32)),
+                ('audio_bitrate', models.PositiveIntegerField(blank=True, null=True)),
+                ('waveform', models.BinaryField(blank=True, default=b'')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('text', models.TextField(blank=True)),
+                ('audio_url', models.URLField(blank=True, null=True)),
+                ('image_url', models.URLField(blank=True, null=True)),
+                ('image_width', models.PositiveIntegerField(blank=True, null=True)),
+                ('image_height', models.PositiveIntegerField(blank=True, null=True)),
+                ('image_placeholder', models.TextField(blank=True, default='')),
+                ('image_variants', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected')], max_length=20)),
+                ('target_role', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['target_role', 'id'], name='messaging_a_target__8f3a88_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedDelivery',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('SENT', 'Sent'), ('DELIVERED', 'Delivered'), ('READ', 'Read'), ('FAILED', 'Failed')], max_length=10)),
+                ('retries', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField()),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='messaging.archivedvoicemessage')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_deliveries', to='messaging.contact')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['message', 'status', 'id'], name='messaging_a_message_788a16_idx')],
+            },
+        ),
+    ]
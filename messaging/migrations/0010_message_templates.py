@@ -0,0 +1,29 @@
+# Generated by Django 4.2.24 on 2026-10-19 15:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0009_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='department',
+            field=models.CharField(blank=True, default='', max_length=120),
+        ),
+        migrations.AddField(
+            model_name='messagetemplate',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='voicemessage',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='voice_messages', to='messaging.messagetemplate'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-19 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0010_message_templates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='voicemessage',
+            index=models.Index(fields=['status', 'scheduled_for'], name='messaging_v_status_d63ec8_idx'),
+        ),
+    ]
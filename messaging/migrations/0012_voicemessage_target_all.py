@@ -0,0 +1,23 @@
+# Generated by Django 4.2.24 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0011_voicemessage_schedule_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedvoicemessage',
+            name='target_group',
+            field=models.CharField(choices=[('HOD', 'Head of Department'), ('STAFF', 'Faculty'), ('BOTH', 'Both HOD and Faculty'), ('ALL', 'Everyone')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='voicemessage',
+            name='target_group',
+            field=models.CharField(choices=[('HOD', 'Head of Department'), ('STAFF', 'Faculty'), ('BOTH', 'Both HOD and Faculty'), ('ALL', 'Everyone')], default='BOTH', max_length=10),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.24 on 2026-10-19 15:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0012_voicemessage_target_all'),
+    ]
+
+    operations = [
+        # Existing replies point at VoiceMessages, which have no inbox Message
+        # counterpart: keep them under voice_message and thread new ones
+        # under the new original_message.
+        migrations.RenameField(
+            model_name='replymessage',
+            old_name='original_message',
+            new_name='voice_message',
+        ),
+        migrations.AlterField(
+            model_name='replymessage',
+            name='voice_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='legacy_replies', to='messaging.voicemessage'),
+        ),
+        migrations.RenameField(
+            model_name='archivedreply',
+            old_name='original_message',
+            new_name='voice_message',
+        ),
+        migrations.AlterField(
+            model_name='archivedreply',
+            name='voice_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='legacy_replies', to='messaging.archivedvoicemessage'),
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='last_reply_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='last_reply_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivedreply',
+            name='original_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='messaging.archivedmessage'),
+        ),
+        migrations.AddField(
+            model_name='replymessage',
+            name='original_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='messaging.message'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedreply',
+            index=models.Index(fields=['original_message', 'id'], name='messaging_a_origina_a7e7c5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='replymessage',
+            index=models.Index(fields=['original_message', 'id'], name='messaging_r_origina_1f0b2a_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.24 on 2026-10-19 16:20
+
+import bisect
+
+from django.db import migrations, models
+
+
+def _renumber(apps, to_seq):
+    """Move read positions between id order and approval order."""
+    Message = apps.get_model('messaging', 'Message')
+    ReadState = apps.get_model('messaging', 'ReadState')
+    pairs = Message.objects.filter(status='approved', approval_seq__isnull=False).values_list('id', 'approval_seq')
+    pairs = sorted(pairs if to_seq else ((seq, id_) for id_, seq in pairs))
+    lookup = dict(pairs)
+    keys, highest, top = [], [], 0
+    for src, dst in pairs:
+        top = max(top, dst)
+        keys.append(src)
+        highest.append(top)  # largest target position among sources <= src
+    for state in ReadState.objects.all():
+        n = bisect.bisect_right(keys, state.last_read_seq)
+        state.last_read_seq = highest[n - 1] if n else 0
+        state.read_above = sorted(
+            lookup[i] for i in state.read_above if i in lookup and lookup[i] > state.last_read_seq
+        )
+        state.unread_count = None  # recount on next read
+        state.save(update_fields=['last_read_seq', 'read_above', 'unread_count'])
+
+
+def to_approval_order(apps, schema_editor):
+    # Existing approved messages are numbered in id order, which is the
+    # order the old read positions assumed
+    Message = apps.get_model('messaging', 'Message')
+    messages = list(Message.objects.filter(status='approved').order_by('id').only('id'))
+    for n, msg in enumerate(messages, start=1):
+        msg.approval_seq = n
+    Message.objects.bulk_update(messages, ['approval_seq'], batch_size=500)
+    _renumber(apps, to_seq=True)
+
+
+def to_id_order(apps, schema_editor):
+    _renumber(apps, to_seq=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0014_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='approval_seq',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.RenameField(
+            model_name='readstate',
+            old_name='last_read_id',
+            new_name='last_read_seq',
+        ),
+        migrations.RunPython(to_approval_order, to_id_order),
+    ]
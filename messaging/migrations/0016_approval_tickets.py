@@ -0,0 +1,36 @@
+# Generated by Django 4.2.24 on 2026-10-19 15:58
+
+from django.core.management.color import no_style
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def start_after_existing(apps, schema_editor):
+    # Ticket ids continue from the positions 0015 handed out
+    Message = apps.get_model('messaging', 'Message')
+    ApprovalTicket = apps.get_model('messaging', 'ApprovalTicket')
+    top = Message.objects.aggregate(top=Max('approval_seq'))['top']
+    if top:
+        ApprovalTicket.objects.create(id=top)  # kept: the sequence reset reads MAX(id)
+        connection = schema_editor.connection
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [ApprovalTicket]):
+                cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0015_message_approval_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApprovalTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(start_after_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.24 on 2026-10-19 15:58
+
+from django.db import migrations, models
+
+
+def mark_broadcasts(apps, schema_editor):
+    # What emergency.broadcast has always created; ordinary sends to ALL are left alone
+    VoiceMessage = apps.get_model('messaging', 'VoiceMessage')
+    VoiceMessage.objects.filter(target_group='ALL', priority='URGENT', stt_status='SKIPPED').update(is_emergency=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0016_approval_tickets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voicemessage',
+            name='is_emergency',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_broadcasts, migrations.RunPython.noop),
+    ]
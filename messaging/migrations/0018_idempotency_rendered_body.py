@@ -0,0 +1,46 @@
+# Generated by Django 4.2.24 on 2026-10-19 15:59
+
+import json
+
+from django.db import migrations, models
+
+
+def render_stored(apps, schema_editor):
+    # Stored results were response.data; keep replaying them as the JSON they rendered to
+    IdempotencyKey = apps.get_model('messaging', 'IdempotencyKey')
+    for row in IdempotencyKey.objects.filter(state='done'):
+        row.body = json.dumps(row.response, separators=(',', ':'), ensure_ascii=False).encode()
+        row.content_type = 'application/json'
+        row.save(update_fields=['body', 'content_type'])
+
+
+def parse_stored(apps, schema_editor):
+    IdempotencyKey = apps.get_model('messaging', 'IdempotencyKey')
+    for row in IdempotencyKey.objects.filter(state='done'):
+        row.response = json.loads(bytes(row.body)) if row.content_type.startswith('application/json') else None
+        row.save(update_fields=['response'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0017_voicemessage_is_emergency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='body',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(render_stored, parse_stored),
+        migrations.RemoveField(
+            model_name='idempotencykey',
+            name='response',
+        ),
+    ]
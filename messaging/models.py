@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth import get_user_model
 
@@ -16,6 +17,7 @@ class Contact(models.Model):
     email = models.EmailField(blank=True)
     phone = models.CharField(max_length=20, blank=True)
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='STAFF')
+    department = models.CharField(max_length=120, blank=True, default='')
     is_active = models.BooleanField(default=True)
     user = models.ForeignKey(
         User,
@@ -36,7 +38,19 @@ class Group(models.Model):
         return self.name
 
 
-class VoiceMessage(models.Model):
+class AudioMetadata(models.Model):
+    """Filled in by the audio pipeline (messaging/audio.py) after upload."""
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    audio_codec = models.CharField(max_length=32, blank=True, default='')
+    audio_bitrate = models.PositiveIntegerField(null=True, blank=True)  # bits per second
+    # One byte (0-255) per bucket of peak amplitude, see audio.WAVEFORM_POINTS
+    waveform = models.BinaryField(blank=True, default=b'')
+
+    class Meta:
+        abstract = True
+
+
+class VoiceMessage(AudioMetadata):
     PRIORITY_CHOICES = [('NORMAL', 'Normal'), ('URGENT', 'Urgent')]
     SENDING_STATUS = [
         ('QUEUED', 'Queued'),
@@ -48,6 +62,7 @@ class VoiceMessage(models.Model):
         ('HOD', 'Head of Department'),
         ('STAFF', 'Faculty'),
         ('BOTH', 'Both HOD and Faculty'),
+        ('ALL', 'Everyone'),
     ]
 
     sender_name = models.CharField(max_length=120)
@@ -61,6 +76,36 @@ class VoiceMessage(models.Model):
     scheduled_for = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=SENDING_STATUS, default='QUEUED')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Personalized per recipient at fan-out, see messaging/templating.py
+    template = models.ForeignKey(
+        'MessageTemplate', on_delete=models.SET_NULL, null=True, blank=True, related_name='voice_messages'
+    )
+    # Set by emergency.broadcast: deliveries (and their retries) use EMERGENCY_TRANSPORT
+    is_emergency = models.BooleanField(default=False)
+
+    # Materialized Delivery status counts, kept in step by services.move_delivery_counts
+    pending_count = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    delivered_count = models.PositiveIntegerField(default=0)
+    read_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+
+    # Delivery.status -> counter field
+    COUNTER_FIELDS = {
+        'PENDING': 'pending_count',
+        'SENT': 'sent_count',
+        'DELIVERED': 'delivered_count',
+        'READ': 'read_count',
+        'FAILED': 'failed_count',
+    }
+
+    class Meta:
+        # Due-message lookups (scheduler resync, run-scheduler-now)
+        indexes = [models.Index(fields=['status', 'scheduled_for'])]
+
+    @property
+    def total_deliveries(self):
+        return sum(getattr(self, f) for f in self.COUNTER_FIELDS.values())
 
     def __str__(self):
         ts = self.created_at.strftime('%Y-%m-%d %H:%M')
@@ -81,26 +126,64 @@ class Delivery(models.Model):
     status = models.CharField(max_length=10, choices=DELIVERY_STATUS, default='PENDING')
     retries = models.PositiveIntegerField(default=0)
     last_error = models.TextField(blank=True)
+    # Set while a failed delivery waits for its next retry (see messaging.retries)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
     read_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = ('message', 'recipient')
+        indexes = [
+            models.Index(fields=['message', 'status', 'id']),
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
 
 
 class ReplyMessage(models.Model):
-    original_message = models.ForeignKey(VoiceMessage, on_delete=models.CASCADE, related_name='replies')
+    # Threads under inbox Messages; services.add_reply keeps Message.reply_count in step
+    original_message = models.ForeignKey(
+        'Message', on_delete=models.CASCADE, null=True, blank=True, related_name='replies'
+    )
+    # Replies to voice messages from before threading; kept, but not part of any thread
+    voice_message = models.ForeignKey(
+        VoiceMessage, on_delete=models.CASCADE, null=True, blank=True, related_name='legacy_replies'
+    )
     sender = models.ForeignKey(Contact, on_delete=models.CASCADE)
     reply_text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['original_message', 'id'])]
+
     def __str__(self):
-        return f"Reply from {self.sender.name} to message {self.original_message.id}"
+        target = self.original_message_id or f'voice {self.voice_message_id}'
+        return f"Reply from {self.sender.name} to message {target}"
 
 
 class MessageTemplate(models.Model):
     title = models.CharField(max_length=100, unique=True)
+    # Placeholders like {{ name }}, see messaging/templating.py
     body = models.TextField()
+    # Bumped on every save; compiled templates are cached per (id, version)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    def clean(self):
+        from .templating import TemplateError, compile_template
+        try:
+            compile_template(self.body)
+        except TemplateError as e:
+            raise ValidationError({'body': str(e)})
+
+    def save(self, *args, **kwargs):
+        bump = not self._state.adding
+        if bump:
+            # In SQL, so two concurrent saves can't both write the same version
+            self.version = models.F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+        if bump:
+            self.refresh_from_db(fields=['version'])
 
     def __str__(self):
         return self.title
@@ -114,8 +197,39 @@ class AuditLog(models.Model):
         return f"{self.event} @ {ts}"
 
 
+class IdempotencyKey(models.Model):
+    """
+    Claim and stored response of one Idempotency-Key (relay_project.idempotency).
+    Inserting the row is the claim: the unique key lets exactly one of several
+    concurrent duplicates own it, whichever worker they arrive on.
+    """
+    key = models.CharField(max_length=64, unique=True)  # sha256 of owner, path and the client's key
+    fingerprint = models.CharField(max_length=64)
+    state = models.CharField(max_length=10, default='in_flight')  # in_flight | done
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    # The rendered response, replayed byte for byte
+    content_type = models.CharField(max_length=100, blank=True)
+    body = models.BinaryField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
 
-class Message(models.Model):
+    def __str__(self):
+        return f"{self.key[:12]} ({self.state})"
+
+
+
+# Inbox targets accepted by the send endpoints (user roles plus the ALL broadcast)
+ALLOWED_GROUPS = {'STAFF', 'HOD', 'VICE_PRINCIPAL', 'PRINCIPAL', 'ALL'}
+
+
+class ApprovalTicket(models.Model):
+    """
+    Source of Message.approval_seq: auto-increment ids are never reused, so
+    approval positions only grow. Rows are deleted once their id is taken.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class Message(AudioMetadata):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('approved', 'Approved'),
@@ -125,6 +239,11 @@ class Message(models.Model):
     text = models.TextField(blank=True)
     audio_url = models.URLField(blank=True, null=True)
     image_url = models.URLField(blank=True, null=True)
+    # Filled in by the image pipeline (messaging/images.py) after upload
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_placeholder = models.TextField(blank=True, default='')
+    image_variants = models.JSONField(default=list, blank=True)
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -135,7 +254,118 @@ class Message(models.Model):
     # Use roles consistent with the rest of your app
     target_role = models.CharField(max_length=50, default='STAFF')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized from ReplyMessage so inbox rows need no per-row queries
+    reply_count = models.PositiveIntegerField(default=0)
+    last_reply_at = models.DateTimeField(null=True, blank=True)
+    # Position in approval order (readstate.sequence), set while the message
+    # is approved; read positions compare against it, since a message
+    # approved late keeps its low id
+    approval_seq = models.BigIntegerField(null=True, blank=True, unique=True, editable=False)
 
     def __str__(self):
         snippet = self.text[:30] if self.text else ''
         return f"{self.user.username} → {self.target_role}: {snippet}"
+
+
+class ReadState(models.Model):
+    """
+    Per-user read position in the Message inbox, in approval order.
+
+    Every message with approval_seq <= last_read_seq counts as read; sequence
+    numbers above it that were read out of order are kept in read_above.
+    unread_count is maintained incrementally so the badge is a single-row
+    read; NULL means "recount".
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='read_state')
+    role = models.CharField(max_length=50)  # inbox role the counter was built for
+    last_read_seq = models.BigIntegerField(default=0)
+    read_above = models.JSONField(default=list, blank=True)
+    unread_count = models.PositiveIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['role'])]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.unread_count} unread"
+
+
+# ---------------- Archive (cold storage, see messaging/archive.py) ----------------
+# Rows keep their original primary keys, so links and read positions stay valid.
+
+class ArchivedMessage(AudioMetadata):
+    id = models.BigIntegerField(primary_key=True)
+    text = models.TextField(blank=True)
+    audio_url = models.URLField(blank=True, null=True)
+    image_url = models.URLField(blank=True, null=True)
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_placeholder = models.TextField(blank=True, default='')
+    image_variants = models.JSONField(default=list, blank=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_messages')
+    status = models.CharField(max_length=20, choices=Message.STATUS_CHOICES)
+    target_role = models.CharField(max_length=50)
+    created_at = models.DateTimeField()
+    reply_count = models.PositiveIntegerField(default=0)
+    last_reply_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['target_role', 'id'])]
+
+    def __str__(self):
+        return f"[archived] {self.user_id} → {self.target_role}: {self.text[:30]}"
+
+
+class ArchivedVoiceMessage(AudioMetadata):
+    id = models.BigIntegerField(primary_key=True)
+    sender_name = models.CharField(max_length=120)
+    sender_role = models.CharField(max_length=20, choices=Contact.ROLE_CHOICES)
+    target_group = models.CharField(max_length=10, choices=VoiceMessage.TARGET_GROUP_CHOICES)
+    audio_file = models.FileField(upload_to='audio/', blank=True)
+    transcribed_text = models.TextField(blank=True)
+    stt_confidence = models.FloatField(null=True, blank=True)
+    stt_status = models.CharField(max_length=20)
+    priority = models.CharField(max_length=10, choices=VoiceMessage.PRIORITY_CHOICES)
+    scheduled_for = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=VoiceMessage.SENDING_STATUS)
+    created_at = models.DateTimeField()
+    pending_count = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    delivered_count = models.PositiveIntegerField(default=0)
+    read_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"[archived] {self.sender_name} → {self.target_group} | {self.created_at:%Y-%m-%d}"
+
+
+class ArchivedDelivery(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    message = models.ForeignKey(ArchivedVoiceMessage, on_delete=models.CASCADE, related_name='deliveries')
+    recipient = models.ForeignKey(Contact, on_delete=models.CASCADE, related_name='archived_deliveries')
+    status = models.CharField(max_length=10, choices=Delivery.DELIVERY_STATUS)
+    retries = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    updated_at = models.DateTimeField()
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['message', 'status', 'id'])]
+
+
+class ArchivedReply(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    original_message = models.ForeignKey(
+        ArchivedMessage, on_delete=models.CASCADE, null=True, blank=True, related_name='replies'
+    )
+    voice_message = models.ForeignKey(
+        ArchivedVoiceMessage, on_delete=models.CASCADE, null=True, blank=True, related_name='legacy_replies'
+    )
+    sender = models.ForeignKey(Contact, on_delete=models.CASCADE, related_name='archived_replies')
+    reply_text = models.TextField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['original_message', 'id'])]
@@ -0,0 +1,179 @@
+from django.db import transaction
+from django.db.models import Count, F, Max, Min
+
+from .models import ApprovalTicket, Message, ReadState
+from .audience import canonical_role, expand_target, inbox_targets
+
+SEQUENCE_CHUNK = 500
+
+
+def inbox_role(user):
+    """Role whose inbox the user sees (same fallback as MessageListView)."""
+    return canonical_role(getattr(user, 'role', None))
+
+
+def visible_messages(role):
+    return Message.objects.filter(status='approved', target_role__in=inbox_targets(role))
+
+
+def _count_unread(state):
+    return (
+        visible_messages(state.role)
+        .filter(approval_seq__gt=state.last_read_seq)
+        .exclude(approval_seq__in=state.read_above)
+        .count()
+    )
+
+
+def _compact(state):
+    """Advance last_read_seq up to the first unread message and drop folded positions."""
+    if not state.read_above:
+        return
+    first_unread = (
+        visible_messages(state.role)
+        .filter(approval_seq__gt=state.last_read_seq)
+        .exclude(approval_seq__in=state.read_above)
+        .order_by('approval_seq')
+        .values_list('approval_seq', flat=True)
+        .first()
+    )
+    if first_unread is None:
+        state.last_read_seq = max(state.last_read_seq, max(state.read_above))
+    else:
+        state.last_read_seq = max(state.last_read_seq, first_unread - 1)
+    state.read_above = sorted(i for i in state.read_above if i > state.last_read_seq)
+
+
+def _mark(state, messages):
+    """Mark the unread ones among `messages` (visible to state.role) read."""
+    newly_read = list(
+        messages
+        .filter(approval_seq__gt=state.last_read_seq)
+        .exclude(approval_seq__in=state.read_above)
+        .values_list('approval_seq', flat=True)
+    )
+    if not newly_read:
+        return state.unread_count
+    state.read_above = sorted(set(state.read_above) | set(newly_read))
+    state.unread_count = max(state.unread_count - len(newly_read), 0)
+    _compact(state)
+    state.save()
+    return state.unread_count
+
+
+def get_read_state(user, lock=False):
+    """
+    Load (or build) the user's read state. The counter is only recomputed
+    when the row is new, was invalidated, or the user's role changed.
+    """
+    role = inbox_role(user)
+    qs = ReadState.objects.select_for_update() if lock else ReadState.objects
+    state, _ = qs.get_or_create(user=user, defaults={'role': role})
+    if state.role != role:
+        # A role change moves the user to a different inbox; start over.
+        state.role = role
+        state.last_read_seq = 0
+        state.read_above = []
+        state.unread_count = None
+    if state.unread_count is None:
+        state.unread_count = _count_unread(state)
+        state.save()
+    return state
+
+
+def unread_count(user):
+    return get_read_state(user).unread_count
+
+
+def mark_read(user, message_ids):
+    """Mark individual messages read. Returns the new unread count."""
+    with transaction.atomic():
+        state = get_read_state(user, lock=True)
+        ids = {int(i) for i in message_ids}
+        return _mark(state, visible_messages(state.role).filter(id__in=ids))
+
+
+def mark_read_up_to(user, message_id):
+    """Mark every visible message with id <= message_id read."""
+    with transaction.atomic():
+        state = get_read_state(user, lock=True)
+        message_id = int(message_id)
+        unread = (
+            visible_messages(state.role)
+            .filter(approval_seq__gt=state.last_read_seq)
+            .exclude(approval_seq__in=state.read_above)
+        )
+        # Everything approved before the first unread message above message_id
+        # is read; the mark moves straight to it
+        boundary = unread.filter(id__gt=message_id).aggregate(seq=Min('approval_seq'))['seq']
+        below = unread if boundary is None else unread.filter(approval_seq__lt=boundary)
+        top = below.aggregate(n=Count('id'), seq=Max('approval_seq'))
+        if top['n']:
+            state.unread_count = max(state.unread_count - top['n'], 0)
+            state.last_read_seq = top['seq'] if boundary is None else boundary - 1
+            state.read_above = [i for i in state.read_above if i > state.last_read_seq]
+            _compact(state)
+            state.save()
+        if boundary is None:
+            return state.unread_count
+        # Messages approved after the boundary that still have id <= message_id
+        return _mark(state, unread.filter(approval_seq__gt=boundary, id__lte=message_id))
+
+
+def _states_for(target_role):
+    if target_role == 'ALL':
+        return ReadState.objects.all()
+    return ReadState.objects.filter(role__in=expand_target(target_role))
+
+
+def sequence(messages):
+    """
+    Give newly approved messages the next positions in approval order. The
+    positions are ApprovalTicket ids, which are never handed out twice
+    (unlike MAX(approval_seq) + 1 once the message holding the maximum is
+    withdrawn or archived), so a new approval is above every read position.
+    """
+    with transaction.atomic():
+        tickets = ApprovalTicket.objects.bulk_create([ApprovalTicket() for _ in messages])
+        for msg, ticket in zip(messages, tickets):
+            msg.approval_seq = ticket.pk
+        Message.objects.bulk_update(messages, ['approval_seq'], batch_size=SEQUENCE_CHUNK)
+        ApprovalTicket.objects.filter(pk__in=[t.pk for t in tickets]).delete()
+
+
+def sequence_unsequenced():
+    """Number approved messages inserted without sequence() (bulk seed data), in id order."""
+    pending = list(
+        Message.objects.filter(status='approved', approval_seq__isnull=True).order_by('id').only('id')
+    )
+    for start in range(0, len(pending), SEQUENCE_CHUNK):
+        sequence(pending[start:start + SEQUENCE_CHUNK])
+    return len(pending)
+
+
+def count_new_message(msg):
+    """Sequence a newly approved message and bump the counters of everyone who will see it."""
+    sequence([msg])
+    _states_for(msg.target_role).filter(last_read_seq__lt=msg.approval_seq).update(
+        unread_count=F('unread_count') + 1
+    )
+
+
+def count_new_messages(messages):
+    """
+    count_new_message for a batch: one UPDATE per audience. The batch takes
+    the newest positions, so every read position is below all of them.
+    """
+    sequence(messages)
+    by_role = {}
+    for msg in messages:
+        by_role.setdefault(msg.target_role, []).append(msg.approval_seq)
+    for target_role, seqs in by_role.items():
+        _states_for(target_role).filter(last_read_seq__lt=min(seqs)).update(
+            unread_count=F('unread_count') + len(seqs)
+        )
+
+
+def invalidate_counts(target_role):
+    """Force a recount for an audience, e.g. after a message is withdrawn."""
+    _states_for(target_role).update(unread_count=None)
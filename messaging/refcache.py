@@ -0,0 +1,155 @@
+"""
+Two-tier cache for rarely-changing reference data (contacts, groups, templates).
+
+Each entry is the already-rendered body, one per response format (JSON and,
+when msgpack is installed, MessagePack; see relay_project.renderers). A
+worker keeps a small LRU of entries and trusts them for REFCACHE_LOCAL_TTL
+seconds; after that it
+re-checks the version stamp in the shared cache (settings.CACHES) and only
+rebuilds when a model signal has bumped it. In the steady state a request is
+served from process memory without touching the database.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+from relay_project.dbrouter import use_primary
+from relay_project.metrics import serializer_timer
+from relay_project.renderers import RENDERERS
+
+from .models import Contact, Group, MessageTemplate
+from .serializers import ContactSerializer, GroupSerializer, MessageTemplateSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class LocalLRU:
+    """Thread-safe per-process LRU; entries expire after ttl seconds."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (value, fresh) or (None, False) when missing."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None, False
+            self._data.move_to_end(key)
+            value, stored_at = item
+            return value, time.monotonic() - stored_at < self.ttl
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local = LocalLRU(settings.REFCACHE_LOCAL_MAX_ENTRIES, settings.REFCACHE_LOCAL_TTL)
+
+
+def _contacts():
+    qs = Contact.objects.filter(is_active=True).order_by('name')
+    return ContactSerializer(qs, many=True).data
+
+
+def _groups():
+    qs = Group.objects.prefetch_related('contacts').order_by('name')
+    return GroupSerializer(qs, many=True).data
+
+
+def _templates():
+    qs = MessageTemplate.objects.all().order_by('title')
+    return MessageTemplateSerializer(qs, many=True).data
+
+
+# name -> function returning the payload to render
+DATASETS = {
+    'contacts': _contacts,
+    'groups': _groups,
+    'templates': _templates,
+}
+
+
+def _version_key(name):
+    return f'ref:{name}:version'
+
+
+def _payload_key(name, version, fmt):
+    return f'ref:{name}:{version}:{fmt}'
+
+
+def _new_version(name):
+    version = time.time_ns()
+    cache.set(_version_key(name), version, None)
+    return version
+
+
+def get_bytes(name, fmt='json'):
+    """One of DATASETS rendered in `fmt` (a key of renderers.RENDERERS)."""
+    key = (name, fmt)
+    entry, fresh = local.get(key)
+    if entry is not None and fresh:
+        return entry[1]
+
+    version = cache.get(_version_key(name))
+    if version is None:
+        version = _new_version(name)
+    if entry is not None and entry[0] == version:
+        local.set(key, entry)  # still current; restart the TTL
+        return entry[1]
+
+    payload = cache.get(_payload_key(name, version, fmt))
+    if payload is None:
+        # Read from the primary: a lagging replica must not be cached as this version
+        with use_primary(), serializer_timer():
+            data = DATASETS[name]()
+        payload = RENDERERS[fmt]().render(data)
+        cache.set(_payload_key(name, version, fmt), payload, settings.REFCACHE_SHARED_TTL)
+    local.set(key, (version, payload))
+    return payload
+
+
+def response(name, fmt='json'):
+    if fmt not in RENDERERS:
+        fmt = 'json'  # e.g. the browsable API
+    return HttpResponse(get_bytes(name, fmt), content_type=RENDERERS[fmt].media_type)
+
+
+def invalidate(*names):
+    """Bump the version of each dataset once the current transaction commits."""
+    def bump():
+        for name in names:
+            _new_version(name)
+            for fmt in RENDERERS:
+                local.delete((name, fmt))
+    transaction.on_commit(bump)
+
+
+def warm():
+    """Build every dataset; called at worker boot."""
+    for name in DATASETS:
+        try:
+            get_bytes(name)
+        except Exception:
+            # A missing table (fresh checkout, pending migrations) must not stop the worker
+            logger.warning("Could not warm reference cache %r", name, exc_info=True)
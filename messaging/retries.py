@@ -0,0 +1,142 @@
+"""
+Retry scheduling for failed deliveries.
+
+A failed attempt puts the delivery back to PENDING with next_attempt_at set
+by exponential backoff with full jitter, until DELIVERY_MAX_RETRIES is
+reached and it becomes FAILED. The retry worker (manage.py retry_worker)
+only pulls rows whose next_attempt_at is due, in batches, through the
+(status, next_attempt_at) index.
+
+A per-recipient circuit breaker, stored in the shared cache, stops hammering
+a recipient that keeps failing: after CIRCUIT_FAILURE_THRESHOLD consecutive
+failures its deliveries are deferred for CIRCUIT_COOLDOWN_SECONDS.
+"""
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Delivery, VoiceMessage
+from .services import transition_delivery, send_delivery, update_message_status
+
+# How long a worker owns a claimed batch before it is considered abandoned
+LEASE_SECONDS = 300
+
+
+def backoff_seconds(retries, rng=random):
+    """Full-jitter exponential backoff for the n-th retry (n >= 1)."""
+    ceiling = min(settings.RETRY_MAX_SECONDS, settings.RETRY_BASE_SECONDS * (2 ** (retries - 1)))
+    return rng.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker per recipient, shared through the cache."""
+
+    def __init__(self, threshold=None, cooldown=None):
+        self.threshold = threshold or settings.CIRCUIT_FAILURE_THRESHOLD
+        self.cooldown = cooldown or settings.CIRCUIT_COOLDOWN_SECONDS
+
+    def _key(self, recipient_id):
+        return f'circuit:recipient:{recipient_id}'
+
+    def open_until(self, recipient_id):
+        """Epoch seconds until which the circuit is open, or None if closed."""
+        state = cache.get(self._key(recipient_id))
+        if state and state.get('open_until', 0) > time.time():
+            return state['open_until']
+        return None
+
+    def record_success(self, recipient_id):
+        cache.delete(self._key(recipient_id))
+
+    def record_successes(self, recipient_ids):
+        """record_success for a whole dispatch batch in one cache call."""
+        cache.delete_many([self._key(r) for r in recipient_ids])
+
+    def record_failure(self, recipient_id):
+        key = self._key(recipient_id)
+        state = cache.get(key) or {'failures': 0, 'open_until': 0}
+        state['failures'] += 1
+        if state['failures'] >= self.threshold:
+            # Open (or re-open after a failed half-open probe)
+            state['open_until'] = time.time() + self.cooldown
+        cache.set(key, state, int(self.cooldown * 4))
+
+
+breaker = CircuitBreaker()
+
+
+def record_failure(delivery, error, max_retries=None):
+    """Count a failed attempt and schedule the next one (or give up)."""
+    max_retries = max_retries or settings.DELIVERY_MAX_RETRIES
+    retries = delivery.retries + 1
+    if retries >= max_retries:
+        transition_delivery(delivery, 'FAILED', retries=retries, last_error=str(error), next_attempt_at=None)
+    else:
+        fields = {
+            'retries': retries,
+            'last_error': str(error),
+            'next_attempt_at': timezone.now() + timedelta(seconds=backoff_seconds(retries)),
+        }
+        if delivery.status == 'PENDING':
+            Delivery.objects.filter(pk=delivery.pk).update(updated_at=timezone.now(), **fields)
+            for name, value in fields.items():
+                setattr(delivery, name, value)
+        else:
+            transition_delivery(delivery, 'PENDING', **fields)
+    breaker.record_failure(delivery.recipient_id)
+
+
+def due_retries(batch_size, now=None):
+    now = now or timezone.now()
+    qs = (
+        Delivery.objects.filter(status='PENDING', next_attempt_at__lte=now)
+        .select_related('message__template', 'recipient')  # send_delivery reads all three
+        .order_by('next_attempt_at')
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        # Several workers can share the queue without picking the same rows. Only
+        # the deliveries are locked: locking the joined message and recipient rows
+        # would block counter updates and the other workers.
+        qs = qs.select_for_update(skip_locked=True, of=('self',))
+    return qs[:batch_size]
+
+
+def process_due_retries(batch_size=200, send=send_delivery):
+    """Attempt one batch of due retries. Returns (sent, failed, deferred)."""
+    sent = failed = deferred = 0
+    touched = set()
+    with transaction.atomic():
+        batch = list(due_retries(batch_size))
+        # Lease the batch: other workers won't see it as due, and if this
+        # worker dies the rows become due again once the lease runs out.
+        Delivery.objects.filter(pk__in=[d.pk for d in batch]).update(
+            next_attempt_at=timezone.now() + timedelta(seconds=LEASE_SECONDS)
+        )
+
+    for d in batch:
+        open_until = breaker.open_until(d.recipient_id)
+        if open_until:
+            Delivery.objects.filter(pk=d.pk).update(
+                next_attempt_at=datetime.fromtimestamp(open_until, tz=dt_timezone.utc)
+            )
+            deferred += 1
+            continue
+        try:
+            send(d)
+        except Exception as e:
+            record_failure(d, e)
+            failed += 1
+        else:
+            transition_delivery(d, 'DELIVERED', last_error='', next_attempt_at=None)
+            breaker.record_success(d.recipient_id)
+            sent += 1
+        touched.add(d.message_id)
+
+    for message in VoiceMessage.objects.filter(pk__in=touched):
+        update_message_status(message)
+    return sent, failed, deferred
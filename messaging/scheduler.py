@@ -0,0 +1,192 @@
+"""
+Timer-driven sending of scheduled voice messages.
+
+The scheduler keeps every QUEUED message due within SCHEDULER_HORIZON_SECONDS
+in an in-memory heap ordered by scheduled_for and sleeps until the earliest
+one is due, so a message goes out at its scheduled second instead of when
+someone next polls. Due messages are sent from a small thread pool
+(SCHEDULER_WORKERS), so a large fan-out doesn't hold up the next timer.
+
+Keeping the heap in sync:
+  - on start, and every SCHEDULER_RESYNC_SECONDS, the heap is rebuilt from
+    one query on the (status, scheduled_for) index; overdue messages left by
+    a restart are sent right away;
+  - saving a VoiceMessage (signals.voice_message_saved) updates the heap
+    directly when the scheduler runs in the same process, and bumps a stamp
+    in the shared cache that other processes' schedulers poll every
+    SCHEDULER_POLL_SECONDS and answer with a resync. Saves of status alone
+    to anything but QUEUED (update_message_status after a send) don't bump
+    it.
+
+Only messages with a scheduled_for are timed. Unscheduled QUEUED messages
+are never picked up here; they go out through RunSchedulerNowView.
+
+Sending claims the message with a conditional UPDATE (QUEUED -> SENT), so
+several schedulers, or a scheduler and RunSchedulerNowView, never fan the
+same message out twice. The delay between scheduled_for and the send is
+recorded as relay_scheduler_lag_seconds.
+
+Run it with `manage.py run_scheduler`; in a deployment that is the
+Procfile's `scheduler` process, which owns the heap. Web workers only bump
+the stamp, and RunSchedulerNowView sends whatever is due on demand.
+"""
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from relay_project.metrics import registry
+from .models import VoiceMessage
+from .services import create_deliveries_for_message, attempt_send_deliveries
+
+logger = logging.getLogger(__name__)
+
+CHANGED_KEY = 'scheduler:changed'
+
+
+def due_messages(now=None):
+    """QUEUED messages that should go out now: unscheduled or scheduled_for passed."""
+    now = now or timezone.now()
+    return VoiceMessage.objects.filter(Q(scheduled_for__isnull=True) | Q(scheduled_for__lte=now), status='QUEUED')
+
+
+def send_due(vm_id):
+    """Claim one due message and fan it out. Returns False if it isn't due or was claimed elsewhere."""
+    if not due_messages().filter(pk=vm_id).update(status='SENT'):
+        return False
+    vm = VoiceMessage.objects.get(pk=vm_id)
+    try:
+        create_deliveries_for_message(vm)
+    except Exception:
+        # Nothing went out; give it back to the next scheduler pass
+        VoiceMessage.objects.filter(pk=vm_id).update(status='QUEUED')
+        raise
+    attempt_send_deliveries(vm)
+    return True
+
+
+class Scheduler:
+    def __init__(self, horizon=None, resync_interval=None, poll_interval=None, workers=None, send=send_due):
+        self.horizon = settings.SCHEDULER_HORIZON_SECONDS if horizon is None else horizon
+        self.resync_interval = resync_interval or settings.SCHEDULER_RESYNC_SECONDS
+        self.poll_interval = poll_interval or settings.SCHEDULER_POLL_SECONDS
+        self.send = send
+        self._pool = ThreadPoolExecutor(workers or settings.SCHEDULER_WORKERS, thread_name_prefix='scheduler')
+        self._cond = threading.Condition()
+        self._heap = []  # (due timestamp, message id); stale entries are skipped when popped
+        self._due = {}   # message id -> due timestamp it is currently scheduled for
+        self._stopped = False
+        self._stamp = None
+        self._next_resync = 0.0
+
+    def __len__(self):
+        return len(self._due)
+
+    def schedule(self, vm_id, scheduled_for):
+        """Add, move or (scheduled_for=None) drop one message's timer."""
+        with self._cond:
+            if scheduled_for is None or scheduled_for.timestamp() > time.time() + self.horizon:
+                # Beyond the horizon: the resync that brings it into range loads it
+                self._due.pop(vm_id, None)
+                return
+            ts = scheduled_for.timestamp()
+            if self._due.get(vm_id) == ts:
+                return
+            self._due[vm_id] = ts
+            heapq.heappush(self._heap, (ts, vm_id))
+            self._cond.notify()
+
+    def resync(self):
+        """Rebuild the heap from the database (indexed on status, scheduled_for)."""
+        self._stamp = cache.get(CHANGED_KEY)
+        until = timezone.now() + timedelta(seconds=self.horizon)
+        rows = VoiceMessage.objects.filter(
+            status='QUEUED', scheduled_for__isnull=False, scheduled_for__lte=until,
+        ).values_list('id', 'scheduled_for')
+        due = {vm_id: scheduled_for.timestamp() for vm_id, scheduled_for in rows}
+        with self._cond:
+            self._due = due
+            self._heap = [(ts, vm_id) for vm_id, ts in due.items()]
+            heapq.heapify(self._heap)
+            self._cond.notify()
+        self._next_resync = time.monotonic() + self.resync_interval
+        logger.debug("Scheduler resynced: %d messages within %ss", len(due), self.horizon)
+
+    def _pop_due(self, now):
+        fired = []
+        while self._heap and self._heap[0][0] <= now:
+            ts, vm_id = heapq.heappop(self._heap)
+            if self._due.get(vm_id) == ts:
+                del self._due[vm_id]
+                fired.append((vm_id, ts))
+        return fired
+
+    def _fire(self, vm_id, ts):
+        close_old_connections()
+        registry.observe('relay_scheduler_lag_seconds', (), max(time.time() - ts, 0.0))
+        try:
+            result = 'sent' if self.send(vm_id) else 'skipped'
+        except Exception:
+            logger.exception("Scheduled send of message %s failed", vm_id)
+            result = 'error'
+        finally:
+            close_old_connections()
+        registry.inc('relay_scheduler_fired_total', (('result', result),))
+        registry.maybe_flush()
+
+    def run_forever(self):
+        self.resync()
+        while not self._stopped:
+            if time.monotonic() >= self._next_resync or cache.get(CHANGED_KEY) != self._stamp:
+                self.resync()
+            with self._cond:
+                fired = self._pop_due(time.time())
+                if not fired:
+                    timeout = self.poll_interval
+                    if self._heap:
+                        timeout = min(timeout, max(self._heap[0][0] - time.time(), 0.0))
+                    self._cond.wait(timeout)
+            for vm_id, ts in fired:
+                self._pool.submit(self._fire, vm_id, ts)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._pool.shutdown(wait=True)
+
+
+_running = None
+
+
+def start(**kwargs):
+    """Run a scheduler on a daemon thread of this process; returns it."""
+    global _running
+    _running = Scheduler(**kwargs)
+    threading.Thread(target=_running.run_forever, name='scheduler', daemon=True).start()
+    return _running
+
+
+def run(**kwargs):
+    """Run a scheduler on the calling thread until stopped."""
+    global _running
+    _running = Scheduler(**kwargs)
+    try:
+        _running.run_forever()
+    finally:
+        _running.stop()
+
+
+def message_changed(vm):
+    """Called after a VoiceMessage save commits."""
+    if _running is not None:
+        _running.schedule(vm.id, vm.scheduled_for if vm.status == 'QUEUED' else None)
+    cache.set(CHANGED_KEY, time.time(), None)
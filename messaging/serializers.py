@@ -1,11 +1,20 @@
 from rest_framework import serializers
-from .models import Contact, Group, VoiceMessage, Delivery, MessageTemplate, Message
+from .models import Contact, Group, VoiceMessage, Delivery, MessageTemplate, Message, ReplyMessage
+from .audio import decode_waveform
+
+
+class AudioMetadataMixin(serializers.Serializer):
+    """Duration, codec, bitrate and waveform, so lists need no audio bytes."""
+    waveform = serializers.SerializerMethodField()
+
+    def get_waveform(self, obj):
+        return decode_waveform(obj.waveform)
 
 
 class ContactSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contact
-        fields = ['id', 'name', 'email', 'phone', 'role', 'is_active']
+        fields = ['id', 'name', 'email', 'phone', 'role', 'department', 'is_active']
 
 
 class GroupSerializer(serializers.ModelSerializer):
@@ -16,15 +25,19 @@ class GroupSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'contacts']
 
 
-class VoiceMessageSerializer(serializers.ModelSerializer):
+class VoiceMessageSerializer(AudioMetadataMixin, serializers.ModelSerializer):
     class Meta:
         model = VoiceMessage
         fields = [
             'id', 'sender_name', 'audio_file', 'transcribed_text',
             'stt_confidence', 'stt_status', 'priority', 'scheduled_for',
-            'status', 'created_at'
+            'status', 'created_at', 'template',
+            'duration_ms', 'audio_codec', 'audio_bitrate', 'waveform',
+        ]
+        read_only_fields = [
+            'transcribed_text', 'stt_confidence', 'stt_status', 'status', 'created_at',
+            'duration_ms', 'audio_codec', 'audio_bitrate',
         ]
-        read_only_fields = ['transcribed_text', 'stt_confidence', 'stt_status', 'status', 'created_at']
 
 
 class DeliverySerializer(serializers.ModelSerializer):
@@ -38,18 +51,23 @@ class DeliverySerializer(serializers.ModelSerializer):
 class MessageTemplateSerializer(serializers.ModelSerializer):
     class Meta:
         model = MessageTemplate
-        fields = ['id', 'title', 'body']
+        fields = ['id', 'title', 'body', 'version']
 
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(AudioMetadataMixin, serializers.ModelSerializer):
     # Use "from" to match frontend; compute from user’s name/username
     from_field = serializers.SerializerMethodField(source='from')
     audio_url = serializers.SerializerMethodField()
     image_url = serializers.SerializerMethodField()
+    image = serializers.SerializerMethodField()
 
     class Meta:
         model = Message
-        fields = ['id', 'text', 'audio_url', 'image_url', 'from_field', 'target_role', 'created_at']
+        fields = [
+            'id', 'text', 'audio_url', 'image_url', 'image', 'from_field', 'target_role', 'created_at',
+            'duration_ms', 'audio_codec', 'audio_bitrate', 'waveform',
+            'reply_count', 'last_reply_at',
+        ]
 
     def get_from_field(self, obj):
         return obj.user.first_name or obj.user.username
@@ -67,3 +85,34 @@ class MessageSerializer(serializers.ModelSerializer):
 
     def get_image_url(self, obj):
         return self._absolute_url(obj.image_url or "")
+
+    def get_image(self, obj):
+        """
+        Dimensions, placeholder and resized variants (smallest first), so lists
+        can show `thumbnail_url` and pick a larger variant by width. Variants
+        are empty until the image pipeline has processed the upload.
+        """
+        if not obj.image_url:
+            return None
+        variants = [
+            {**v, 'webp': self._absolute_url(v['webp']), 'jpeg': self._absolute_url(v['jpeg'])}
+            for v in obj.image_variants or []
+        ]
+        return {
+            'width': obj.image_width,
+            'height': obj.image_height,
+            'placeholder': obj.image_placeholder,
+            'thumbnail_url': variants[0]['webp'] if variants else self._absolute_url(obj.image_url),
+            'variants': variants,
+        }
+
+
+class ReplySerializer(serializers.ModelSerializer):
+    """Also used for ArchivedReply rows; expects select_related('sender')."""
+    sender_id = serializers.IntegerField(read_only=True)
+    sender_name = serializers.CharField(source='sender.name', read_only=True)
+    sender_role = serializers.CharField(source='sender.role', read_only=True)
+
+    class Meta:
+        model = ReplyMessage
+        fields = ['id', 'sender_id', 'sender_name', 'sender_role', 'reply_text', 'created_at']
@@ -1,6 +1,12 @@
 from datetime import datetime
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from .models import VoiceMessage, Delivery, Contact, Group, AuditLog
+from .models import VoiceMessage, Delivery, Group, AuditLog, Message, ReplyMessage
+from . import readstate, templating
+from .audience import index as audience_index
+from .transports import get_transport, message_payload, delivery_payload
 
 # Simple stub STT: returns placeholder text and confidence.
 # You can replace with real STT integration later.
@@ -11,40 +17,163 @@ def transcribe_audio(file_path: str):
     confidence = 0.65
     return text, confidence
 
+def message_approved(msg):
+    """
+    Run once when an inbox Message becomes visible to its audience. Called
+    by signals.message_saved for every save() that approves a message.
+    """
+    readstate.count_new_message(msg)
+
+def create_approved_message(**fields):
+    """Create an already-approved inbox Message; the save counts it as unread."""
+    return Message.objects.create(status='approved', **fields)
+
+def create_approved_messages(messages):
+    """Bulk-insert unsaved approved Messages and count them as unread."""
+    with transaction.atomic():
+        created = Message.objects.bulk_create(messages)
+        readstate.count_new_messages(created)
+    return created
+
+def message_withdrawn(msg):
+    """
+    Run when a previously approved Message is taken down. It gives up its
+    approval position, so approving it again counts it as new.
+    """
+    Message.objects.filter(pk=msg.pk).update(approval_seq=None)
+    msg.approval_seq = None
+    readstate.invalidate_counts(msg.target_role)
+
+def add_reply(message, sender_id, text):
+    """Thread a reply under an inbox Message and bump its reply counters."""
+    with transaction.atomic():
+        reply = ReplyMessage.objects.create(original_message=message, sender_id=sender_id, reply_text=text)
+        Message.objects.filter(pk=message.pk).update(
+            reply_count=F('reply_count') + 1, last_reply_at=reply.created_at,
+        )
+    return reply
+
+def recount_replies(message_ids):
+    """Rebuild reply_count/last_reply_at from the ReplyMessage rows (after deletes or bulk inserts)."""
+    replies = ReplyMessage.objects.filter(original_message=OuterRef('pk')).order_by().values('original_message')
+    Message.objects.filter(pk__in=message_ids).update(
+        reply_count=Coalesce(Subquery(replies.annotate(n=Count('id')).values('n')), 0),
+        last_reply_at=Subquery(replies.annotate(last=Max('created_at')).values('last')),
+    )
+
 def should_send_now(vm: VoiceMessage) -> bool:
     if not vm.scheduled_for:
         return True
     return timezone.now() >= vm.scheduled_for
 
-def create_deliveries_for_groups(vm: VoiceMessage, group_ids: list[int]):
-    recipients = Contact.objects.filter(groups_id_in=group_ids, is_active=True).distinct()
-    count = 0
-    for r in recipients:
-        Delivery.objects.get_or_create(message=vm, recipient=r)
-        count += 1
-    AuditLog.objects.create(event='DELIVERY_CREATED', details=f'Created {count} deliveries for message {vm.id}')
-
-def attempt_send_deliveries(vm: VoiceMessage, max_retries=3):
-    # Simulate delivery sending; in real setup, push notifications or in-app pull.
-    for d in vm.deliveries.all():
-        if d.status in ('DELIVERED', 'READ'):
+def move_delivery_counts(message_id, old_status, new_status, n=1):
+    """Shift n deliveries between the status counters of one VoiceMessage."""
+    if not n or old_status == new_status:
+        return
+    changes = {}
+    if old_status:
+        field = VoiceMessage.COUNTER_FIELDS[old_status]
+        changes[field] = F(field) - n
+    field = VoiceMessage.COUNTER_FIELDS[new_status]
+    changes[field] = F(field) + n
+    VoiceMessage.objects.filter(pk=message_id).update(**changes)
+
+def recount_deliveries(vm: VoiceMessage):
+    """Rebuild the counters from the Delivery rows (after bulk inserts)."""
+    values = dict.fromkeys(VoiceMessage.COUNTER_FIELDS.values(), 0)
+    for row in vm.deliveries.values('status').annotate(n=Count('id')).order_by():
+        values[VoiceMessage.COUNTER_FIELDS[row['status']]] = row['n']
+    VoiceMessage.objects.filter(pk=vm.pk).update(**values)
+    for field, value in values.items():
+        setattr(vm, field, value)
+
+def transition_delivery(delivery: Delivery, new_status, **fields):
+    """
+    Move one delivery to new_status and adjust its message's counters in the
+    same transaction. The UPDATE is conditional on the status we read, so two
+    concurrent transitions can't both decrement the same counter.
+    Returns False if the delivery was already in new_status; the other
+    fields are still saved.
+    """
+    while True:
+        old_status = delivery.status
+        if old_status == new_status:
+            updated = Delivery.objects.filter(pk=delivery.pk, status=old_status).update(
+                updated_at=timezone.now(), **fields
+            )
+            if updated:
+                for name, value in fields.items():
+                    setattr(delivery, name, value)
+                return False
+            delivery.refresh_from_db(fields=['status'])
             continue
-        try:
-            # Simulate success for now:
-            d.status = 'DELIVERED'
-            d.last_error = ''
-            d.save()
-        except Exception as e:
-            d.retries += 1
-            d.last_error = str(e)
-            d.status = 'FAILED' if d.retries >= max_retries else 'PENDING'
-            d.save()
-    statuses = vm.deliveries.values_list('status', flat=True)
-    if all(s in ('DELIVERED', 'READ') for s in statuses):
+        with transaction.atomic():
+            updated = Delivery.objects.filter(pk=delivery.pk, status=old_status).update(
+                status=new_status, updated_at=timezone.now(), **fields
+            )
+            if updated:
+                move_delivery_counts(delivery.message_id, old_status, new_status)
+        if updated:
+            delivery.status = new_status
+            for name, value in fields.items():
+                setattr(delivery, name, value)
+            return True
+        delivery.refresh_from_db(fields=['status'])
+
+def _bulk_create_deliveries(vm: VoiceMessage, contact_ids):
+    Delivery.objects.bulk_create(
+        [Delivery(message=vm, recipient_id=cid) for cid in contact_ids],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    recount_deliveries(vm)
+    AuditLog.objects.create(event='DELIVERY_CREATED', details=f'Created {len(contact_ids)} deliveries for message {vm.id}')
+
+def create_deliveries_for_groups(vm: VoiceMessage, group_ids: list[int]):
+    audience = audience_index.resolve_groups(group_ids)
+    _bulk_create_deliveries(vm, audience.contact_ids)
+
+def create_deliveries_for_message(vm: VoiceMessage):
+    """Fan a voice message out to every active contact in its target_group."""
+    audience = audience_index.resolve(vm.target_group)
+    _bulk_create_deliveries(vm, audience.contact_ids)
+
+def send_delivery(delivery: Delivery):
+    """Push one delivery to its recipient through the configured transport; raises on failure."""
+    r = delivery.recipient
+    vm = delivery.message
+    payload = delivery_payload(message_payload(vm), delivery.pk, r.pk, r.name, r.email, r.phone)
+    compiled = templating.for_message(vm)
+    if compiled is not None:
+        payload['text'] = compiled.render((r.name, r.role, r.department), vm.sender_name)
+    if vm.is_emergency:
+        from .emergency import get_emergency_transport  # emergency builds on this module
+
+        # A resumed emergency keeps going out over the emergency transport
+        get_emergency_transport().send(payload)
+    else:
+        get_transport().send(payload)
+
+def update_message_status(vm: VoiceMessage):
+    """Derive the VoiceMessage status from its counters (one-row read)."""
+    vm.refresh_from_db(fields=list(VoiceMessage.COUNTER_FIELDS.values()))
+    if vm.delivered_count + vm.read_count == vm.total_deliveries:
         vm.status = 'COMPLETED'
-    elif any(s == 'FAILED' for s in statuses):
+    elif vm.failed_count:
         vm.status = 'FAILED'
     else:
         vm.status = 'SENT'
     vm.save(update_fields=['status'])
-    AuditLog.objects.create(event='DELIVERY_ATTEMPTED', details=f'Message {vm.id} status now {vm.status}')
\ No newline at end of file
+
+def attempt_send_deliveries(vm: VoiceMessage, max_retries=None):
+    """Send every outstanding delivery of vm concurrently via the configured transport."""
+    from .dispatch import dispatch  # dispatch builds on this module
+
+    outstanding = (
+        vm.deliveries.exclude(status__in=('DELIVERED', 'READ', 'FAILED'))  # FAILED: retries exhausted
+        .exclude(next_attempt_at__gt=timezone.now())  # waiting out a retry backoff
+    )
+    report = dispatch(vm, outstanding, max_retries=max_retries)
+    update_message_status(vm)
+    AuditLog.objects.create(event='DELIVERY_ATTEMPTED', details=f'Message {vm.id} status now {vm.status}; {report}')
+    return report
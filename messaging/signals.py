@@ -0,0 +1,105 @@
+import copy
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Contact, Group, Message, MessageTemplate, VoiceMessage
+from .audience import index as audience_index
+from . import refcache, scheduler, services
+
+User = get_user_model()
+
+# Audience index updates run on commit: publishing the new version earlier lets
+# another worker (or the emergency roster) rebuild from the pre-commit rows and
+# keep them until the next bump.
+
+# Only these User fields affect audience membership
+AUDIENCE_FIELDS = {'role', 'is_active'}
+
+# Only these VoiceMessage fields affect the scheduler's timers
+SCHEDULE_FIELDS = {'status', 'scheduled_for'}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not AUDIENCE_FIELDS.intersection(update_fields):
+        return  # e.g. last_login bumps on every token login
+    transaction.on_commit(lambda: audience_index.user_changed(instance))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    instance = copy.copy(instance)  # delete() clears the pk before the commit
+    transaction.on_commit(lambda: audience_index.user_changed(instance, deleted=True))
+
+
+@receiver(post_save, sender=Contact)
+def contact_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: audience_index.contact_changed(instance))
+    refcache.invalidate('contacts', 'groups')
+
+
+@receiver(post_delete, sender=Contact)
+def contact_deleted(sender, instance, **kwargs):
+    instance = copy.copy(instance)  # delete() clears the pk before the commit
+    transaction.on_commit(lambda: audience_index.contact_changed(instance, deleted=True))
+    refcache.invalidate('contacts', 'groups')
+
+
+@receiver(m2m_changed, sender=Group.contacts.through)
+def group_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    refcache.invalidate('groups')
+    if reverse:
+        # contact.groups.add(...): instance is the Contact
+        group_ids = list(pk_set or Group.objects.filter(contacts=instance).values_list('id', flat=True))
+    else:
+        group_ids = [instance.pk]
+
+    def update():
+        for gid in group_ids:
+            audience_index.group_changed(gid)
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    group_id = instance.pk
+    transaction.on_commit(lambda: audience_index.group_changed(group_id, deleted=True))
+    refcache.invalidate('groups')
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    refcache.invalidate('groups')
+
+
+@receiver([post_save, post_delete], sender=MessageTemplate)
+def template_changed(sender, instance, **kwargs):
+    refcache.invalidate('templates')
+
+
+@receiver(post_save, sender=VoiceMessage)
+def voice_message_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields:
+        changed = SCHEDULE_FIELDS.intersection(update_fields)
+        if not changed or (changed == {'status'} and instance.status != 'QUEUED'):
+            # e.g. update_message_status after a send: the message already left
+            # the timers, so don't make every scheduler resync
+            return
+    transaction.on_commit(lambda: scheduler.message_changed(instance))
+
+
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, raw=False, **kwargs):
+    # approval_seq is set exactly while a message is counted as approved, so
+    # admin edits and plain ORM saves go through the same bookkeeping
+    if raw:
+        return
+    if instance.status == 'approved' and instance.approval_seq is None:
+        services.message_approved(instance)
+    elif instance.status != 'approved' and instance.approval_seq is not None:
+        services.message_withdrawn(instance)
@@ -0,0 +1,481 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from messaging import archive, emergency, readstate, retries, services, templating
+from messaging.models import (
+    ArchivedDelivery, ArchivedMessage, ArchivedReply, ArchivedVoiceMessage,
+    Contact, Delivery, Message, MessageTemplate, ReadState, VoiceMessage,
+)
+from messaging.transports import InAppTransport
+from relay_project import metrics, throttling
+from relay_project.queryaudit import QueryAudit, assert_max_queries
+
+User = get_user_model()
+
+
+class InboxQueryBudgetTest(TestCase):
+    """The inbox must stay a fixed number of queries however many rows it returns."""
+
+    MESSAGES = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        senders = [
+            User.objects.create(username=f'sender{i}', first_name=f'Sender {i}' if i % 2 else '', role='PRINCIPAL')
+            for i in range(10)
+        ]
+        Message.objects.bulk_create([
+            Message(
+                text=f'Message {i}',
+                user=senders[i % len(senders)],
+                status='approved',
+                target_role='ALL' if i % 3 else 'STAFF',
+                image_url='/media/images/seed.jpg' if i % 7 == 0 else None,
+            )
+            for i in range(cls.MESSAGES)
+        ])
+        cls.reader = User.objects.create(username='reader', role='STAFF')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def test_inbox_query_budget(self):
+        with assert_max_queries(3):
+            response = self.client.get('/api/messages/inbox/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), self.MESSAGES)
+        self.assertTrue({'Sender 1', 'sender0'} <= {row['from_field'] for row in response.json()})
+
+    def test_sparse_inbox_query_budget(self):
+        with assert_max_queries(3):
+            response = self.client.get('/api/messages/inbox/', {'fields': 'id,text,from_field'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()[0]), {'id', 'text', 'from_field'})
+
+
+class ReadStateTest(TestCase):
+    """Unread counters follow approval order, whichever path approves a message."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = User.objects.create(username='principal', role='PRINCIPAL')
+        cls.reader = User.objects.create(username='staff', role='STAFF')
+
+    def message(self, **fields):
+        fields = {'text': 'hello', 'user': self.sender, 'target_role': 'STAFF', **fields}
+        return Message.objects.create(**fields)
+
+    def test_plain_save_approval_is_counted(self):
+        msg = self.message()  # pending
+        self.assertEqual(readstate.unread_count(self.reader), 0)
+        msg.status = 'approved'
+        msg.save()
+        self.assertIsNotNone(msg.approval_seq)
+        self.assertEqual(readstate.unread_count(self.reader), 1)
+        self.assertEqual(readstate.mark_read(self.reader, [msg.id]), 0)
+        readstate.invalidate_counts('STAFF')
+        self.assertEqual(readstate.unread_count(self.reader), 0)
+
+    def test_late_approval_below_read_position_is_counted(self):
+        late = self.message()
+        newer = self.message(status='approved')
+        self.assertEqual(readstate.mark_read_up_to(self.reader, newer.id), 0)
+        late.status = 'approved'
+        late.save()
+        self.assertGreater(late.approval_seq, newer.approval_seq)
+        self.assertEqual(readstate.unread_count(self.reader), 1)
+        readstate.invalidate_counts('STAFF')
+        self.assertEqual(readstate.unread_count(self.reader), 1)
+
+    def test_mark_read_up_to_by_id(self):
+        late = self.message()
+        first = self.message(status='approved')
+        second = self.message(status='approved')
+        late.status = 'approved'
+        late.save()
+        self.assertEqual(readstate.unread_count(self.reader), 3)
+        # ids <= late.id: only the late approval, which sits above the others
+        self.assertEqual(readstate.mark_read_up_to(self.reader, late.id), 2)
+        self.assertEqual(readstate.mark_read_up_to(self.reader, second.id), 0)
+        state = ReadState.objects.get(user=self.reader)
+        self.assertEqual((state.last_read_seq, state.read_above), (late.approval_seq, []))
+        self.assertLess(first.approval_seq, second.approval_seq)
+
+    def test_withdraw_and_reapprove(self):
+        msg = self.message(status='approved')
+        self.assertEqual(readstate.mark_read(self.reader, [msg.id]), 0)
+        msg.status = 'rejected'
+        msg.save()
+        self.assertIsNone(msg.approval_seq)
+        self.assertEqual(readstate.unread_count(self.reader), 0)
+        msg.status = 'approved'
+        msg.save()
+        self.assertEqual(readstate.unread_count(self.reader), 1)
+
+    def test_batch_counts_every_audience(self):
+        services.create_approved_messages([
+            Message(text=f'batch {i}', user=self.sender, status='approved', target_role=role)
+            for i, role in enumerate(['STAFF', 'ALL', 'HOD'])
+        ])
+        self.assertEqual(readstate.unread_count(self.reader), 2)
+        ReadState.objects.update(unread_count=None)
+        self.assertEqual(readstate.unread_count(self.reader), 2)
+
+
+class EmergencyRoutingTest(TestCase):
+    """Only broadcasts use the emergency transport; ordinary sends to ALL don't."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='staff', role='STAFF')
+        cls.contact = Contact.objects.create(name='Staff', role='STAFF', user=user, email='staff@example.com')
+
+    def send(self, **fields):
+        vm = VoiceMessage.objects.create(sender_name='principal', target_group='ALL', status='SENT', **fields)
+        delivery = Delivery.objects.create(message=vm, recipient=self.contact)
+        regular, emergency_transport = mock.Mock(), mock.Mock()
+        with mock.patch('messaging.services.get_transport', return_value=regular), \
+                mock.patch('messaging.emergency.get_emergency_transport', return_value=emergency_transport):
+            services.send_delivery(delivery)
+        return regular.send.call_count, emergency_transport.send.call_count
+
+    def test_ordinary_send_to_all_uses_regular_transport(self):
+        self.assertEqual(self.send(), (1, 0))
+
+    def test_emergency_uses_emergency_transport(self):
+        self.assertEqual(self.send(is_emergency=True, priority='URGENT'), (0, 1))
+
+
+class VoiceMessageUploadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.principal = User.objects.create(username='principal', role='PRINCIPAL')
+        cls.template = MessageTemplate.objects.create(title='Notice', body='Hello {{ name }}')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.principal)
+
+    def post(self, **data):
+        return self.client.post('/api/messages/voice/', {'template_id': self.template.pk, **data}, format='multipart')
+
+    def test_unknown_target_group_is_rejected(self):
+        response = self.post(target_group='NONSENSE')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ALL', response.json()['allowed_groups'])
+        self.assertFalse(VoiceMessage.objects.exists())
+
+    def test_known_target_group_is_queued(self):
+        response = self.post(target_group='HOD')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(VoiceMessage.objects.get().target_group, 'HOD')
+
+    def test_bad_placeholder_is_rejected_before_dispatch(self):
+        # objects.create skips MessageTemplate.clean, like an API or fixture load would
+        self.template = MessageTemplate.objects.create(title='Typo', body='Hello {{ nmae }}')
+        response = self.post(target_group='HOD')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('nmae', response.json()['error'])
+        self.assertFalse(VoiceMessage.objects.exists())
+
+    def test_saves_bump_the_version_in_sql(self):
+        stale = MessageTemplate.objects.get(pk=self.template.pk)
+        self.template.save()
+        stale.save()
+        self.assertEqual(stale.version, 3)
+        self.assertEqual(MessageTemplate.objects.get(pk=self.template.pk).version, 3)
+
+
+class IdempotencyTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.principal = User.objects.create(username='principal', role='PRINCIPAL')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.principal)
+
+    def send(self, text, key='retry-1'):
+        return self.client.post('/api/messages/send/', {'message_text': text, 'target_group': 'STAFF'},
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_original_bytes(self):
+        first = self.send('Exam postponed')
+        retry = self.send('Exam postponed')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.content), (first.status_code, first.content))
+        self.assertEqual(retry['Content-Type'], first['Content-Type'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_key_reused_with_other_payload_is_rejected(self):
+        self.send('Exam postponed')
+        self.assertEqual(self.send('Exam cancelled').status_code, 422)
+        self.assertEqual(self.send('Exam cancelled', key='retry-2').status_code, 201)
+        self.assertEqual(Message.objects.count(), 2)
+
+
+class ArchiveTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = User.objects.create(username='principal', role='PRINCIPAL')
+        cls.contact = Contact.objects.create(name='Staff', role='STAFF', user=cls.sender, email='staff@example.com')
+
+    def age(self, model, obj, days=400):
+        model.objects.filter(pk=obj.pk).update(created_at=timezone.now() - timedelta(days=days))
+
+    def voice(self, delivery_status):
+        vm = VoiceMessage.objects.create(sender_name='principal', status='SENT')
+        Delivery.objects.create(message=vm, recipient=self.contact, status=delivery_status)
+        services.recount_deliveries(vm)
+        self.age(VoiceMessage, vm)
+        return vm
+
+    def test_message_moves_with_its_replies(self):
+        msg = Message.objects.create(text='old', user=self.sender, status='approved')
+        services.add_reply(msg, self.contact.pk, 'Noted.')
+        self.age(Message, msg)
+        pending = Message.objects.create(text='waiting', user=self.sender)
+        self.age(Message, pending)
+
+        self.assertEqual(archive.archive_old(days=30, names=['messages']), {'messages': 1})
+        self.assertFalse(Message.objects.filter(pk=msg.pk).exists())
+        self.assertTrue(ArchivedMessage.objects.filter(pk=msg.pk, reply_count=1).exists())
+        self.assertEqual(ArchivedReply.objects.get().original_message_id, msg.pk)
+        self.assertTrue(Message.objects.filter(pk=pending.pk).exists())
+
+    def test_only_settled_voice_messages_move(self):
+        settled = self.voice('DELIVERED')
+        in_flight = self.voice('SENT')
+        self.assertEqual(archive.archive_old(days=30, names=['voice']), {'voice': 1})
+        self.assertEqual(list(ArchivedVoiceMessage.objects.values_list('id', flat=True)), [settled.pk])
+        self.assertEqual(ArchivedDelivery.objects.get().message_id, settled.pk)
+        self.assertTrue(Delivery.objects.filter(message=in_flight).exists())
+
+
+class RetryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='staff', role='STAFF')
+        template = MessageTemplate.objects.create(title='Notice', body='Hello {{ name }}')
+        cls.contacts = [
+            Contact.objects.create(name=f'Staff {i}', role='STAFF', user=user, email=f'staff{i}@example.com')
+            for i in range(5)
+        ]
+        cls.vm = VoiceMessage.objects.create(sender_name='principal', status='SENT', template=template)
+
+    def setUp(self):
+        due = timezone.now() - timedelta(seconds=1)
+        self.deliveries = [
+            Delivery.objects.create(message=self.vm, recipient=c, next_attempt_at=due) for c in self.contacts
+        ]
+        services.recount_deliveries(self.vm)
+
+    def test_due_batch_is_sent_without_per_row_queries(self):
+        sent_texts = []
+        with QueryAudit(explain=False) as audit:
+            result = retries.process_due_retries(send=lambda d: sent_texts.append(
+                templating.for_message(d.message).render(
+                    (d.recipient.name, d.recipient.role, d.recipient.department), d.message.sender_name)))
+        # Each delivery is written on its own, but nothing is read per row
+        repeated_reads = [shape for shape in audit.repeated() if shape.startswith('SELECT')]
+        self.assertEqual(repeated_reads, [])
+        self.assertEqual(result, (5, 0, 0))
+        self.assertIn('Hello Staff 0', sent_texts)
+        self.vm.refresh_from_db()
+        self.assertEqual((self.vm.delivered_count, self.vm.pending_count, self.vm.status), (5, 0, 'COMPLETED'))
+
+    def test_failures_back_off_then_give_up(self):
+        def fail(delivery):
+            raise RuntimeError('unreachable')
+        self.assertEqual(retries.process_due_retries(send=fail), (0, 5, 0))
+        delivery = Delivery.objects.get(pk=self.deliveries[0].pk)
+        self.assertEqual((delivery.status, delivery.retries, delivery.last_error), ('PENDING', 1, 'unreachable'))
+        self.assertGreater(delivery.next_attempt_at, timezone.now() - timedelta(seconds=1))
+
+        retries.record_failure(delivery, 'still down', max_retries=2)
+        retries.record_failure(delivery, 'down again', max_retries=2)
+        delivery.refresh_from_db()
+        self.assertEqual((delivery.status, delivery.retries, delivery.last_error), ('FAILED', 3, 'down again'))
+        self.vm.refresh_from_db()
+        self.assertEqual((self.vm.failed_count, self.vm.pending_count), (1, 4))
+
+
+class DeliveryCounterTest(TestCase):
+    """The per-status counters on VoiceMessage move with every delivery transition."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vm = VoiceMessage.objects.create(sender_name='principal', target_group='STAFF', status='SENT')
+        contacts = [
+            Contact.objects.create(name=f'Staff {i}', role='STAFF', user=User.objects.create(username=f'staff{i}'))
+            for i in range(2)
+        ]
+        cls.deliveries = [Delivery.objects.create(message=cls.vm, recipient=c) for c in contacts]
+        services.recount_deliveries(cls.vm)
+
+    def counters(self):
+        self.vm.refresh_from_db()
+        return {status: getattr(self.vm, field) for status, field in VoiceMessage.COUNTER_FIELDS.items() if getattr(self.vm, field)}
+
+    def test_transition_moves_one_count(self):
+        self.assertTrue(services.transition_delivery(self.deliveries[0], 'SENT'))
+        self.assertEqual(self.counters(), {'PENDING': 1, 'SENT': 1})
+        self.assertTrue(services.transition_delivery(self.deliveries[0], 'DELIVERED'))
+        self.assertEqual(self.counters(), {'PENDING': 1, 'DELIVERED': 1})
+
+    def test_same_status_keeps_counts_but_saves_fields(self):
+        delivery = self.deliveries[0]
+        self.assertFalse(services.transition_delivery(delivery, 'PENDING', last_error='timeout'))
+        self.assertEqual(self.counters(), {'PENDING': 2})
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.last_error, 'timeout')
+
+    def test_stale_instance_is_not_counted_twice(self):
+        stale = Delivery.objects.get(pk=self.deliveries[0].pk)
+        services.transition_delivery(self.deliveries[0], 'DELIVERED')
+        self.assertFalse(services.transition_delivery(stale, 'DELIVERED'))
+        self.assertEqual(self.counters(), {'PENDING': 1, 'DELIVERED': 1})
+
+    def test_recount_matches_rows(self):
+        Delivery.objects.filter(pk=self.deliveries[1].pk).update(status='FAILED')
+        services.recount_deliveries(self.vm)
+        self.assertEqual(self.counters(), {'PENDING': 1, 'FAILED': 1})
+        services.update_message_status(self.vm)
+        self.assertEqual(self.vm.status, 'FAILED')
+
+
+class EmergencyTransportFallbackTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(emergency, '_transport', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(EMERGENCY_TRANSPORT='carrier-pigeon', DELIVERY_TRANSPORT='inapp')
+    def test_unusable_emergency_transport_falls_back_to_delivery_transport(self):
+        with self.assertLogs('messaging.emergency', 'ERROR'):
+            transport = emergency.get_emergency_transport()
+        self.assertIsInstance(transport, InAppTransport)
+        self.assertIs(emergency.get_emergency_transport(), transport)
+
+    @override_settings(EMERGENCY_TRANSPORT='inapp')
+    def test_emergency_transport_is_unthrottled(self):
+        self.assertFalse(emergency.get_emergency_transport().limiter.rate)
+
+
+@override_settings(THROTTLE_BUCKETS={'send': {'user': '2/min:2', 'role': '1/min:1'}})
+class SendThrottleTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.principal = User.objects.create(username='principal', role='PRINCIPAL')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.principal)
+
+    def send(self):
+        return self.client.post('/api/messages/send/', {'message_text': 'Bus delayed', 'target_group': 'STAFF'})
+
+    def test_rejected_request_gets_429_with_retry_after(self):
+        self.assertEqual(self.send().status_code, 201)
+        response = self.send()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_tokens_taken_before_a_rejection_are_refunded(self):
+        self.send()
+        self.send()  # the user bucket allows it, the role bucket doesn't
+        # Without the refund the user bucket would now be empty as well
+        self.assertEqual(throttling.consume(f'throttle:send:user:{self.principal.pk}', '2/min:2'), 0)
+
+
+class BatchSendTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.principal = User.objects.create(username='principal', role='PRINCIPAL')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.principal)
+
+    def send(self, items):
+        return self.client.post('/api/messages/send/batch/', {'items': items}, format='json')
+
+    def test_all_valid_items_give_201(self):
+        response = self.send([{'message_text': 'Fire drill', 'target_groups': ['STAFF', 'HOD']}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['results'][0]['message_ids']), 2)
+        self.assertEqual(Message.objects.filter(status='approved').count(), 2)
+
+    def test_invalid_items_give_207_with_per_item_errors(self):
+        response = self.send([
+            {'message_text': 'Fire drill', 'target_group': 'STAFF'},
+            {'message_text': 'Nowhere', 'target_group': 'NOPE'},
+            {'target_group': 'HOD'},
+        ])
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual(body['created'], 1)
+        self.assertEqual([sorted(r) for r in body['results']], [['index', 'message_ids'], ['error', 'index'], ['error', 'index']])
+        self.assertEqual(Message.objects.get().text, 'Fire drill')
+
+    def test_no_valid_items_give_400(self):
+        response = self.send([{'message_text': 'Nowhere', 'target_group': 'NOPE'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Message.objects.exists())
+
+
+class MetricsSnapshotTest(TestCase):
+    """Snapshots of exited processes are folded into one file without losing counts."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+        settings = override_settings(METRICS_DIR=self.dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def exited_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        return process.pid
+
+    def write(self, pid, value):
+        with open(os.path.join(self.dir, f'{pid}.json'), 'w') as fh:
+            json.dump({'counters': [['relay_test_total', [['route', 'x']], value]], 'histograms': []}, fh)
+
+    def total(self):
+        counters, _ = metrics._merged_snapshots()
+        return counters[('relay_test_total', (('route', 'x'),))]
+
+    def test_dead_snapshots_are_folded_into_one_file(self):
+        first, second = self.exited_pid(), self.exited_pid()
+        self.write(first, 2)
+        self.assertEqual(self.total(), 2)
+        self.write(second, 3)
+        self.assertEqual(self.total(), 5)
+        self.assertEqual(self.total(), 5)
+        files = set(os.listdir(self.dir)) - {'merge.lock'}
+        self.assertEqual(files, {metrics.DEAD_SNAPSHOT, f'{os.getpid()}.json'})
+
+    def test_live_snapshots_are_kept(self):
+        self.write(os.getppid(), 4)
+        self.assertEqual(self.total(), 4)
+        self.assertIn(f'{os.getppid()}.json', os.listdir(self.dir))
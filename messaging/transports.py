@@ -0,0 +1,161 @@
+"""
+Delivery transports.
+
+A transport sends one rendered notification to one recipient and raises on
+failure. Available adapters:
+
+  inapp    - nothing to push; clients pull their inbox (always succeeds)
+  push     - JSON POST to PUSH_ENDPOINT_URL (a push gateway, or the local
+             fake server from `manage.py fake_push_server`)
+  webhook  - JSON POST to WEBHOOK_URL
+
+HTTP transports share one pooled requests.Session and a token-bucket rate
+limit per transport, so the concurrent dispatcher can't exceed the
+gateway's quota.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+
+class TransportError(Exception):
+    pass
+
+
+class TokenBucket:
+    """Blocking token bucket; rate <= 0 means unlimited."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Transport:
+    name = None
+
+    def __init__(self, rate_limit=0):
+        self.limiter = TokenBucket(rate_limit)
+
+    def send(self, payload):
+        self.limiter.acquire()
+        self._send(payload)
+
+    def _send(self, payload):
+        raise NotImplementedError
+
+
+class InAppTransport(Transport):
+    name = 'inapp'
+
+    def _send(self, payload):
+        # The recipient's app pulls the inbox; recording the delivery is enough
+        return None
+
+
+class HttpTransport(Transport):
+    """POSTs each payload as JSON through a pooled keep-alive session."""
+
+    def __init__(self, url, rate_limit=0, pool_size=None, timeout=None):
+        super().__init__(rate_limit)
+        if not url:
+            raise TransportError(f"No URL configured for the {self.name} transport")
+        self.url = url
+        self.timeout = timeout or settings.TRANSPORT_TIMEOUT_SECONDS
+        self.pool_size = pool_size or settings.DELIVERY_MAX_IN_FLIGHT
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests  # only HTTP transports need it
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def _send(self, payload):
+        resp = self.session.post(self.url, json=payload, timeout=self.timeout)
+        if resp.status_code >= 300:
+            raise TransportError(f"{self.name} returned HTTP {resp.status_code}")
+
+
+class PushTransport(HttpTransport):
+    name = 'push'
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('rate_limit', settings.PUSH_RATE_LIMIT)
+        super().__init__(settings.PUSH_ENDPOINT_URL, **kwargs)
+
+
+class WebhookTransport(HttpTransport):
+    name = 'webhook'
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('rate_limit', settings.WEBHOOK_RATE_LIMIT)
+        super().__init__(settings.WEBHOOK_URL, **kwargs)
+
+
+TRANSPORTS = {
+    'inapp': InAppTransport,
+    'push': PushTransport,
+    'webhook': WebhookTransport,
+}
+
+
+def message_payload(vm):
+    """Fields shared by every recipient of one VoiceMessage."""
+    return {
+        'message_id': vm.id,
+        'sender': vm.sender_name,
+        'priority': vm.priority,
+        'text': vm.transcribed_text,
+        'audio_url': vm.audio_file.url if vm.audio_file else '',
+    }
+
+
+def delivery_payload(base, delivery_id, recipient_id, name, email, phone):
+    return {
+        **base,
+        'delivery_id': delivery_id,
+        'recipient': {'id': recipient_id, 'name': name, 'email': email, 'phone': phone},
+    }
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_transport(name=None):
+    """Process-wide transport instance (keeps its connection pool and bucket)."""
+    name = name or settings.DELIVERY_TRANSPORT
+    if name not in TRANSPORTS:
+        raise TransportError(f"Unknown transport {name!r}")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = TRANSPORTS[name]()
+        return _instances[name]
@@ -11,7 +11,10 @@ from .views import (
 
     # Voice messages and deliveries
     VoiceMessageView,
+    OlderVoiceMessagesView,
     DeliveriesForMessageView,
+    DeliveryReportExportView,
+    DeliverySummaryView,
     AckDeliveryView,
 
     # Scheduler
@@ -19,7 +22,10 @@ from .views import (
 
     # Inbox and public
     MessageListView,
+    OlderMessagesView,
     InboxView,
+    UnreadCountView,
+    MarkReadView,
 
     # Emergency
     EmergencyView,
@@ -29,7 +35,9 @@ from .views import (
 
     # Messaging actions
     send_message,
+    send_message_batch,
     send_reply,
+    RepliesView,
 )
 
 urlpatterns = [
@@ -47,7 +55,10 @@ urlpatterns = [
 
     # 🎙 Voice messages and deliveries
     path('voice/', VoiceMessageView.as_view(), name='voice_messages'),
+    path('voice/older/', OlderVoiceMessagesView.as_view(), name='voice_older'),
     path('voice/<int:message_id>/deliveries/', DeliveriesForMessageView.as_view(), name='deliveries_for_message'),
+    path('voice/<int:message_id>/summary/', DeliverySummaryView.as_view(), name='delivery_summary'),
+    path('voice/<int:message_id>/deliveries/export.<str:fmt>', DeliveryReportExportView.as_view(), name='delivery_report_export'),
     path('deliveries/<int:delivery_id>/ack/', AckDeliveryView.as_view(), name='ack_delivery'),
 
     # ⏱ Scheduler
@@ -56,6 +67,9 @@ urlpatterns = [
     # 📥 Inbox and public
     path('inbox-test/', InboxView.as_view(), name='inbox_test'),
     path('inbox/', MessageListView.as_view(), name='inbox'),
+    path('inbox/older/', OlderMessagesView.as_view(), name='inbox_older'),
+    path('unread-count/', UnreadCountView.as_view(), name='unread_count'),
+    path('read/', MarkReadView.as_view(), name='mark_read'),
 
     # 🚨 Emergency
     path('emergency/', EmergencyView.as_view(), name='emergency'),
@@ -65,5 +79,7 @@ urlpatterns = [
 
     # 💬 Messaging actions
     path('send/', send_message, name='send_message'),
+    path('send/batch/', send_message_batch, name='send_message_batch'),
     path('reply/', send_reply, name='send_reply'),
+    path('<int:message_id>/replies/', RepliesView.as_view(), name='message_replies'),
 ]
\ No newline at end of file
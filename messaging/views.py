@@ -8,40 +8,56 @@ from django.views.decorators.csrf import csrf_exempt
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.contrib.auth import get_user_model
-from django.db.models import Count
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
 from django.db.models.functions import TruncDate
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework.decorators import api_view, permission_classes, parser_classes
-
-from .models import Contact, Group, VoiceMessage, Delivery, MessageTemplate, Message, ReplyMessage
-from .serializers import (
-    ContactSerializer, GroupSerializer, VoiceMessageSerializer,
-    DeliverySerializer, MessageTemplateSerializer, MessageSerializer
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.decorators import api_view, permission_classes, parser_classes, throttle_classes
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+
+from relay_project.dbrouter import ReplicaReadMixin
+from relay_project.metrics import serializer_timer
+from relay_project.renderers import LIST_RENDERERS
+from relay_project import writequeue
+from relay_project.idempotency import idempotent
+from relay_project.throttling import SendThrottle, UploadThrottle
+
+from .models import (
+    Group, VoiceMessage, Delivery, MessageTemplate, Message, ReplyMessage, ALLOWED_GROUPS,
+    ArchivedMessage, ArchivedVoiceMessage, ArchivedReply,
+)
+from .serializers import VoiceMessageSerializer, DeliverySerializer, MessageSerializer, ReplySerializer
+from .services import (
+    transcribe_audio, create_deliveries_for_groups,
+    transition_delivery,
+    create_approved_message, create_approved_messages, add_reply,
 )
-from .services import transcribe_audio, create_deliveries_for_groups, attempt_send_deliveries, should_send_now
+from . import readstate, refcache, exports, emergency, inboxrows, templating
+from .audience import inbox_targets, contact_for_user
+from .images import schedule_image
+from .audio import schedule_audio
+from .scheduler import due_messages, send_due
 
 User = get_user_model()
 
-# Allowed groups consistent with app-wide roles
-ALLOWED_GROUPS = {'STAFF', 'HOD', 'VICE_PRINCIPAL', 'PRINCIPAL', 'ALL'}
-
 
 def has_role(user, allowed_roles):
     return getattr(user, 'role', None) in allowed_roles
 
 
-class AdminStatsView(APIView):
+class AdminStatsView(ReplicaReadMixin, APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
         today = timezone.now().date()
 
         total_users = User.objects.count()
-        total_messages = Message.objects.count()
+        total_messages = Message.objects.count() + ArchivedMessage.objects.count()
         messages_today = Message.objects.filter(created_at__date=today).count()
         active_users_today = User.objects.filter(last_login__date=today).count()
         messages_per_user = list(Message.objects.values("user__username").annotate(total=Count("id")))
@@ -93,7 +109,7 @@ def pending_messages(request):
 
             msg = Message.objects.get(id=msg_id)
             msg.status = 'approved' if action == 'approve' else 'rejected'
-            msg.save()
+            msg.save()  # signals.message_saved counts (or withdraws) it
             return JsonResponse({'success': True})
         except Message.DoesNotExist:
             return JsonResponse({'error': 'Message not found'}, status=404)
@@ -101,64 +117,161 @@ def pending_messages(request):
             return JsonResponse({'error': str(e)}, status=500)
 
 
-class ContactsView(APIView):
+# Reference data is served pre-rendered from refcache (in the negotiated
+# format). The stateless JWT authenticator validates the token without loading
+# the user row, so a warm cache answers these with no database queries at all.
+class ContactsView(ReplicaReadMixin, APIView):
+    authentication_classes = [JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated]
+    renderer_classes = LIST_RENDERERS
 
     def get(self, request):
-        qs = Contact.objects.filter(is_active=True).order_by('name')
-        return Response(ContactSerializer(qs, many=True).data)
+        return refcache.response('contacts', request.accepted_renderer.format)
 
 
-class GroupsView(APIView):
+class GroupsView(ReplicaReadMixin, APIView):
+    authentication_classes = [JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated]
+    renderer_classes = LIST_RENDERERS
 
     def get(self, request):
-        qs = Group.objects.all().order_by('name')
-        return Response(GroupSerializer(qs, many=True).data)
+        return refcache.response('groups', request.accepted_renderer.format)
 
 
-class TemplatesView(APIView):
+class TemplatesView(ReplicaReadMixin, APIView):
+    authentication_classes = [JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated]
+    renderer_classes = LIST_RENDERERS
 
     def get(self, request):
-        qs = MessageTemplate.objects.all().order_by('title')
-        return Response(MessageTemplateSerializer(qs, many=True).data)
+        return refcache.response('templates', request.accepted_renderer.format)
 
 
 class VoiceMessageView(APIView):
     parser_classes = [MultiPartParser, FormParser]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UploadThrottle]
 
     def get(self, request):
         qs = VoiceMessage.objects.order_by('-created_at')[:20]
-        return Response(VoiceMessageSerializer(qs, many=True).data)
+        with serializer_timer():
+            data = VoiceMessageSerializer(qs, many=True).data
+        return Response(data)
 
+    @idempotent
     def post(self, request):
         if not has_role(request.user, ['PRINCIPAL', 'VICE_PRINCIPAL']):
             return Response({'error': 'Permission denied'}, status=403)
-        if 'audio_file' not in request.FILES:
+        # A templated message is personalized per recipient; audio is optional then
+        template = None
+        if request.data.get('template_id'):
+            try:
+                template_id = int(request.data['template_id'])
+            except (TypeError, ValueError):
+                return Response({'error': 'Unknown template'}, status=400)
+            template = MessageTemplate.objects.filter(pk=template_id).first()
+            if template is None:
+                return Response({'error': 'Unknown template'}, status=400)
+            try:
+                # Compiled (and cached) now, rather than failing per recipient at dispatch
+                templating.get_compiled(template)
+            except templating.TemplateError as e:
+                return Response({'error': f'Invalid template: {e}'}, status=400)
+        if 'audio_file' not in request.FILES and template is None:
             return Response({'error': 'No audio file provided'}, status=400)
+        target_group = request.data.get('target_group', 'BOTH')
+        allowed_groups = [value for value, _ in VoiceMessage.TARGET_GROUP_CHOICES]
+        if target_group not in allowed_groups:
+            return Response({'error': 'Invalid target_group', 'allowed_groups': allowed_groups}, status=400)
 
-        audio_file = request.FILES['audio_file']
-        saved_audio = default_storage.save(f'audio/{audio_file.name}', ContentFile(audio_file.read()))
+        saved_audio = ''
+        if 'audio_file' in request.FILES:
+            audio_file = request.FILES['audio_file']
+            saved_audio = default_storage.save(f'audio/{audio_file.name}', ContentFile(audio_file.read()))
 
         vm = VoiceMessage.objects.create(
             sender_name=request.user.username,
             sender_role=request.data.get('sender_role', getattr(request.user, 'role', 'VICE_PRINCIPAL')),
-            target_group=request.data.get('target_group', 'BOTH'),
+            target_group=target_group,
             audio_file=saved_audio,
+            template=template,
             status='QUEUED'
         )
+        if saved_audio:
+            schedule_audio(VoiceMessage, [vm.id], saved_audio)
         return Response({'id': vm.id, 'status': vm.status}, status=201)
 
 
 class DeliveriesForMessageView(APIView):
+    """
+    Deliveries of one voice message. Optional ?status= filter; pass
+    ?page_size= (and ?after=<last id>) for keyset-paginated pages instead of
+    the full list.
+    """
     permission_classes = [IsAuthenticated]
+    renderer_classes = LIST_RENDERERS
+    max_page_size = 500
 
     def get(self, request, message_id):
         vm = get_object_or_404(VoiceMessage, pk=message_id)
-        d = vm.deliveries.select_related('recipient').all()
-        return Response(DeliverySerializer(d, many=True).data)
+        d = vm.deliveries.select_related('recipient').order_by('id')
+
+        status_filter = request.query_params.get('status')
+        if status_filter:
+            if status_filter not in VoiceMessage.COUNTER_FIELDS:
+                return Response({'error': 'Invalid status', 'allowed': sorted(VoiceMessage.COUNTER_FIELDS)}, status=400)
+            d = d.filter(status=status_filter)
+
+        page_size = request.query_params.get('page_size')
+        if page_size is None:
+            with serializer_timer():
+                data = DeliverySerializer(d, many=True).data
+            return Response(data)
+
+        try:
+            page_size = min(max(int(page_size), 1), self.max_page_size)
+            after = int(request.query_params.get('after', 0))
+        except ValueError:
+            return Response({'error': 'page_size and after must be integers'}, status=400)
+        rows = list(d.filter(id__gt=after)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        with serializer_timer():
+            data = DeliverySerializer(rows, many=True).data
+        return Response({
+            'results': data,
+            'next_after': rows[-1].id if has_more else None,
+        })
+
+
+class DeliverySummaryView(APIView):
+    """Delivery progress from the materialized counters: a single-row read."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, message_id):
+        counter_fields = list(VoiceMessage.COUNTER_FIELDS.values())
+        row = VoiceMessage.objects.filter(pk=message_id).values('id', 'status', *counter_fields).first()
+        if row is None:
+            return Response({'error': 'Message not found'}, status=404)
+        counts = {name.lower(): row[field] for name, field in VoiceMessage.COUNTER_FIELDS.items()}
+        return Response({
+            'id': row['id'],
+            'status': row['status'],
+            'total': sum(counts.values()),
+            **counts,
+        })
+
+
+class DeliveryReportExportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, message_id, fmt):
+        if not (request.user.is_staff or has_role(request.user, ['PRINCIPAL', 'VICE_PRINCIPAL'])):
+            return Response({'error': 'Permission denied'}, status=403)
+        if fmt not in exports.FORMATS:
+            return Response({'error': 'Unsupported format', 'formats': sorted(exports.FORMATS)}, status=400)
+        vm = get_object_or_404(VoiceMessage, pk=message_id)
+        return exports.delivery_report_response(vm, fmt)
 
 
 class AckDeliveryView(APIView):
@@ -166,9 +279,7 @@ class AckDeliveryView(APIView):
 
     def post(self, request, delivery_id):
         d = get_object_or_404(Delivery, pk=delivery_id)
-        d.status = 'READ'
-        d.read_at = timezone.now()
-        d.save()
+        writequeue.run(transition_delivery, d, 'READ', read_at=timezone.now())
         return Response({"status": "ok", "message": "Acknowledged"})
 
 
@@ -176,18 +287,16 @@ class RunSchedulerNowView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        due = VoiceMessage.objects.filter(status='QUEUED')
-        sent = 0
-        for vm in due:
-            if should_send_now(vm):
-                attempt_send_deliveries(vm)
-                sent += 1
+        # Indexed on (status, scheduled_for); send_due skips what a scheduler already claimed
+        due = list(due_messages().order_by('id').values_list('id', flat=True))
+        sent = sum(send_due(vm_id) for vm_id in due)
         return Response({"processed": sent})
 
 
 # ---------------- Inbox (primary) ----------------
-class MessageListView(APIView):
+class MessageListView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = LIST_RENDERERS
 
     def get(self, request):
         # Prefer query param role; fallback to user's role; include ALL
@@ -195,19 +304,109 @@ class MessageListView(APIView):
         if role not in ALLOWED_GROUPS:
             role = 'STAFF'
 
+        try:
+            fields = inboxrows.requested_fields(request)
+        except ValueError as e:
+            return Response({'error': str(e), 'allowed': list(inboxrows.FIELDS)}, status=400)
+
         qs = Message.objects.filter(
             status='approved',
-            target_role__in=[role, 'ALL']
+            target_role__in=inbox_targets(role)
         ).order_by('-created_at')
 
-        serializer = MessageSerializer(qs, many=True, context={'request': request})
-        # Return keys: id, text, audio_url, image_url, from_field, target_role, created_at
-        return Response(serializer.data)
+        # Same keys as MessageSerializer (id, text, audio_url, image_url, image, from_field, ...), or ?fields=
+        with serializer_timer():
+            data = inboxrows.serialize(qs, request, fields)
+        return Response(data)
+
+
+# ---------------- Archive ("older" cursor) ----------------
+class OlderPageMixin:
+    """
+    Keyset pages over an archive table, newest first: ?before=<smallest id
+    seen> and ?limit=. Returns {'results', 'next_before'}.
+    """
+    default_limit = 50
+    max_limit = 200
+
+    def older_page(self, request, qs, serializer_class, context=None):
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+            before = request.query_params.get('before')
+            if before is not None:
+                qs = qs.filter(id__lt=int(before))
+        except ValueError:
+            return Response({'error': 'limit and before must be integers'}, status=400)
+        rows = list(qs.order_by('-id')[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        with serializer_timer():
+            data = serializer_class(rows, many=True, context=context or {}).data
+        return Response({
+            'results': data,
+            'next_before': rows[-1].id if has_more else None,
+        })
+
+
+class OlderMessagesView(ReplicaReadMixin, OlderPageMixin, APIView):
+    """Archived inbox messages, read after the hot inbox is exhausted."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        role = request.query_params.get('role') or getattr(request.user, 'role', 'STAFF')
+        if role not in ALLOWED_GROUPS:
+            role = 'STAFF'
+        qs = ArchivedMessage.objects.filter(
+            status='approved',
+            target_role__in=inbox_targets(role)
+        ).select_related('user')
+        return self.older_page(request, qs, MessageSerializer, {'request': request})
+
+
+class OlderVoiceMessagesView(OlderPageMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return self.older_page(request, ArchivedVoiceMessage.objects.all(), VoiceMessageSerializer)
+
+
+# ---------------- Read state ----------------
+class UnreadCountView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({"unread": readstate.unread_count(request.user)})
+
+
+class MarkReadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        message_ids = request.data.get('message_ids') or []
+        up_to = request.data.get('up_to')
+        if not message_ids and up_to is None:
+            return Response({'error': 'message_ids or up_to is required'}, status=400)
+        def mark():
+            if up_to is not None:
+                readstate.mark_read_up_to(request.user, up_to)
+            if message_ids:
+                readstate.mark_read(request.user, message_ids)
+
+        try:
+            writequeue.run(mark)
+        except (TypeError, ValueError):
+            return Response({'error': 'Message ids must be integers'}, status=400)
+        return Response({"unread": readstate.unread_count(request.user)})
 
 
 # ---------------- Emergency (public) ----------------
 class EmergencyView(APIView):
-    permission_classes = [AllowAny]
+    """GET is a public health check; POST broadcasts to everyone (see messaging/emergency.py)."""
+
+    def get_permissions(self):
+        if self.request.method == 'POST':
+            return [IsAuthenticated()]
+        return [AllowAny()]
 
     def get(self, request):
         return Response({
@@ -215,11 +414,23 @@ class EmergencyView(APIView):
             "message": "Emergency endpoint active."
         })
 
+    @idempotent
+    def post(self, request):
+        if not has_role(request.user, ['PRINCIPAL', 'VICE_PRINCIPAL']):
+            return Response({'error': 'Permission denied'}, status=403)
+        text = (request.data.get('text') or '').strip()
+        if not text:
+            return Response({'error': 'Text is required'}, status=400)
+        vm, inbox, recipients = emergency.broadcast(text, request.user)
+        return Response({'id': vm.id, 'message_id': inbox.id, 'recipients': recipients}, status=202)
+
 
 class AudioUploadView(APIView):
     parser_classes = [MultiPartParser]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UploadThrottle]
 
+    @idempotent
     def post(self, request):
         if not has_role(request.user, ['PRINCIPAL', 'VICE_PRINCIPAL']):
             return Response({'error': 'Permission denied'}, status=403)
@@ -234,13 +445,14 @@ class AudioUploadView(APIView):
         if target_group not in ALLOWED_GROUPS:
             return Response({'error': 'Invalid target_group', 'allowed_groups': sorted(ALLOWED_GROUPS)}, status=400)
 
-        msg = Message.objects.create(
+        msg = writequeue.run(
+            create_approved_message,
             text="Recorded message",
             audio_url=file_url,
             user=request.user,
-            status='approved',
             target_role=target_group
         )
+        schedule_audio(Message, [msg.id], file_path)
 
         return Response({
             'message': 'Audio uploaded and message created',
@@ -252,6 +464,8 @@ class AudioUploadView(APIView):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 @parser_classes([MultiPartParser, FormParser])
+@throttle_classes([SendThrottle])
+@idempotent
 def send_message(request):
     if not has_role(request.user, ['PRINCIPAL', 'VICE_PRINCIPAL']):
         return Response({'error': 'Permission denied'}, status=403)
@@ -278,14 +492,18 @@ def send_message(request):
         saved_image = default_storage.save(f'images/{image_file.name}', ContentFile(image_file.read()))
         image_url = default_storage.url(saved_image)
 
-    msg = Message.objects.create(
+    msg = writequeue.run(
+        create_approved_message,
         text=text if text else "Media message",
         audio_url=audio_url,
         image_url=image_url,
         user=request.user,
-        status='approved',
         target_role=target_group
     )
+    if audio_file:
+        schedule_audio(Message, [msg.id], saved_audio)
+    if image_file:
+        schedule_image([msg.id], saved_image)
 
     return Response({
         'success': True,
@@ -298,8 +516,141 @@ def send_message(request):
     }, status=201)
 
 
+def _batch_items(request):
+    """
+    Items of a batch send. Either an explicit `items` list (JSON, or a JSON
+    string in multipart), each {message_text, target_group | target_groups,
+    audio, image} where audio/image name an uploaded file field, or the
+    shorthand message_text + target_groups + audio/image files, sent to
+    every listed audience.
+    """
+    items = request.data.get('items')
+    if isinstance(items, str):
+        items = json.loads(items)
+    if items is not None:
+        return items
+    groups = request.data.getlist('target_groups') if hasattr(request.data, 'getlist') else request.data.get('target_groups')
+    if isinstance(groups, str):
+        groups = [groups]
+    if len(groups or []) == 1 and ',' in groups[0]:
+        groups = groups[0].split(',')
+    return [{
+        'message_text': request.data.get('message_text'),
+        'target_groups': groups or [],
+        'audio': 'audio' if 'audio' in request.FILES else None,
+        'image': 'image' if 'image' in request.FILES else None,
+    }]
+
+
+def _validate_batch_item(item, files):
+    """Returns (target groups, error)."""
+    if not isinstance(item, dict):
+        return None, 'Item must be an object'
+    for name in ('message_text', 'target_group', 'audio', 'image'):
+        if item.get(name) is not None and not isinstance(item[name], str):
+            return None, f'{name} must be a string'
+    groups = item.get('target_groups')
+    if groups is None:
+        groups = [item['target_group']] if item.get('target_group') else []
+    elif not isinstance(groups, list) or not all(isinstance(g, str) for g in groups):
+        return None, 'target_groups must be a list of strings'
+    groups = [g.strip() for g in groups]
+    if not groups or any(g not in ALLOWED_GROUPS for g in groups):
+        return None, 'Invalid or missing target_group'
+    for kind in ('audio', 'image'):
+        if item.get(kind) and item[kind] not in files:
+            return None, f'No uploaded file named {item[kind]!r} for {kind}'
+    if not (item.get('message_text') or '').strip() and not item.get('audio') and not item.get('image'):
+        return None, 'Message text, audio, or image is required'
+    return groups, None
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser, FormParser, JSONParser])
+@throttle_classes([SendThrottle])
+@idempotent
+def send_message_batch(request):
+    """
+    Send several messages, or one message to several audiences, in one
+    request. Each uploaded file is stored once and shared by every row that
+    references it; all rows are inserted in one transaction. Returns one
+    result per item: 201 when all succeed, 207 when some items were invalid.
+    """
+    if not has_role(request.user, ['PRINCIPAL', 'VICE_PRINCIPAL']):
+        return Response({'error': 'Permission denied'}, status=403)
+    try:
+        items = _batch_items(request)
+    except ValueError:
+        return Response({'error': 'items must be a JSON list'}, status=400)
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'items must be a non-empty list'}, status=400)
+
+    results, valid = [], []
+    for index, item in enumerate(items):
+        groups, error = _validate_batch_item(item, request.FILES)
+        if error:
+            results.append({'index': index, 'error': error})
+        else:
+            results.append({'index': index, 'message_ids': []})
+            valid.append((index, item, groups))
+    total = sum(len(groups) for _, _, groups in valid)
+    if total > settings.BATCH_SEND_MAX_MESSAGES:
+        return Response({'error': f'A batch may create at most {settings.BATCH_SEND_MAX_MESSAGES} messages'}, status=400)
+    if not valid:
+        return Response({'created': 0, 'results': results}, status=400)
+
+    # Store each referenced upload once
+    stored = {}
+    for _, item, _ in valid:
+        for kind, folder in (('audio', 'audio'), ('image', 'images')):
+            field = item.get(kind)
+            if field and (kind, field) not in stored:
+                upload = request.FILES[field]
+                name = default_storage.save(f'{folder}/{upload.name}', ContentFile(upload.read()))
+                stored[(kind, field)] = (name, default_storage.url(name))
+
+    rows, owners = [], []
+    for index, item, groups in valid:
+        audio = stored.get(('audio', item.get('audio')))
+        image = stored.get(('image', item.get('image')))
+        text = (item.get('message_text') or '').strip() or "Media message"
+        for group in groups:
+            rows.append(Message(
+                text=text,
+                audio_url=audio[1] if audio else None,
+                image_url=image[1] if image else None,
+                user=request.user,
+                status='approved',
+                target_role=group,
+            ))
+            owners.append((index, item))
+
+    with transaction.atomic():
+        created = create_approved_messages(rows)
+        sharing = {}
+        for msg, (index, item) in zip(created, owners):
+            results[index]['message_ids'].append(msg.id)
+            for kind in ('audio', 'image'):
+                if item.get(kind):
+                    sharing.setdefault((kind, item[kind]), []).append(msg.id)
+        for (kind, field), ids in sharing.items():
+            name = stored[(kind, field)][0]
+            if kind == 'audio':
+                schedule_audio(Message, ids, name)
+            else:
+                schedule_image(ids, name)
+
+    return Response({
+        'created': len(created),
+        'media': {field: url for (_, field), (_, url) in stored.items()},
+        'results': results,
+    }, status=201 if len(valid) == len(items) else 207)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
 def send_reply(request):
     if not has_role(request.user, ['HOD', 'STAFF']):
         return Response({'error': 'Permission denied'}, status=403)
@@ -311,17 +662,66 @@ def send_reply(request):
         return Response({'error': 'Reply text is required'}, status=400)
 
     try:
-        original = Message.objects.get(id=message_id)
-    except Message.DoesNotExist:
+        original = visible_message(Message, request.user, int(message_id))
+    except (TypeError, ValueError):
+        original = None
+    if original is None:
         return Response({'error': 'Message not found'}, status=404)
 
-    ReplyMessage.objects.create(
-        original_message=original,
-        sender=Contact.objects.filter(user=request.user).first(),
-        reply_text=reply_text
-    )
+    # From the audience index's user -> contact map, not a query per reply
+    sender_id = contact_for_user(request.user.pk)
+    if sender_id is None:
+        return Response({'error': 'No contact profile for this user'}, status=400)
+
+    reply = writequeue.run(add_reply, original, sender_id, reply_text)
+    return Response({'success': True, 'id': reply.id})
+
+
+def visible_message(model, user, message_id):
+    """The Message (or ArchivedMessage) if the user may read it: their own, or approved for their inbox."""
+    qs = model.objects.filter(pk=message_id)
+    if not (user.is_staff or has_role(user, ['PRINCIPAL', 'VICE_PRINCIPAL'])):
+        role = getattr(user, 'role', None) or 'STAFF'
+        qs = qs.filter(Q(user=user) | Q(status='approved', target_role__in=inbox_targets(role)))
+    return qs.first()
 
-    return Response({'success': True})
+
+class RepliesView(ReplicaReadMixin, APIView):
+    """
+    Replies to one inbox message, oldest first, in keyset pages: ?page_size=
+    and ?after=<last id>. Replies of archived messages come from the archive.
+    """
+    permission_classes = [IsAuthenticated]
+    default_page_size = 50
+    max_page_size = 200
+
+    def get(self, request, message_id):
+        message, replies = visible_message(Message, request.user, message_id), ReplyMessage.objects
+        if message is None:
+            message, replies = visible_message(ArchivedMessage, request.user, message_id), ArchivedReply.objects
+        if message is None:
+            return Response({'error': 'Message not found'}, status=404)
+
+        try:
+            page_size = min(max(int(request.query_params.get('page_size', self.default_page_size)), 1),
+                            self.max_page_size)
+            after = int(request.query_params.get('after', 0))
+        except ValueError:
+            return Response({'error': 'page_size and after must be integers'}, status=400)
+        rows = list(
+            replies.filter(original_message_id=message.pk, id__gt=after)
+            .select_related('sender').order_by('id')[:page_size + 1]
+        )
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        with serializer_timer():
+            data = ReplySerializer(rows, many=True).data
+        return Response({
+            'reply_count': message.reply_count,
+            'last_reply_at': message.last_reply_at,
+            'results': data,
+            'next_after': rows[-1].id if has_more else None,
+        })
 
 
 # ---------------- Inbox test (kept for quick debugging) ----------------
@@ -329,10 +729,16 @@ class InboxView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
+        try:
+            fields = inboxrows.requested_fields(request)
+        except ValueError as e:
+            return Response({'error': str(e), 'allowed': list(inboxrows.FIELDS)}, status=400)
+
         qs = Message.objects.filter(
-            target_role__in=['STAFF', 'ALL'],
+            target_role__in=inbox_targets('STAFF'),
             status='approved'
         ).order_by('-created_at')[:10]
 
-        serializer = MessageSerializer(qs, many=True, context={'request': request})
-        return Response(serializer.data)
+        with serializer_timer():
+            data = inboxrows.serialize(qs, request, fields)
+        return Response(data)
@@ -0,0 +1,105 @@
+"""
+Response compression negotiated from Accept-Encoding.
+
+Brotli (when the brotli package is installed) is preferred over gzip when
+the client accepts both with the same weight. Only responses of at least
+COMPRESSION_MIN_BYTES with a compressible content type (JSON, MessagePack,
+text, CSV, XML, JavaScript) are compressed; streaming responses (static
+files served by WhiteNoise, which ships its own pre-compressed copies) and
+responses that already carry a Content-Encoding pass through unchanged.
+
+Input and output sizes per encoding are counted in
+relay_compression_input_bytes_total / relay_compression_output_bytes_total.
+"""
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .metrics import registry
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/msgpack', 'application/javascript',
+    'application/xml', 'text/',
+)
+
+
+def accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header; codings with q=0 are left out."""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get('*', 0.0)
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    # Highest q wins; on a tie the order above (br first) decides
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(content, coding):
+    if coding == 'br':
+        return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES) and content_type != 'text/csv':
+            return response
+
+        # The representation depends on Accept-Encoding even when we don't compress
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+        coding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+
+        compressed = compress(response.content, coding)
+        if len(compressed) >= len(response.content):
+            return response
+        labels = (('encoding', coding),)
+        registry.inc('relay_compression_input_bytes_total', labels, len(response.content))
+        registry.inc('relay_compression_output_bytes_total', labels, len(compressed))
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = coding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # The bytes differ from the uncompressed representation
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,114 @@
+"""
+Read-replica routing.
+
+Replicas are configured with DATABASE_REPLICA_URLS (comma-separated
+DATABASE_URL-style URLs) and become the aliases replica1, replica2, ...
+Reads go to a replica only when a view opts in with `read_replica = True`
+and the request is a safe method (GET/HEAD/OPTIONS); everything else uses
+`default`.
+
+Read-your-writes:
+  - once a request writes, the rest of that request reads from `default`;
+  - a user who wrote is pinned to `default` for REPLICA_PIN_SECONDS, so their
+    next requests don't see replica lag either.
+
+Code that fills shared caches should wrap its reads in `use_primary()`, so a
+lagging replica can't be cached under a fresh version.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+_state = ContextVar('db_routing', default=None)
+
+
+class _RoutingState:
+    def __init__(self):
+        self.replica = None  # alias chosen for this request, if any
+        self.wrote = False
+        self.primary_depth = 0
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+def _pin_key(user_id):
+    return f'dbrouter:pin:{user_id}'
+
+
+def is_pinned(user):
+    return bool(user and user.is_authenticated and cache.get(_pin_key(user.pk)))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.wrote or state.primary_depth:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+
+class ReplicaReadMixin:
+    """
+    For APIViews: after authentication, route this request's reads to a
+    replica (safe methods only, unless the user is pinned to the primary).
+    """
+    read_replica = True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = _state.get()
+        aliases = replica_aliases()
+        if (state is not None and aliases and self.read_replica
+                and request.method in SAFE_METHODS and not is_pinned(request.user)):
+            state.replica = random.choice(aliases)
+
+
+class ReplicaRoutingMiddleware:
+    """Per-request routing state; pins users who wrote to the primary."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = _RoutingState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and replica_aliases():
+            # DRF sets request.user on the underlying request after authenticating
+            user = request.__dict__.get('user')
+            if user is not None and user.is_authenticated:
+                cache.set(_pin_key(user.pk), 1, settings.REPLICA_PIN_SECONDS)
+        return response
+
+
+@contextmanager
+def use_primary():
+    """Force reads inside the block to go to `default`."""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    state.primary_depth += 1
+    try:
+        yield
+    finally:
+        state.primary_depth -= 1
@@ -0,0 +1,164 @@
+"""
+Idempotency-Key support for non-idempotent POST endpoints.
+
+A client that retries a request sends the same `Idempotency-Key` header.
+The first request with a key runs the view; its rendered response (status,
+content type and body bytes) is stored for IDEMPOTENCY_TTL_SECONDS and
+replayed verbatim (with an `Idempotent-Replayed: true` header) to every
+later request with that key, so a retry creates no new
+rows, uploads or broadcasts. A duplicate that arrives while the first is
+still running waits up to IDEMPOTENCY_WAIT_SECONDS for its result, then
+gets 409.
+
+Keys are claimed by inserting an IdempotencyKey row in its own transaction.
+The unique constraint makes the claim atomic across workers whatever the
+cache backend (FileBasedCache's add() is a non-atomic check-then-set). A
+claim that is still in flight after IDEMPOTENCY_LOCK_SECONDS (a crashed
+worker) is taken over; purge_expired() removes old rows.
+
+Keys are scoped per user and path. Reusing a key with a different payload
+is rejected with 422. Server errors (5xx) and exceptions are not stored,
+so the client can retry them.
+"""
+import functools
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from messaging.models import IdempotencyKey
+
+from .dbrouter import use_primary
+from .metrics import registry
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+
+def _row_key(request, key):
+    user = request.user
+    owner = user.pk if user.is_authenticated else request.META.get('REMOTE_ADDR')
+    return hashlib.sha256(f'{owner}:{request.path}:{key}'.encode()).hexdigest()
+
+
+def _load(row_key):
+    with use_primary():
+        return IdempotencyKey.objects.filter(key=row_key).first()
+
+
+def _claim(row_key, fp):
+    """Insert the in-flight row; returns it, or None when another request holds the key."""
+    expires_at = timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(key=row_key, fingerprint=fp, expires_at=expires_at)
+    except IntegrityError:
+        return None
+
+
+def _release(row):
+    # Conditional on expires_at, so a stale reader can't drop a newer claim
+    IdempotencyKey.objects.filter(pk=row.pk, expires_at=row.expires_at).delete()
+
+
+def purge_expired():
+    """Delete expired keys; returns how many."""
+    return IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+def fingerprint(request):
+    """Hash of the submitted fields; uploads count by name and size."""
+    h = hashlib.sha256()
+    data = request.data
+    items = data.lists() if hasattr(data, 'lists') else ((k, [v]) for k, v in data.items())
+    for name, values in sorted(items, key=lambda kv: kv[0]):
+        if name in request.FILES:
+            continue
+        h.update(f'{name}={values!r};'.encode())
+    for name, files in sorted(request.FILES.lists()):
+        h.update(f'{name}:' + ','.join(f'{f.name}/{f.size}' for f in files).encode() + b';')
+    return h.hexdigest()
+
+
+def _replay(stored):
+    response = HttpResponse(bytes(stored.body), status=stored.status_code, content_type=stored.content_type)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _store(claim, response):
+    """Mark the claim done with the rendered response."""
+    IdempotencyKey.objects.filter(pk=claim.pk, expires_at=claim.expires_at).update(
+        state='done',
+        status_code=response.status_code,
+        content_type=response.get('Content-Type', ''),
+        body=response.content,
+        expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+    )
+
+
+def _mismatch():
+    return Response({'error': f'{HEADER} was already used with a different request'}, status=422)
+
+
+def idempotent(view):
+    """
+    Decorate a DRF handler (an @api_view function or an APIView method) to
+    honour the Idempotency-Key header.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(a for a in args if isinstance(a, Request))
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}, status=400)
+
+        row_key = _row_key(request, key)
+        fp = fingerprint(request)
+        labels = (('view', view.__qualname__),)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            stored = _load(row_key)
+            if stored is not None and stored.expires_at <= timezone.now():
+                _release(stored)  # expired result, or the owner died mid-request
+                stored = None
+            if stored is None:
+                claim = _claim(row_key, fp)
+                if claim is not None:
+                    break  # this request owns the key
+            elif stored.fingerprint != fp:
+                return _mismatch()
+            elif stored.state == 'done':
+                registry.inc('relay_idempotent_replays_total', labels)
+                return _replay(stored)
+            if time.monotonic() >= deadline:
+                response = Response({'error': f'A request with this {HEADER} is still in progress'}, status=409)
+                response['Retry-After'] = '1'
+                return response
+            time.sleep(POLL_INTERVAL)
+
+        try:
+            response = view(*args, **kwargs)
+        except Exception:
+            _release(claim)
+            raise
+        if response.status_code >= 500:
+            _release(claim)
+        elif getattr(response, 'is_rendered', True):
+            _store(claim, response)
+        else:
+            # DRF renders after the view returns; store the bytes it produces. If
+            # rendering fails the claim lapses after IDEMPOTENCY_LOCK_SECONDS.
+            response.add_post_render_callback(lambda rendered: _store(claim, rendered))
+        return response
+
+    return wrapper
@@ -0,0 +1,294 @@
+"""
+Request-level performance metrics exposed in Prometheus text format.
+
+MetricsMiddleware records, per resolved route: request count by status,
+a latency histogram, DB query count/time (via connection.execute_wrapper),
+response bytes (as sent, after compression) and time spent in serializers
+and renderers (see serializer_timer and render_timer).
+
+Every gunicorn worker aggregates in its own memory and periodically writes a
+snapshot to METRICS_DIR/<pid>.json; the /metrics view merges all snapshots,
+so a scrape reports the whole server no matter which worker answers it.
+When a process has exited (a recycled worker, a restarted scheduler), the
+next scrape folds its snapshot into METRICS_DIR/dead.json and removes it,
+as prometheus_client's multiprocess mode does, so counters stay monotonic
+without one file per PID piling up. Liveness is checked by PID, so
+METRICS_DIR must not be shared between hosts.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.permissions import BasePermission, IsAdminUser
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; snapshots of dead processes are then kept as they are
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DEAD_SNAPSHOT = 'dead.json'
+
+_local = threading.local()
+
+
+class Registry:
+    """Counters and histograms for one process, keyed by (metric, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(float)
+        # (metric, labels) -> [bucket counts..., +Inf count, sum]
+        self.histograms = {}
+        self._last_flush = 0.0
+
+    def inc(self, name, labels, value=1.0):
+        with self._lock:
+            self.counters[(name, labels)] += value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            h = self.histograms.get((name, labels))
+            if h is None:
+                h = self.histograms[(name, labels)] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    h[i] += 1
+            h[len(LATENCY_BUCKETS)] += 1
+            h[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[n, list(l), v] for (n, l), v in self.counters.items()],
+                'histograms': [[n, list(l), list(h)] for (n, l), h in self.histograms.items()],
+            }
+
+    def maybe_flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp, path)
+
+
+registry = Registry()
+
+
+def _current():
+    return getattr(_local, 'stats', None)
+
+
+@contextmanager
+def serializer_timer():
+    """Count the enclosed block as serializer time for the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current()
+        if stats is not None:
+            stats['serializer'] += time.perf_counter() - start
+
+
+@contextmanager
+def render_timer():
+    """Count the enclosed block as renderer time for the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current()
+        if stats is not None:
+            stats['render'] += time.perf_counter() - start
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    stats = _current()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if stats is not None:
+            stats['queries'] += 1
+            stats['query_time'] += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = {'queries': 0, 'query_time': 0.0, 'serializer': 0.0, 'render': 0.0}
+        _local.stats = stats
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(_query_wrapper))
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        route = (match.route or match.view_name) if match else 'unmatched'
+        labels = (('route', route),)
+        size = 0 if response.streaming else len(response.content)
+
+        registry.inc('relay_http_requests_total',
+                     labels + (('method', request.method), ('status', str(response.status_code))))
+        registry.observe('relay_http_request_duration_seconds', labels, elapsed)
+        registry.inc('relay_db_queries_total', labels, stats['queries'])
+        registry.inc('relay_db_query_seconds_total', labels, stats['query_time'])
+        registry.inc('relay_http_response_bytes_total', labels, size)
+        registry.inc('relay_serializer_seconds_total', labels, stats['serializer'])
+        registry.inc('relay_render_seconds_total', labels, stats['render'])
+        registry.maybe_flush()
+        return response
+
+
+def _load(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None  # worker is mid-write or the file vanished
+
+
+def _fold(counters, histograms, snap):
+    for metric, labels, value in snap['counters']:
+        counters[(metric, tuple(map(tuple, labels)))] += value
+    for metric, labels, h in snap['histograms']:
+        key = (metric, tuple(map(tuple, labels)))
+        if key in histograms:
+            histograms[key] = [a + b for a, b in zip(histograms[key], h)]
+        else:
+            histograms[key] = h
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    return True
+
+
+def _collect_dead():
+    """Fold the snapshots of exited processes into DEAD_SNAPSHOT. Caller holds the merge lock."""
+    dead = []
+    for name in os.listdir(settings.METRICS_DIR):
+        stem = name.partition('.')[0]
+        if stem.isdigit() and int(stem) != os.getpid() and not _pid_alive(int(stem)):
+            dead.append(name)
+    if not dead:
+        return
+    dead_path = os.path.join(settings.METRICS_DIR, DEAD_SNAPSHOT)
+    counters, histograms = defaultdict(float), {}
+    for path in [dead_path] + [os.path.join(settings.METRICS_DIR, n) for n in dead if n.endswith('.json')]:
+        snap = _load(path)
+        if snap is not None:
+            _fold(counters, histograms, snap)
+    tmp = f'{dead_path}.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump({
+            'counters': [[n, list(l), v] for (n, l), v in counters.items()],
+            'histograms': [[n, list(l), h] for (n, l), h in histograms.items()],
+        }, fh)
+    os.replace(tmp, dead_path)
+    for name in dead:  # <pid>.json and any <pid>.json.tmp left by a crash
+        try:
+            os.remove(os.path.join(settings.METRICS_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def _merged_snapshots():
+    registry.maybe_flush(force=True)
+    with ExitStack() as stack:
+        if fcntl is not None:
+            # One scrape at a time may fold dead snapshots, and none reads while it does
+            lock = stack.enter_context(open(os.path.join(settings.METRICS_DIR, 'merge.lock'), 'a'))
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            _collect_dead()
+        counters = defaultdict(float)
+        histograms = {}
+        for name in os.listdir(settings.METRICS_DIR):
+            if not name.endswith('.json'):
+                continue
+            snap = _load(os.path.join(settings.METRICS_DIR, name))
+            if snap is not None:
+                _fold(counters, histograms, snap)
+    return counters, histograms
+
+
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + body + '}'
+
+
+def render_prometheus():
+    counters, histograms = _merged_snapshots()
+    lines = []
+    seen = set()
+    for (metric, labels), value in sorted(counters.items()):
+        if metric not in seen:
+            lines.append(f'# TYPE {metric} counter')
+            seen.add(metric)
+        lines.append(f'{metric}{_fmt_labels(labels)} {value:g}')
+    for (metric, labels), h in sorted(histograms.items()):
+        if metric not in seen:
+            lines.append(f'# TYPE {metric} histogram')
+            seen.add(metric)
+        for bound, count in zip(LATENCY_BUCKETS, h):
+            lines.append(f'{metric}_bucket{_fmt_labels(labels, [("le", bound)])} {count}')
+        lines.append(f'{metric}_bucket{_fmt_labels(labels, [("le", "+Inf")])} {h[len(LATENCY_BUCKETS)]}')
+        lines.append(f'{metric}_count{_fmt_labels(labels)} {h[len(LATENCY_BUCKETS)]}')
+        lines.append(f'{metric}_sum{_fmt_labels(labels)} {h[-1]:g}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """Accept scrapers presenting `Authorization: Bearer <METRICS_TOKEN>`."""
+
+    def authenticate(self, request):
+        token = settings.METRICS_TOKEN
+        if token and request.META.get('HTTP_AUTHORIZATION') == f'Bearer {token}':
+            return AnonymousUser(), 'metrics-token'
+        return None
+
+
+class IsMetricsScraper(BasePermission):
+    def has_permission(self, request, view):
+        return request.auth == 'metrics-token'
+
+
+class MetricsView(APIView):
+    # Admin users can read metrics with their normal JWT as well
+    authentication_classes = [MetricsTokenAuthentication, JWTAuthentication]
+    permission_classes = [IsMetricsScraper | IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4')
@@ -0,0 +1,164 @@
+"""
+Query auditing: spot N+1 patterns and slow queries.
+
+QueryAudit records every statement executed while it is active, groups them
+by SQL "shape" (literals and parameter lists collapsed) and flags shapes that
+repeat at least QUERY_AUDIT_REPEAT_THRESHOLD times or queries slower than
+QUERY_AUDIT_SLOW_MS, capturing EXPLAIN output for the slow ones.
+
+Use it as middleware in staging (QUERY_AUDIT_ENABLED=True logs a report for
+every offending request) or as an assertion helper in tests:
+
+    with assert_max_queries(3):
+        client.get('/api/messages/inbox/')
+"""
+import logging
+import re
+import time
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?|\$\d+)\s*,?)+\)', re.IGNORECASE)
+_PLACEHOLDER = re.compile(r'%s|\$\d+')
+_SPACE = re.compile(r'\s+')
+
+
+def sql_shape(sql):
+    """Normalise a statement so repeats with different values compare equal."""
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    shape = _PLACEHOLDER.sub('?', shape)
+    shape = _IN_LIST.sub('IN (...)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+class QueryRecord:
+    __slots__ = ('alias', 'sql', 'params', 'duration', 'explain')
+
+    def __init__(self, alias, sql, params, duration):
+        self.alias = alias
+        self.sql = sql
+        self.params = params
+        self.duration = duration
+        self.explain = None
+
+
+class QueryAudit:
+    def __init__(self, repeat_threshold=None, slow_ms=None, explain=True):
+        self.repeat_threshold = repeat_threshold or settings.QUERY_AUDIT_REPEAT_THRESHOLD
+        self.slow_ms = settings.QUERY_AUDIT_SLOW_MS if slow_ms is None else slow_ms
+        self.explain = explain
+        self.queries = []
+        self._stack = None
+
+    # ---- collection ----
+    def _wrapper(self, alias):
+        def wrapper(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append(QueryRecord(alias, sql, params, time.perf_counter() - start))
+        return wrapper
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self._wrapper(alias)))
+        return self
+
+    def __exit__(self, *exc):
+        self._stack.close()
+        if self.explain:
+            for q in self.slow_queries():
+                q.explain = explain_query(q)
+        return False
+
+    # ---- analysis ----
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def shapes(self):
+        """shape -> list of QueryRecord, in first-seen order."""
+        grouped = OrderedDict()
+        for q in self.queries:
+            grouped.setdefault(sql_shape(q.sql), []).append(q)
+        return grouped
+
+    def repeated(self):
+        """Shapes executed often enough to look like an N+1 loop."""
+        return {
+            shape: qs for shape, qs in self.shapes().items()
+            if len(qs) >= self.repeat_threshold
+        }
+
+    def slow_queries(self):
+        return [q for q in self.queries if q.duration * 1000 >= self.slow_ms]
+
+    @property
+    def has_problems(self):
+        return bool(self.repeated() or self.slow_queries())
+
+    def report(self):
+        total_ms = sum(q.duration for q in self.queries) * 1000
+        lines = [f"{self.count} queries in {total_ms:.1f} ms"]
+        for shape, qs in self.repeated().items():
+            lines.append(f"  N+1? {len(qs)}x {shape}")
+        for q in self.slow_queries():
+            lines.append(f"  SLOW {q.duration * 1000:.1f} ms [{q.alias}] {q.sql}")
+            if q.explain:
+                lines.extend(f"      {row}" for row in q.explain)
+        return '\n'.join(lines)
+
+
+def explain_query(record):
+    """EXPLAIN a recorded SELECT on its own connection; None if not applicable."""
+    if not record.sql.lstrip().upper().startswith('SELECT'):
+        return None
+    conn = connections[record.alias]
+    prefix = 'EXPLAIN QUERY PLAN' if conn.vendor == 'sqlite' else 'EXPLAIN'
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f'{prefix} {record.sql}', record.params)
+            return [' '.join(str(col) for col in row) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+
+
+@contextmanager
+def assert_max_queries(limit, allow_repeats=False):
+    """Fail if the block runs more than `limit` queries (or an N+1 pattern)."""
+    with QueryAudit(explain=False) as audit:
+        yield audit
+    problems = []
+    if audit.count > limit:
+        problems.append(f"expected at most {limit} queries")
+    if not allow_repeats and audit.repeated():
+        problems.append("repeated query shapes (N+1)")
+    if problems:
+        raise AssertionError('; '.join(problems) + '\n' + audit.report())
+
+
+class QueryAuditMiddleware:
+    """Log requests with N+1 patterns or slow queries (enable in staging)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_AUDIT_ENABLED:
+            return self.get_response(request)
+        with QueryAudit() as audit:
+            response = self.get_response(request)
+        if audit.has_problems:
+            logger.warning("Query audit %s %s\n%s", request.method, request.path, audit.report())
+        response['X-Query-Count'] = str(audit.count)
+        return response
@@ -0,0 +1,66 @@
+"""
+Fast renderers for large list responses.
+
+FastJSONRenderer produces the same compact JSON as DRF's JSONRenderer but
+encodes with orjson when it is installed (falling back to DRF's encoder
+otherwise). MessagePackRenderer is offered for `Accept: application/msgpack`
+when the msgpack package is installed. Views opt in with
+`renderer_classes = LIST_RENDERERS`; time spent rendering is counted in
+relay_render_seconds_total.
+"""
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import render_timer
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional format
+    msgpack = None
+
+_encoder = JSONEncoder()
+
+# Datetimes go through DRF's encoder too, so both renderers emit the same strings
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson is not None else 0
+
+
+def _default(obj):
+    # Lazy strings, Decimals, UUIDs, QuerySets... exactly as DRF would encode them
+    return _encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with render_timer():
+            if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+                return super().render(data, accepted_media_type, renderer_context)
+            return orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with render_timer():
+            return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+FAST_RENDERERS = [FastJSONRenderer] + ([MessagePackRenderer] if msgpack is not None else [])
+
+# The browsable API stays available to browsers (Accept: text/html)
+LIST_RENDERERS = FAST_RENDERERS + [BrowsableAPIRenderer]
+
+# format -> renderer, for code that renders outside a view (refcache)
+RENDERERS = {r.format: r for r in FAST_RENDERERS}
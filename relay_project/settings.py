@@ -1,6 +1,7 @@
 from pathlib import Path
 from datetime import timedelta
 import os
+import tempfile
 import dj_database_url
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -34,6 +35,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'relay_project.metrics.MetricsMiddleware',      # ✅ per-route timings, query counts, bytes
+    'relay_project.compression.CompressionMiddleware',  # ✅ br/gzip by Accept-Encoding (bytes above are on the wire)
+    'relay_project.queryaudit.QueryAuditMiddleware',  # ✅ N+1 / slow query log (QUERY_AUDIT_ENABLED)
+    'relay_project.dbrouter.ReplicaRoutingMiddleware',  # ✅ replica reads + read-your-writes pinning
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',   # ✅ for static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -50,6 +55,9 @@ CORS_ALLOW_ALL_ORIGINS = os.environ.get("CORS_ALLOW_ALL_ORIGINS", "False") == "T
 CORS_ALLOWED_ORIGINS = [
     origin for origin in os.environ.get("CORS_ALLOWED_ORIGINS", "").split(",") if origin
 ]
+from corsheaders.defaults import default_headers  # noqa: E402
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+CORS_EXPOSE_HEADERS = ["Idempotent-Replayed", "Retry-After"]
 
 ROOT_URLCONF = 'relay_project.urls'
 
@@ -79,13 +87,161 @@ if os.environ.get("DATABASE_URL"):  # Render/production
             ssl_require=True
         )
     }
-else:  # Local development
+else:  # Local development / single node
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.environ.get("SQLITE_PATH", BASE_DIR / 'db.sqlite3'),
         }
     }
+    # ✅ Single-node mode for several workers: WAL + tuned pragmas, BEGIN IMMEDIATE, write queue
+    if os.environ.get("SQLITE_HIGH_CONCURRENCY", "False") == "True":
+        DATABASES['default']['ENGINE'] = 'relay_project.sqlite'
+        DATABASES['default']['OPTIONS'] = {
+            'timeout': int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000")) / 1000,
+        }
+
+# ✅ Pragmas applied by the relay_project.sqlite backend on every connection
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    'mmap_size': int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    'cache_size': -int(os.environ.get("SQLITE_CACHE_SIZE_KB", "65536")),  # negative = KiB
+    'temp_store': 'MEMORY',
+}
+# ✅ Per-process write queue coalescing short write transactions (SQLite only)
+WRITE_QUEUE_ENABLED = os.environ.get(
+    "WRITE_QUEUE_ENABLED", os.environ.get("SQLITE_HIGH_CONCURRENCY", "False")
+) == "True"
+WRITE_QUEUE_MAX_BATCH = int(os.environ.get("WRITE_QUEUE_MAX_BATCH", "64"))
+WRITE_QUEUE_LINGER_MS = float(os.environ.get("WRITE_QUEUE_LINGER_MS", "2"))
+
+# ✅ Read replicas: comma-separated DATABASE_URL-style URLs -> aliases replica1, replica2, ...
+# (two local SQLite files work too: sqlite:////path/to/replica.sqlite3)
+for _n, _url in enumerate(filter(None, os.environ.get("DATABASE_REPLICA_URLS", "").split(",")), start=1):
+    DATABASES[f'replica{_n}'] = dj_database_url.parse(
+        _url.strip(), conn_max_age=600, ssl_require=_url.startswith("postgres")
+    )
+    DATABASES[f'replica{_n}']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['relay_project.dbrouter.ReplicaRouter']
+# Seconds a user who wrote keeps reading from the primary (covers replica lag)
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", "5"))
+
+# ✅ Cache (Redis when REDIS_URL is set; otherwise a file cache shared by local workers)
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ["REDIS_URL"],
+        }
+    }
+elif os.environ.get("CACHE_BACKEND", "file") == "memory":
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get("CACHE_DIR", str(BASE_DIR / '.cache')),
+        }
+    }
+
+# ✅ Reference data cache (contacts/groups/templates): seconds a worker trusts
+# its local copy before re-checking the shared version stamp
+REFCACHE_LOCAL_TTL = float(os.environ.get("REFCACHE_LOCAL_TTL", "5"))
+REFCACHE_LOCAL_MAX_ENTRIES = int(os.environ.get("REFCACHE_LOCAL_MAX_ENTRIES", "256"))
+REFCACHE_SHARED_TTL = int(os.environ.get("REFCACHE_SHARED_TTL", "86400"))
+
+# ✅ Metrics: per-worker snapshots are merged from this directory on scrape
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "relay_metrics"))
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+# Bearer token for Prometheus scrapers (admins can also use their JWT)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# ✅ Query audit (staging): log N+1 patterns and slow queries with EXPLAIN output
+QUERY_AUDIT_ENABLED = os.environ.get("QUERY_AUDIT_ENABLED", "False") == "True"
+QUERY_AUDIT_REPEAT_THRESHOLD = int(os.environ.get("QUERY_AUDIT_REPEAT_THRESHOLD", "5"))
+QUERY_AUDIT_SLOW_MS = float(os.environ.get("QUERY_AUDIT_SLOW_MS", "100"))
+
+# ✅ Delivery retries: exponential backoff with full jitter + per-recipient circuit breaker
+DELIVERY_MAX_RETRIES = int(os.environ.get("DELIVERY_MAX_RETRIES", "5"))
+RETRY_BASE_SECONDS = float(os.environ.get("RETRY_BASE_SECONDS", "30"))
+RETRY_MAX_SECONDS = float(os.environ.get("RETRY_MAX_SECONDS", "3600"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN_SECONDS = float(os.environ.get("CIRCUIT_COOLDOWN_SECONDS", "300"))
+
+# ✅ Delivery transport: inapp (default), push or webhook
+DELIVERY_TRANSPORT = os.environ.get("DELIVERY_TRANSPORT", "inapp")
+DELIVERY_MAX_IN_FLIGHT = int(os.environ.get("DELIVERY_MAX_IN_FLIGHT", "64"))
+TRANSPORT_TIMEOUT_SECONDS = float(os.environ.get("TRANSPORT_TIMEOUT_SECONDS", "10"))
+PUSH_ENDPOINT_URL = os.environ.get("PUSH_ENDPOINT_URL", "")
+PUSH_RATE_LIMIT = float(os.environ.get("PUSH_RATE_LIMIT", "0"))  # requests/second, 0 = unlimited
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_RATE_LIMIT = float(os.environ.get("WEBHOOK_RATE_LIMIT", "0"))
+
+# ✅ Throttling: "<requests>/<period>[:burst]" token buckets per scope, shared via CACHES
+THROTTLE_BUCKETS = {
+    'send': {
+        'user': os.environ.get("THROTTLE_SEND_USER", "30/min:10"),
+        'role': os.environ.get("THROTTLE_SEND_ROLE", "300/min:50"),
+        'ip': os.environ.get("THROTTLE_SEND_IP", "60/min:20"),
+    },
+    'upload': {
+        'user': os.environ.get("THROTTLE_UPLOAD_USER", "20/min:5"),
+        'role': os.environ.get("THROTTLE_UPLOAD_ROLE", "200/min:30"),
+        'ip': os.environ.get("THROTTLE_UPLOAD_IP", "40/min:10"),
+    },
+    'auth': {
+        'ip': os.environ.get("THROTTLE_AUTH_IP", "20/min:10"),
+    },
+}
+
+# ✅ Warm URL resolvers, serializers and reference caches when the WSGI app loads
+WARM_ON_BOOT = os.environ.get("WARM_ON_BOOT", "True") == "True"
+
+# ✅ Image pipeline: variant widths, encoder quality and process pool size (0 = inline)
+IMAGE_VARIANT_WIDTHS = [int(w) for w in os.environ.get("IMAGE_VARIANT_WIDTHS", "160,480,1080").split(",") if w]
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", "80"))
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+
+# ✅ Audio pipeline: analysis thread pool size (0 = inline) and ffmpeg binaries for non-WAV uploads
+AUDIO_WORKERS = int(os.environ.get("AUDIO_WORKERS", "2"))
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.environ.get("FFPROBE_BINARY", "ffprobe")
+
+# ✅ Archival: messages older than this move to the archive tables (manage.py archive_messages)
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "500"))
+
+# ✅ Idempotency-Key: how long responses are replayed, how long duplicates wait for an in-flight request
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", "120"))
+
+# ✅ Batch send: most Message rows one request may create
+BATCH_SEND_MAX_MESSAGES = int(os.environ.get("BATCH_SEND_MAX_MESSAGES", "200"))
+
+# ✅ Scheduler (manage.py run_scheduler): in-memory timers for scheduled voice messages
+SCHEDULER_HORIZON_SECONDS = float(os.environ.get("SCHEDULER_HORIZON_SECONDS", "3600"))
+SCHEDULER_RESYNC_SECONDS = float(os.environ.get("SCHEDULER_RESYNC_SECONDS", "300"))
+SCHEDULER_POLL_SECONDS = float(os.environ.get("SCHEDULER_POLL_SECONDS", "1"))
+SCHEDULER_WORKERS = int(os.environ.get("SCHEDULER_WORKERS", "4"))
+
+# ✅ Emergency broadcast: pushed at once over its own unthrottled transport instance
+EMERGENCY_TRANSPORT = os.environ.get("EMERGENCY_TRANSPORT", "push")
+EMERGENCY_MAX_IN_FLIGHT = int(os.environ.get("EMERGENCY_MAX_IN_FLIGHT", "256"))
+# Deliveries the push thread hasn't finished by then are resumed by the retry worker
+EMERGENCY_LEASE_SECONDS = int(os.environ.get("EMERGENCY_LEASE_SECONDS", "120"))
+
+# ✅ Response compression (br when the brotli package is installed, else gzip)
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4"))
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -0,0 +1,26 @@
+"""
+SQLite backend for single-node deployments with several workers.
+
+Same as django.db.backends.sqlite3, plus:
+  - settings.SQLITE_PRAGMAS applied to every new connection (WAL journal,
+    synchronous=NORMAL, mmap, busy_timeout, page cache);
+  - transactions start with BEGIN IMMEDIATE. A deferred transaction that
+    reads and then writes can fail with "database is locked" straight away
+    instead of waiting out busy_timeout; taking the write lock up front makes
+    writers queue instead.
+
+Enabled with SQLITE_HIGH_CONCURRENCY=True (see settings.DATABASES).
+"""
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
@@ -0,0 +1,175 @@
+"""
+Shared token-bucket throttling for expensive endpoints.
+
+Each scope in settings.THROTTLE_BUCKETS configures buckets keyed per user,
+per role and/or per client IP, written as "<requests>/<period>" with an
+optional ":<burst>" (e.g. "30/min:10"). Buckets live in the shared cache so
+every worker draws from the same budget; they are implemented with GCRA,
+which stores a single timestamp per bucket. Each update holds a lock on the
+bucket: an flock() on a lock file next to the entries for the file cache
+(whose add() is a non-atomic check-then-set), a short cache.add() lock
+(SET NX) for the other backends. When one bucket rejects a request, the
+tokens it already took from the earlier buckets are given back.
+
+Rejected requests get DRF's standard 429 response with Retry-After, and are
+counted in the relay_throttled_requests_total metric.
+"""
+import os
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from rest_framework.throttling import BaseThrottle
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; the file cache falls back to cache.add()
+    fcntl = None
+
+from .metrics import registry
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+LOCK_ATTEMPTS = 20
+LOCK_SLEEP = 0.002
+LOCK_STRIPES = 256
+
+
+def parse_rate(rate):
+    """'30/min:10' -> (emission interval seconds, burst)."""
+    spec, _, burst = rate.partition(':')
+    num, _, period = spec.partition('/')
+    num = int(num)
+    interval = PERIODS[period.strip()] / num
+    return interval, int(burst) if burst else num
+
+
+
+class _FileLock:
+    """flock() on one of LOCK_STRIPES lock files in the file cache directory."""
+    acquired = True
+
+    def __init__(self, key):
+        stripe = zlib.crc32(key.encode()) % LOCK_STRIPES
+        directory = os.path.join(caches['default']._dir, 'locks')
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'throttle-{stripe}.lock')
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        os.close(self._fd)  # closing releases the lock
+        return False
+
+
+class _CacheLock:
+    def __init__(self, key):
+        self.key = f'{key}:lock'
+        self.acquired = False
+
+    def __enter__(self):
+        for _ in range(LOCK_ATTEMPTS):
+            if cache.add(self.key, 1, timeout=1):
+                self.acquired = True
+                break
+            time.sleep(LOCK_SLEEP)
+        return self
+
+    def __exit__(self, *exc):
+        if self.acquired:
+            cache.delete(self.key)
+        return False
+
+
+def _lock(key):
+    if fcntl is not None and isinstance(caches['default'], FileBasedCache):
+        return _FileLock(key)
+    return _CacheLock(key)
+
+
+def consume(key, rate):
+    """
+    Take one token from the bucket at `key`. Returns 0 when allowed,
+    otherwise the number of seconds until a token is available.
+    """
+    interval, burst = parse_rate(rate)
+    tolerance = interval * (burst - 1)
+    with _lock(key) as lock:
+        if not lock.acquired:
+            return 0  # lock contention: fail open rather than reject
+        now = time.time()
+        tat = max(cache.get(key) or now, now)
+        if tat - now > tolerance:
+            return tat - now - tolerance
+        tat += interval
+        cache.set(key, tat, int(tat - now) + 1)
+        return 0
+
+
+def refund(key, rate):
+    """Give back the token consume() took from the bucket at `key`."""
+    interval, _ = parse_rate(rate)
+    with _lock(key) as lock:
+        if not lock.acquired:
+            return
+        now = time.time()
+        tat = cache.get(key)
+        if tat is not None and tat - interval > now:
+            cache.set(key, tat - interval, int(tat - interval - now) + 1)
+        elif tat is not None:
+            cache.delete(key)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Subclass and set `scope` to a key of settings.THROTTLE_BUCKETS."""
+    scope = None
+    methods = {'POST'}
+
+    def _keys(self, request):
+        buckets = settings.THROTTLE_BUCKETS.get(self.scope, {})
+        user = getattr(request, 'user', None)
+        authenticated = user is not None and user.is_authenticated
+        for kind, rate in buckets.items():
+            if kind == 'user' and authenticated:
+                yield kind, f'throttle:{self.scope}:user:{user.pk}', rate
+            elif kind == 'role' and authenticated:
+                yield kind, f'throttle:{self.scope}:role:{getattr(user, "role", None)}', rate
+            elif kind == 'ip':
+                yield kind, f'throttle:{self.scope}:ip:{self.get_ident(request)}', rate
+
+    def allow_request(self, request, view):
+        self._wait = 0
+        if request.method not in self.methods:
+            return True
+        taken = []
+        for kind, key, rate in self._keys(request):
+            wait = consume(key, rate)
+            if wait:
+                for taken_key, taken_rate in taken:
+                    refund(taken_key, taken_rate)  # the request doesn't happen
+                self._wait = wait
+                registry.inc('relay_throttled_requests_total', (('scope', self.scope), ('bucket', kind)))
+                return False
+            taken.append((key, rate))
+        return True
+
+    def wait(self):
+        return self._wait
+
+
+class SendThrottle(TokenBucketThrottle):
+    scope = 'send'
+
+
+class UploadThrottle(TokenBucketThrottle):
+    scope = 'upload'
+
+
+class AuthThrottle(TokenBucketThrottle):
+    scope = 'auth'
@@ -5,6 +5,7 @@ from django.conf.urls.static import static
 from django.http import HttpResponse
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from authapp.views import google_auth  # ✅ Import Google login view
+from relay_project.metrics import MetricsView
 
 
 # Healthcheck view
@@ -16,6 +17,9 @@ urlpatterns = [
     # Healthcheck root
     path('', healthcheck, name='healthcheck'),
 
+    # Prometheus metrics (METRICS_TOKEN bearer or admin JWT)
+    path('metrics', MetricsView.as_view(), name='metrics'),
+
     # Django admin
     path('admin/', admin.site.urls),
     path('api/auth/', include('authapp.urls')),
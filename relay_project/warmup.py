@@ -0,0 +1,51 @@
+"""
+Boot-time warm-up.
+
+Run once per process (or once in the gunicorn master with preload_app, so
+forked workers inherit the result copy-on-write): populate the URL resolver,
+import every view module it references, fill the reference cache and load
+the emergency roster. The first real request then pays none of that.
+
+Serializers are not warmed: DRF rebuilds Serializer().fields for every
+instance, so there is nothing per class to keep, and the model _meta caches
+they read are already filled by the reference cache queries.
+"""
+import logging
+import time
+
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def _walk(resolver):
+    for pattern in resolver.url_patterns:
+        if hasattr(pattern, 'url_patterns'):
+            yield from _walk(pattern)
+        else:
+            yield pattern
+
+
+def warm_urls():
+    resolver = get_resolver()
+    resolver.reverse_dict  # noqa: B018 - builds the reverse lookup tables
+    return sum(1 for _ in _walk(resolver))
+
+
+def warm():
+    """Warm everything; returns {step: seconds}."""
+    from messaging import emergency, refcache
+
+    timings = {}
+    steps = (
+        ('urls', warm_urls), ('refcache', refcache.warm), ('emergency', emergency.warm),
+    )
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.warning("Warm-up step %r failed", name, exc_info=True)
+        timings[name] = time.perf_counter() - started
+    logger.info("Warm-up done: %s", ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items()))
+    return timings
@@ -0,0 +1,109 @@
+"""
+Per-process write queue for SQLite.
+
+SQLite allows one writer at a time, and every write transaction pays for
+the lock and an fsync of the WAL. Short writes (acks, read marks, message
+inserts) are handed to a single writer thread, which commits everything
+that arrived within WRITE_QUEUE_LINGER_MS, up to WRITE_QUEUE_MAX_BATCH
+operations, in one transaction. Each operation runs in its own savepoint, so
+one failing write doesn't roll back its neighbours. Callers block until
+the batch is committed, so they read their own writes afterwards.
+
+run() falls back to executing inline when the queue is disabled, the
+database isn't SQLite, or the caller is already inside a transaction (the
+writer would wait on the caller's own lock).
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    def __init__(self, max_batch=None, linger=None):
+        self.max_batch = max_batch or settings.WRITE_QUEUE_MAX_BATCH
+        self.linger = (settings.WRITE_QUEUE_LINGER_MS if linger is None else linger) / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Started lazily so a preloading gunicorn master never owns the thread
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='write-queue', daemon=True)
+                self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self._ensure_started()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def _drain(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._drain()
+            outcomes = []
+            try:
+                with transaction.atomic():
+                    for future, fn, args, kwargs in batch:
+                        try:
+                            with transaction.atomic():
+                                outcomes.append((future, fn(*args, **kwargs), None))
+                        except Exception as e:
+                            outcomes.append((future, None, e))
+            except Exception as e:
+                logger.exception("Write batch of %d failed to commit", len(batch))
+                outcomes = [(future, None, e) for future, *_ in batch]
+                # Start the next batch on a fresh connection; otherwise the
+                # writer keeps its connection (and its pragmas) for its lifetime
+                connection.close()
+            registry.inc('relay_write_queue_batches_total', ())
+            registry.inc('relay_write_queue_writes_total', (), len(batch))
+            for future, result, error in outcomes:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+
+def enabled():
+    return settings.WRITE_QUEUE_ENABLED and connection.vendor == 'sqlite'
+
+
+def get_queue():
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None:
+            _write_queue = WriteQueue()
+        return _write_queue
+
+
+def run(fn, *args, **kwargs):
+    """Run a short write through the queue and wait for its commit."""
+    if not enabled() or connection.in_atomic_block:
+        return fn(*args, **kwargs)
+    return get_queue().submit(fn, *args, **kwargs).result()
@@ -3,4 +3,12 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'relay_project.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Warm URL resolvers, serializers and per-worker caches so the first
+# requests don't pay for them (in the master when gunicorn preloads the app)
+from django.conf import settings  # noqa: E402
+
+if settings.WARM_ON_BOOT:
+    from relay_project import warmup  # noqa: E402
+    warmup.warm()